@@ -2,27 +2,35 @@ import streamlit as st
 import pandas as pd
 import io
 import re
-import gspread
 import traceback
-import time
 import functools
+import itertools
+import threading
+import queue
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timedelta
+import parse_cache
+from report_parsers import scan_unit_totals, read_jing_tao_csv, jing_tao_columns, clean_col
+from workbook import Workbook
+from sheets_plan import WritePlan, SheetSnapshots
+import period_store
+import sheets_backend
+import sheets_pool
+import jobs
+import tracing
+from jobs import ui
 
 # ==========================================
-# 0. 系統初始化與格式套件
+# 0. 系統初始化
 # ==========================================
 st.set_page_config(page_title="交通執法自動化分析引擎", page_icon="🚓", layout="wide")
 
-try:
-    from gspread_formatting import *
-    HAS_FORMATTING = True
-except ImportError:
-    HAS_FORMATTING = False
-
 # ==========================================
 # 1. 全局常數與設定區
 # ==========================================
 GOOGLE_SHEET_URL = "https://docs.google.com/spreadsheets/d/1HaFu5PZkFDUg7WZGV9khyQ0itdGXhXUakP4_BClFTUg/edit"
+# 並行模式下的解析工作執行緒數
+HUB_MAX_WORKERS = 6
 
 try:
     GCP_CREDS = dict(st.secrets.get("gcp_service_account", {}))
@@ -30,64 +38,114 @@ except:
     GCP_CREDS = None
 
 # ==========================================
-# 2. Google Sheets 連線層（快取 + 重試）
+# 2. Google Sheets 連線層（快取 + 配額排程）
 # ==========================================
 
-def _gsheet_call_with_retry(fn, *args, max_retries=4, base_delay=5, **kwargs):
-    for attempt in range(max_retries):
-        try:
-            return fn(*args, **kwargs)
-        except gspread.exceptions.APIError as e:
-            if "429" in str(e) and attempt < max_retries - 1:
-                wait = base_delay * (2 ** attempt)
-                st.warning(f"⏳ Google Sheets API 限速 (429)，等待 {wait} 秒後重試... (第 {attempt+1} 次)")
-                time.sleep(wait)
-            else:
-                raise
-
-@st.cache_resource
 def get_gsheet_connection():
-    if GCP_CREDS:
+    # 連線與工作表清單由 sheets_pool 全程序共用，不必每次批次重新授權、開啟試算表
+    if GCP_CREDS or sheets_backend.is_local():
         try:
-            gc = gspread.service_account_from_dict(GCP_CREDS)
-            sh = gc.open_by_url(GOOGLE_SHEET_URL)
-            # 修正 1：將工作表列表的讀取動作包進重試機制，防止連線初始化時爆發 429 錯誤
-            sh._cached_worksheets = _gsheet_call_with_retry(sh.worksheets)
-            return sh
+            return sheets_pool.spreadsheet(GOOGLE_SHEET_URL, GCP_CREDS)
         except Exception as e:
-            st.error(f"⚠️ Google Sheets 連線失敗: {e}")
+            ui.error(f"⚠️ Google Sheets 連線失敗: {e}")
     return None
 
 
+# 單一寫入執行緒：所有處理器的寫入依提交順序排隊送出（速率由 sheets_quota 控制，取代固定 sleep）
+class _SheetsWriter:
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, name="sheets-writer", daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            fut, span, fn, args, kwargs = item
+            if not fut.set_running_or_notify_cancel():
+                continue
+            try:
+                # API 呼叫次數記入提交端的分段
+                with tracing.attach(span):
+                    fut.set_result(fn(*args, **kwargs))
+            except BaseException as e:
+                fut.set_exception(e)
+
+    def call(self, fn, *args, **kwargs):
+        fut = Future()
+        self._queue.put((fut, tracing.current(), fn, args, kwargs))
+        return fut.result()
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+
+# 批次作業期間由首頁設定；未設定時直接呼叫（維持原行為）
+_ACTIVE_WRITER = None
+# 批次作業期間的寫入計畫：清除、數值與格式請求先收集，作業結束時合併送出
+_ACTIVE_PLAN = None
+
+
+def _gsheet_write(fn, *args, **kwargs):
+    if _ACTIVE_WRITER is not None:
+        return _ACTIVE_WRITER.call(fn, *args, **kwargs)
+    return fn(*args, **kwargs)
+
+
 def _ws_update(ws, range_name, values):
-    _gsheet_call_with_retry(ws.update, range_name=range_name, values=values)
+    if _ACTIVE_PLAN is not None:
+        return _ACTIVE_PLAN.values(ws, range_name, values)
+    _gsheet_write(ws.update, range_name=range_name, values=values)
 
 
 def _ws_clear(ws):
-    _gsheet_call_with_retry(ws.clear)
+    if _ACTIVE_PLAN is not None:
+        return _ACTIVE_PLAN.clear(ws)
+    _gsheet_write(ws.clear)
 
 
 def _ws_batch_clear(ws, ranges):
-    _gsheet_call_with_retry(ws.batch_clear, ranges)
+    if _ACTIVE_PLAN is not None:
+        return _ACTIVE_PLAN.clear_ranges(ws, ranges)
+    _gsheet_write(ws.batch_clear, ranges)
 
 
 def _sh_batch_update(sh, body):
-    _gsheet_call_with_retry(sh.batch_update, body)
+    if _ACTIVE_PLAN is not None:
+        return _ACTIVE_PLAN.requests(body["requests"])
+    _gsheet_write(sh.batch_update, body)
+
+
+def flush_write_plan(plan, sh, full=False):
+    # full=False 時與本機快照比對，只送出有變動的儲存格
+    if sh is None or not len(plan):
+        return []
+    n_reqs = len(plan)
+    snapshots = None if full else SheetSnapshots()
+    with tracing.stage("hub.sheets_flush", requests=n_reqs):
+        errors = plan.flush(lambda body: _gsheet_write(sh.batch_update, body), snapshots, sh.id)
+    for name, e in errors:
+        ui.error(f"⚠️ {name} 雲端同步失敗：{e}")
+    if plan.calls == 0:
+        ui.write("☁️ 雲端內容與上次寫入相同，略過同步")
+    else:
+        ui.write(f"☁️ 雲端同步：{n_reqs} 項寫入請求，比對後送出 {plan.sent} 項，共 {plan.calls} 次 API 呼叫")
+    return [name for name, _ in errors]
 
 
 def get_or_create_ws(sh, ws_name, rows=100, cols=20):
-    cached = getattr(sh, '_cached_worksheets', [])
-    ws = next((s for s in cached if s.title == ws_name), None)
+    # sh.worksheets() 取自連線池快取的工作表清單，不另外呼叫 API
+    ws = next((s for s in sh.worksheets() if s.title == ws_name), None)
     if not ws:
-        ws = _gsheet_call_with_retry(sh.add_worksheet, title=ws_name, rows=str(rows), cols=str(cols))
-        sh._cached_worksheets.append(ws)
+        ws = _gsheet_write(sh.add_worksheet, title=ws_name, rows=rows, cols=cols)
     return ws
 
 
 def get_ws_by_index(sh, idx):
-    cached = getattr(sh, '_cached_worksheets', [])
-    if idx < len(cached):
-        return cached[idx]
     return sh.get_worksheet(idx)
 
 
@@ -147,13 +205,18 @@ def get_gsheet_rich_text_req(sheet_id, row_idx, col_idx, text):
 # ----------------- [1. 科技執法] -----------------
 def process_tech_enforcement(files, sh):
     f = files[0]
-    f.seek(0)
-    df = pd.read_csv(f, encoding='cp950') if f.name.endswith('.csv') else pd.read_excel(f)
-    df.columns = [str(c).strip() for c in df.columns]
+
+    def read_tech(f):
+        f.seek(0)
+        df = pd.read_csv(f, encoding='cp950') if f.name.endswith('.csv') else Workbook(f).table(0, 0)
+        df.columns = [str(c).strip() for c in df.columns]
+        return df
+
+    df = parse_cache.cached(f, "tech.table", read_tech)
 
     loc_col = next((c for c in df.columns if c in ['違規地點', '路口名稱', '地點']), None)
     if not loc_col:
-        st.error("❌ 找不到『地點』相關欄位！")
+        ui.error("❌ 找不到『地點』相關欄位！")
         return
 
     df[loc_col] = df[loc_col].astype(str).str.replace('桃園市', '').str.replace('龍潭區', '').str.strip()
@@ -163,8 +226,8 @@ def process_tech_enforcement(files, sh):
     loc_summary = df[loc_col].value_counts().head(10).reset_index()
     loc_summary.columns = ['路段名稱', '舉發件數']
 
-    st.write("📊 **科技執法路段排行：**")
-    st.dataframe(loc_summary, hide_index=True)
+    ui.write("📊 **科技執法路段排行：**")
+    ui.dataframe(loc_summary, hide_index=True)
 
     if sh:
         ws_name = "科技執法-路段排行"
@@ -196,32 +259,37 @@ def process_overload(files, sh):
 
     def parse_rpt(f):
         if not f: return {}, "0000000", "0000000"
-        f.seek(0)
         counts, s, e = {}, "0000000", "0000000"
-        text_block = pd.read_excel(f, header=None, nrows=15).to_string()
-        m = re.search(r'(\d{3,7}).*至\s*(\d{3,7})', text_block)
-        if m: s, e = m.group(1), m.group(2)
-        f.seek(0)
-        xls = pd.ExcelFile(f)
-        for sn in xls.sheet_names:
-            df = pd.read_excel(xls, sheet_name=sn, header=None)
-            u = None
-            for _, r in df.iterrows():
-                rs = " ".join([str(x) for x in r.values])
-                if "舉發單位：" in rs:
-                    m2 = re.search(r"舉發單位：(\S+)", rs)
-                    if m2: u = m2.group(1).strip()
-                if "總計" in rs and u:
-                    nums = [float(str(x).replace(',', '')) for x in r if str(x).replace('.', '', 1).isdigit()]
-                    if nums:
-                        short = OVERLOAD_UNIT_MAP.get(u, u)
-                        if short in OVERLOAD_UNIT_ORDER: counts[short] = counts.get(short, 0) + int(nums[-1])
-                        u = None
+        with Workbook(f) as wb:
+            text_block = wb.head(0, 15).to_string()
+            m = re.search(r'(\d{3,7}).*至\s*(\d{3,7})', text_block)
+            if m: s, e = m.group(1), m.group(2)
+            for sn in wb.sheet_names:
+                for u, v in scan_unit_totals(wb.frame(sn)):
+                    short = OVERLOAD_UNIT_MAP.get(u, u)
+                    if short in OVERLOAD_UNIT_ORDER: counts[short] = counts.get(short, 0) + v
         return counts, s, e
 
-    d_wk, s_wk, e_wk = parse_rpt(f_wk)
-    d_yt, s_yt, e_yt = parse_rpt(f_yt)
-    d_ly, s_ly, e_ly = parse_rpt(f_ly)
+    d_wk, s_wk, e_wk = parse_cache.cached(f_wk, "overload.rpt", parse_rpt)
+    d_yt, s_yt, e_yt = parse_cache.cached(f_yt, "overload.rpt", parse_rpt)
+    d_ly, s_ly, e_ly = parse_cache.cached(f_ly, "overload.rpt", parse_rpt)
+
+    # 各期累計存檔；未上傳去年累計 (2) 時改由存檔取去年同期
+    def roc_period(s, e):
+        return (int(e[:-4]), f"{s[-4:]}-{e[-4:]}") if len(s) == len(e) == 7 and (s + e).isdigit() else (None, None)
+
+    y_yt, r_yt = roc_period(s_yt, e_yt)
+    if f_yt and y_yt:
+        period_store.save_unit_results("overload", y_yt, r_yt, {(u, "count"): v for u, v in d_yt.items()})
+    if f_ly:
+        y_ly, r_ly = roc_period(s_ly, e_ly)
+        if y_ly: period_store.save_unit_results("overload", y_ly, r_ly, {(u, "count"): v for u, v in d_ly.items()})
+    elif y_yt:
+        r_ly, hist = period_store.load_unit_results("overload", y_yt - 1, r_yt)
+        if hist:
+            d_ly = {u: int(v) for (u, _), v in hist.items()}
+            s_ly, e_ly = f"{y_yt - 1}{r_ly[:4]}", f"{y_yt - 1}{r_ly[-4:]}"
+            ui.info(f"💡 未上傳去年累計報表，去年同期取自歷史存檔（{y_yt - 1} 年 {r_ly}）")
     raw_wk = f"本期 ({s_wk[-4:]}~{e_wk[-4:]})"
     raw_yt = f"本年累計 ({s_yt[-4:]}~{e_yt[-4:]})"
     raw_ly = f"去年累計 ({s_ly[-4:]}~{e_ly[-4:]})"
@@ -239,8 +307,8 @@ def process_overload(files, sh):
                                 '達成率': f"{sum_v[raw_yt]/sum_v['目標值']:.0%}" if sum_v['目標值'] > 0 else "0%"}])
     df_final = pd.concat([total_row, df_body], ignore_index=True)
 
-    st.write("📊 **超載統計結果：**")
-    st.dataframe(df_final, hide_index=True)
+    ui.write("📊 **超載統計結果：**")
+    ui.dataframe(df_final, hide_index=True)
 
     if sh:
         ws = get_ws_by_index(sh, 1)
@@ -268,7 +336,7 @@ def process_overload(files, sh):
 # ----------------- [3. 重大交通違規] -----------------
 def process_major(files, sh):
     if len(files) < 2:
-        st.error("❌ 請上傳『本期』與『年累計』報表。若要精確比較細項，請一併上傳第三份『去年累計』報表。")
+        ui.error("❌ 請上傳『本期』與『年累計』報表。若要精確比較細項，請一併上傳第三份『去年累計』報表（曾處理過去年同期者可由歷史存檔自動補齊）。")
         return
 
     f_wk, f_year, f_ly = None, None, None
@@ -278,7 +346,7 @@ def process_major(files, sh):
         elif "年累計" in f.name: f_year = f
 
     if not f_wk or not f_year:
-        st.warning("⚠️ 無法完全匹配「本期」與「年累計」檔名，系統將嘗試自動分類...")
+        ui.warning("⚠️ 無法完全匹配「本期」與「年累計」檔名，系統將嘗試自動分類...")
         sorted_files = sorted([f for f in files if "重大" in f.name or "重點" in f.name] or files, key=lambda x: x.size)
         if len(sorted_files) >= 1 and not f_wk: f_wk = sorted_files[0]
         if len(sorted_files) >= 2 and not f_year: f_year = sorted_files[1]
@@ -295,6 +363,15 @@ def process_major(files, sh):
             return ""
         except: return ""
 
+    def get_roc_year(df):
+        # 統計期間結束日的民國年（存檔鍵用）；找不到為 None
+        raw_cells = [str(val) for val in df.head(10).values.flatten() if pd.notna(val)]
+        clean_text = re.sub(r'\s+', '', "".join(raw_cells))
+        match = re.search(r'1\d{2}\d{4}[至\-~](1\d{2})\d{4}', clean_text)
+        if match: return int(match.group(1))
+        dates = re.findall(r'(?<!\d)(1\d{2})\d{4}(?!\d)', clean_text)
+        return int(dates[1]) if len(dates) >= 2 else None
+
     def clean_unit(n):
         if pd.isna(n): return None
         n = str(n).strip()
@@ -317,14 +394,10 @@ def process_major(files, sh):
             except: f.seek(0); return [pd.read_csv(f, encoding='cp950', header=None)]
         else:
             try:
-                xl = pd.ExcelFile(f)
-                return [pd.read_excel(xl, sheet_name=sn, header=None) for sn in xl.sheet_names]
+                with Workbook(f) as wb:
+                    return [wb.frame(sn) for sn in wb.sheet_names]
             except: return []
 
-    dfs_wk = get_dfs(f_wk)
-    dfs_yr = get_dfs(f_year)
-    dfs_ly = get_dfs(f_ly)
-
     def parse_main_table(dfs):
         d_yt, d_ly = {}, {}
         dt_str = ""
@@ -337,53 +410,7 @@ def process_major(files, sh):
                     if len(r) > 19: d_ly[u] = {'stop': to_i(r.iloc[18]), 'cit': to_i(r.iloc[19])}
         return d_yt, d_ly, dt_str
 
-    d_wk_yt, _, date_wk = parse_main_table(dfs_wk)
-    d_yr_yt, d_yr_ly_internal, date_yr = parse_main_table(dfs_yr)
-    d_ly_yt, _, date_ly = parse_main_table(dfs_ly)
-
-    table_rows = []
-    summary = {k: 0 for k in ['ws', 'wc', 'ys', 'yc', 'ls', 'lc', 'diff', 'tgt']}
-
-    for u in MAJOR_UNIT_ORDER:
-        w_data = d_wk_yt.get(u, {'stop': 0, 'cit': 0})
-        y_data = d_yr_yt.get(u, {'stop': 0, 'cit': 0})
-        l_data = d_ly_yt.get(u, {'stop': 0, 'cit': 0}) if dfs_ly else d_yr_ly_internal.get(u, {'stop': 0, 'cit': 0})
-
-        y_total = y_data['stop'] + y_data['cit']
-        l_total = l_data['stop'] + l_data['cit']
-        tgt = MAJOR_TARGETS.get(u, 0)
-        diff = int(y_total - l_total)
-        rate = f"{(y_total / tgt):.1%}" if tgt > 0 else "0%"
-
-        if u != '警備隊':
-            summary['diff'] += diff; summary['tgt'] += tgt
-
-        table_rows.append([u, w_data['stop'], w_data['cit'], y_data['stop'], y_data['cit'],
-                           l_data['stop'], l_data['cit'], diff if u != '警備隊' else "—", tgt,
-                           rate if u != '警備隊' else "—"])
-
-        summary['ws'] += w_data['stop']; summary['wc'] += w_data['cit']
-        summary['ys'] += y_data['stop']; summary['yc'] += y_data['cit']
-        summary['ls'] += l_data['stop']; summary['lc'] += l_data['cit']
-
-    total_rate = f"{((summary['ys'] + summary['yc']) / summary['tgt']):.1%}" if summary['tgt'] > 0 else "0%"
-    table_rows.insert(0, ['合計', summary['ws'], summary['wc'], summary['ys'], summary['yc'],
-                          summary['ls'], summary['lc'], summary['diff'], summary['tgt'], total_rate])
-    table_rows.append([MAJOR_FOOTNOTE] + [""] * 9)
-
-    h_wk = f"本期({date_wk})" if date_wk else "本期"
-    h_yr = f"本年累計({date_yr})" if date_yr else "本年累計"
-    h_ls_str = date_ly if dfs_ly else date_yr
-    h_ls = f"去年累計({h_ls_str})" if h_ls_str else "去年累計"
-
-    header_1 = ['統計期間', h_wk, h_wk, h_yr, h_yr, h_ls, h_ls, '本年與去年同期比較', '目標值', '達成率']
-    header_2 = ['取締方式', '當場攔停', '逕行舉發', '當場攔停', '逕行舉發', '當場攔停', '逕行舉發', '', '', '']
-    df_result = pd.DataFrame(table_rows, columns=pd.MultiIndex.from_arrays([header_1, header_2]))
-
-    st.write("📊 **重大違規統計結果 (總表)：**")
-    st.dataframe(df_result, use_container_width=True)
-
-    # 細項表
+    # 細項表（7 大項）
     DETAIL_CATEGORIES = {
         "酒駕": ["酒駕", "酒後", "35條"],
         "闖紅燈": ["闖紅燈", "53條"],
@@ -426,8 +453,95 @@ def process_major(files, sh):
                             if cc != -1 and cc < len(row): res[cat][u]['cit'] += to_i(row.values[cc])
         return res
 
-    d_yr_cat = parse_detail_data(dfs_yr)
-    d_ly_cat = parse_detail_data(dfs_ly)
+    def parse_major_file(f):
+        dfs = get_dfs(f)
+        return {'main': parse_main_table(dfs), 'detail': parse_detail_data(dfs), 'has_data': bool(dfs),
+                'year': next((y for y in map(get_roc_year, dfs) if y), None)}
+
+    p_wk = parse_cache.cached(f_wk, "major.tables", parse_major_file)
+    p_yr = parse_cache.cached(f_year, "major.tables", parse_major_file)
+    p_ly = parse_cache.cached(f_ly, "major.tables", parse_major_file)
+    has_ly = p_ly['has_data']
+
+    # 各期累計存檔；未上傳去年累計時，細項的去年同期改由存檔取用
+    def to_history(p):
+        vals = {(u, f"main.{k}"): v for u, d in p['main'][0].items() for k, v in d.items()}
+        vals.update({(u, f"{cat}.{k}"): v for cat, units in p['detail'].items() for u, d in units.items() for k, v in d.items()})
+        return vals
+
+    def from_history(vals):
+        main = {}
+        detail = {cat: {u: {'stop': 0, 'cit': 0} for u in MAJOR_UNIT_ORDER} for cat in DETAIL_CATEGORIES}
+        for (u, metric), v in vals.items():
+            part, k = metric.rsplit('.', 1)
+            if part == 'main': main.setdefault(u, {'stop': 0, 'cit': 0})[k] = int(v)
+            elif part in detail and u in detail[part]: detail[part][u][k] = int(v)
+        return main, detail
+
+    yr_date = p_yr['main'][2]
+    if p_yr['year'] and yr_date:
+        period_store.save_unit_results("major", p_yr['year'], yr_date, to_history(p_yr))
+    if has_ly and p_ly['year'] and p_ly['main'][2]:
+        period_store.save_unit_results("major", p_ly['year'], p_ly['main'][2], to_history(p_ly))
+    elif not has_ly and p_yr['year'] and yr_date:
+        hist_range, hist = period_store.load_unit_results("major", p_yr['year'] - 1, yr_date)
+        if hist:
+            main, detail = from_history(hist)
+            # 總表的去年欄以本年報表內附的去年同期為準，沒有時才用存檔
+            internal = p_yr['main'][1]
+            p_ly = {'main': (internal or main, {}, yr_date if internal else hist_range), 'detail': detail,
+                    'has_data': True, 'year': p_yr['year'] - 1}
+            has_ly = True
+            ui.info(f"💡 未上傳去年累計報表，細項去年同期取自歷史存檔（{p_yr['year'] - 1} 年 {hist_range}）")
+
+    d_wk_yt, _, date_wk = p_wk['main']
+    d_yr_yt, d_yr_ly_internal, date_yr = p_yr['main']
+    d_ly_yt, _, date_ly = p_ly['main']
+
+    table_rows = []
+    summary = {k: 0 for k in ['ws', 'wc', 'ys', 'yc', 'ls', 'lc', 'diff', 'tgt']}
+
+    for u in MAJOR_UNIT_ORDER:
+        w_data = d_wk_yt.get(u, {'stop': 0, 'cit': 0})
+        y_data = d_yr_yt.get(u, {'stop': 0, 'cit': 0})
+        l_data = d_ly_yt.get(u, {'stop': 0, 'cit': 0}) if has_ly else d_yr_ly_internal.get(u, {'stop': 0, 'cit': 0})
+
+        y_total = y_data['stop'] + y_data['cit']
+        l_total = l_data['stop'] + l_data['cit']
+        tgt = MAJOR_TARGETS.get(u, 0)
+        diff = int(y_total - l_total)
+        rate = f"{(y_total / tgt):.1%}" if tgt > 0 else "0%"
+
+        if u != '警備隊':
+            summary['diff'] += diff; summary['tgt'] += tgt
+
+        table_rows.append([u, w_data['stop'], w_data['cit'], y_data['stop'], y_data['cit'],
+                           l_data['stop'], l_data['cit'], diff if u != '警備隊' else "—", tgt,
+                           rate if u != '警備隊' else "—"])
+
+        summary['ws'] += w_data['stop']; summary['wc'] += w_data['cit']
+        summary['ys'] += y_data['stop']; summary['yc'] += y_data['cit']
+        summary['ls'] += l_data['stop']; summary['lc'] += l_data['cit']
+
+    total_rate = f"{((summary['ys'] + summary['yc']) / summary['tgt']):.1%}" if summary['tgt'] > 0 else "0%"
+    table_rows.insert(0, ['合計', summary['ws'], summary['wc'], summary['ys'], summary['yc'],
+                          summary['ls'], summary['lc'], summary['diff'], summary['tgt'], total_rate])
+    table_rows.append([MAJOR_FOOTNOTE] + [""] * 9)
+
+    h_wk = f"本期({date_wk})" if date_wk else "本期"
+    h_yr = f"本年累計({date_yr})" if date_yr else "本年累計"
+    h_ls_str = date_ly if has_ly else date_yr
+    h_ls = f"去年累計({h_ls_str})" if h_ls_str else "去年累計"
+
+    header_1 = ['統計期間', h_wk, h_wk, h_yr, h_yr, h_ls, h_ls, '本年與去年同期比較', '目標值', '達成率']
+    header_2 = ['取締方式', '當場攔停', '逕行舉發', '當場攔停', '逕行舉發', '當場攔停', '逕行舉發', '', '', '']
+    df_result = pd.DataFrame(table_rows, columns=pd.MultiIndex.from_arrays([header_1, header_2]))
+
+    ui.write("📊 **重大違規統計結果 (總表)：**")
+    ui.dataframe(df_result, use_container_width=True)
+
+    d_yr_cat = p_yr['detail']
+    d_ly_cat = p_ly['detail']
 
     cat_dfs = {}
     h1_cat = ['統計期間', '今年累計', '今年累計', '今年累計', '去年累計', '去年累計', '去年累計', '今年與去年同期比較', '今年與去年同期比較', '今年與去年同期比較']
@@ -438,8 +552,8 @@ def process_major(files, sh):
         sum_cat = {'ys': 0, 'yc': 0, 'yt': 0, 'ls': 0, 'lc': 0, 'lt': 0, 'ds': 0, 'dc': 0, 'dt': 0}
         for u in MAJOR_UNIT_ORDER:
             ys = d_yr_cat[cat][u]['stop']; yc = d_yr_cat[cat][u]['cit']
-            ls = d_ly_cat[cat][u]['stop'] if dfs_ly else 0
-            lc = d_ly_cat[cat][u]['cit'] if dfs_ly else 0
+            ls = d_ly_cat[cat][u]['stop'] if has_ly else 0
+            lc = d_ly_cat[cat][u]['cit'] if has_ly else 0
             yt, lt = ys + yc, ls + lc
             ds, dc, dt = ys - ls, yc - lc, yt - lt
             rows.append([u, ys, yc, yt, ls, lc, lt,
@@ -453,18 +567,14 @@ def process_major(files, sh):
         rows.insert(0, tot_row)
         cat_dfs[cat] = pd.DataFrame(rows, columns=pd.MultiIndex.from_arrays([h1_cat, h2_cat]))
 
-    with st.expander("🔍 檢視 7 大項重大違規細表 (點擊展開)"):
-        if not dfs_ly: st.info("💡 提醒：因為您未上傳單獨的『去年累計』報表，細項的去年欄位將暫時以 0 計算。")
+    with ui.expander("🔍 檢視 7 大項重大違規細表 (點擊展開)"):
+        if not has_ly: ui.info("💡 提醒：因為您未上傳單獨的『去年累計』報表，細項的去年欄位將暫時以 0 計算。")
         for cat, df_c in cat_dfs.items():
-            st.write(f"**【{cat}】統計表**")
-            st.dataframe(df_c, use_container_width=True)
+            ui.write(f"**【{cat}】統計表**")
+            ui.dataframe(df_c, use_container_width=True)
 
     if sh:
         try:
-            # 修正 2：使用具有指數退避重試機制的 _gsheet_call_with_retry 呼叫 sh.worksheets
-            all_worksheets = _gsheet_call_with_retry(sh.worksheets)
-            existing_sheets = [s.title for s in all_worksheets]
-
             red_color   = {"red": 1.0, "green": 0.0, "blue": 0.0}
             black_color = {"red": 0.0, "green": 0.0, "blue": 0.0}
             blue_color  = {"red": 0.0, "green": 0.0, "blue": 1.0}
@@ -509,24 +619,24 @@ def process_major(files, sh):
                 ws_name = f"重大違規-{cat}"
                 ws_cat = get_or_create_ws(sh, ws_name, rows=30, cols=15)
                 
-                # 預先清除格式，防止 400 合併儲存格衝突
+                # 預先清除格式並取消合併，防止 400 合併儲存格衝突。
+                # 重設與其他寫入同批送出，範圍限制在現有格線內（既有分頁可能小於 15×15），才不會拖累整組寫入
+                reset_range = {"sheetId": ws_cat.id, "startRowIndex": 0, "endRowIndex": min(15, ws_cat.row_count),
+                               "startColumnIndex": 0, "endColumnIndex": min(15, ws_cat.col_count)}
                 reset_reqs = [
                     {
                         "updateCells": {
-                            "range": {"sheetId": ws_cat.id, "startRowIndex": 0, "endRowIndex": 15, "startColumnIndex": 0, "endColumnIndex": 15},
+                            "range": reset_range,
                             "fields": "userEnteredValue,userEnteredFormat"
                         }
                     },
                     {
                         "unmergeCells": {
-                            "range": {"sheetId": ws_cat.id, "startRowIndex": 0, "endRowIndex": 15, "startColumnIndex": 0, "endColumnIndex": 15}
+                            "range": reset_range
                         }
                     }
                 ]
-                try:
-                    _sh_batch_update(sh, {"requests": reset_reqs})
-                except Exception:
-                    pass 
+                _sh_batch_update(sh, {"requests": reset_reqs})
                 
                 _ws_clear(ws_cat)
 
@@ -619,19 +729,21 @@ def process_major(files, sh):
 
                 _sh_batch_update(sh, {"requests": reqs_cat})
 
-            st.write("✅ 重大違規 (含總表及 7 項獨立分頁) 雲端打包同步完成！")
+            ui.write("✅ 重大違規 (含總表及 7 項獨立分頁) 雲端打包同步完成！")
         except Exception as e:
-            st.error(f"雲端同步出錯：{e}")
-            st.write(traceback.format_exc())
+            ui.error(f"雲端同步出錯：{e}")
+            ui.write(traceback.format_exc())
 
 
 # ----------------- [4. 強化專案] -----------------
 def process_project(files, sh):
-    f1 = next((f for f in files if any(k in f.name for k in ["強化", "法條", "自選匯出"])), None)
+    # 同內容重複上傳只計一次；多份法條報表（例：整年度各週匯出）即合併為一次統計
+    files = list({parse_cache.file_digest(f): f for f in files}.values())
+    f1_list = [f for f in files if any(k in f.name for k in ["強化", "法條", "自選匯出"])]
     f2_list = [f for f in files if any(k in f.name.upper() for k in ["R17", "砂石", "大貨"])]
 
-    if not f1 or not f2_list:
-        st.error("❌ 找不到強化專案報表！需包含法條與R17大型車資料。")
+    if not f1_list or not f2_list:
+        ui.error("❌ 找不到強化專案報表！需包含法條與R17大型車資料。")
         return
 
     def s_read(f, **kwargs):
@@ -641,29 +753,42 @@ def process_project(files, sh):
             except: f.seek(0); return pd.read_csv(f, encoding='cp950', **kwargs)
         return pd.read_excel(f, **kwargs)
 
-    date_str = "未知期間"
-    df1_h = s_read(f1, nrows=10, header=None)
-    for _, r in df1_h.iterrows():
-        for c in r.values:
-            if '統計期間' in str(c):
-                m = re.search(r'([0-9年月日\-至\s]+)', str(c).replace('(入案日)', '').split('：')[-1].split(':')[-1].strip())
-                if m: date_str = m.group(1).replace('115', '').strip()
-
     def m_uniq(df):
         cols = pd.Series(df.columns.map(str))
         for d in cols[cols.duplicated()].unique():
             cols[cols == d] = [f"{d}_{i}" if i != 0 else d for i in range(sum(cols == d))]
         df.columns = cols; return df
 
-    df1 = m_uniq(s_read(f1, skiprows=3)).reset_index(drop=True)
+    def open_book(f):
+        return None if f.name.endswith('.csv') else Workbook(f)
+
+    def read_project_main(f):
+        date_str = "未知期間"
+        wb = open_book(f)
+        df1_h = wb.head(0, 10) if wb else s_read(f, nrows=10, header=None)
+        for _, r in df1_h.iterrows():
+            for c in r.values:
+                if '統計期間' in str(c):
+                    m = re.search(r'([0-9年月日\-至\s]+)', str(c).replace('(入案日)', '').split('：')[-1].split(':')[-1].strip())
+                    if m: date_str = m.group(1).replace('115', '').strip()
+        df1 = wb.table(0, 3) if wb else s_read(f, skiprows=3)
+        return date_str, m_uniq(df1).reset_index(drop=True)
+
+    def read_r17(f):
+        wb = open_book(f)
+        df_t = wb.frame(0) if wb else s_read(f, header=None)
+        h_idx = next((i for i, r in df_t.head(30).iterrows() if '單位' in [str(x).strip() for x in r.values] and '舉發總數' in [str(x).strip() for x in r.values]), None)
+        if h_idx is None: return None
+        df_c = df_t.iloc[h_idx + 1:].copy()
+        df_c.columns = [str(x).strip() for x in df_t.iloc[h_idx].values]
+        return m_uniq(df_c).reset_index(drop=True)
+
+    mains = [parse_cache.cached(f, "project.main", read_project_main) for f in f1_list]
     df2_all = []
     for f in f2_list:
-        df_t = s_read(f, header=None)
-        h_idx = next((i for i, r in df_t.head(30).iterrows() if '單位' in [str(x).strip() for x in r.values] and '舉發總數' in [str(x).strip() for x in r.values]), None)
-        if h_idx is not None:
-            df_c = df_t.iloc[h_idx + 1:].copy()
-            df_c.columns = [str(x).strip() for x in df_t.iloc[h_idx].values]
-            df_c = m_uniq(df_c).reset_index(drop=True)
+        df_c = parse_cache.cached(f, "project.r17", read_r17)
+        if df_c is not None:
+            df_c = df_c.copy()
             df_c['來源檔名'] = str(f.name)
             df2_all.append(df_c)
 
@@ -682,15 +807,35 @@ def process_project(files, sh):
         if '龍潭派出所' in raw or raw in ['龍潭', '龍潭所']: return '龍潭所'
         return None
 
-    def get_c(unit):
-        r = df1[df1.get('單位', pd.Series()).apply(get_unit) == unit]
-        return {cat: int(r[[col for col in df1.columns if any(k in str(col) for k in PROJECT_LAW_MAP.get(cat, []))]].sum().sum()) if not r.empty else 0 for cat in PROJECT_CATS[:5]}
+    def unit_of(col):
+        # 單位名稱種類很少，逐一判斷後再對應回整欄
+        raw = col.astype(object)
+        return raw.map({v: get_unit(v) for v in raw.unique()})
+
+    def law_counts(df1):
+        # 法條欄位索引每份檔案只建立一次，全部單位 × 類別以一次 groupby 加總
+        if '單位' not in df1.columns: return pd.DataFrame(columns=PROJECT_CATS[:5])
+        idx = {cat: [col for col in df1.columns if any(k in str(col) for k in PROJECT_LAW_MAP.get(cat, []))] for cat in PROJECT_CATS[:5]}
+        used = list(dict.fromkeys(c for cols in idx.values() for c in cols))
+        num = df1[used].apply(pd.to_numeric, errors='coerce')
+        per_cat = pd.DataFrame({cat: num[cols].sum(axis=1) for cat, cols in idx.items()}, index=df1.index)
+        return per_cat.groupby(unit_of(df1['單位'])).sum()
+
+    def period_label(dates):
+        if len(dates) == 1: return dates[0]
+        dates = sorted(dates, key=lambda d: [int(x) for x in re.findall(r'\d+', d)[:2]] or [99])
+        first, last = dates[0], dates[-1]
+        if '至' in first and '至' in last: return f"{first.split('至')[0].strip()}至{last.split('至')[-1].strip()}（{len(dates)}期合計）"
+        return f"{first}～{last}（{len(dates)}期合計）"
+
+    date_str = period_label([d for d, _ in mains])
+    counts = pd.concat([law_counts(df1) for _, df1 in mains]).groupby(level=0).sum()
+    heavy = df2.groupby(unit_of(df2['單位']))['大型車純違規'].sum()
 
     final_rows = []
     for u, tgts in PROJECT_TARGETS.items():
-        d15 = get_c(u)
-        u_r = df2[df2['單位'].apply(get_unit) == u]
-        h_sum = int(u_r['大型車純違規'].sum()) if not u_r.empty else 0
+        d15 = {cat: int(counts.at[u, cat]) if u in counts.index else 0 for cat in PROJECT_CATS[:5]}
+        h_sum = int(heavy.get(u, 0))
 
         res = [u]
         for i, cat in enumerate(PROJECT_CATS):
@@ -707,8 +852,8 @@ def process_project(files, sh):
         t_row.extend([int(cs), int(ts), f"{(cs / ts * 100):.1f}%" if ts > 0 else "0.0%"])
     df_f = pd.concat([pd.DataFrame([t_row], columns=headers), df_f], ignore_index=True)
 
-    st.write(f"📊 **{PROJECT_NAME} 統計結果：**")
-    st.dataframe(df_f, hide_index=True)
+    ui.write(f"📊 **{PROJECT_NAME} 統計結果：**")
+    ui.dataframe(df_f, hide_index=True)
 
     if sh:
         ws = get_or_create_ws(sh, PROJECT_NAME, rows=40, cols=25)
@@ -772,32 +917,55 @@ def process_project(files, sh):
             }})
 
         _sh_batch_update(sh, {"requests": reqs})
-        st.write("✅ 強化專案雲端同步完成 (未達100%自動標示紅字)")
+        ui.write("✅ 強化專案雲端同步完成 (未達100%自動標示紅字)")
 
 
 # ----------------- [5. 交通事故] -----------------
 def process_accident(files, sh):
-    meta = []
-    for f in files:
+    def parse_accident_file(f):
         f.seek(0)
-        df_raw = pd.read_csv(f, header=None) if f.name.endswith('.csv') else pd.read_excel(f, header=None)
+        df_raw = pd.read_csv(f, header=None) if f.name.endswith('.csv') else Workbook(f).frame(0)
         dates = re.findall(r'(\d{3})[./](\d{1,2})[./](\d{1,2})', str(df_raw.iloc[:5, :5].values))
-        if len(dates) >= 2:
-            df_raw[0] = df_raw[0].astype(str)
-            df_data = df_raw[df_raw[0].str.contains("所|總計|合計", na=False)].rename(
-                columns={0: "Station", 5: "A1_Deaths", 9: "A2_Injuries"})
-            for c in ["A1_Deaths", "A2_Injuries"]:
-                df_data[c] = pd.to_numeric(df_data[c].astype(str).str.replace(",", ""), errors='coerce').fillna(0)
-            df_data['Station_Short'] = df_data['Station'].str.replace('派出所', '所').str.replace('總計', '合計').str.strip()
-            meta.append({'df': df_data, 'year': int(dates[1][0]), 'start_day': int(dates[0][1]) * 100 + int(dates[0][2]),
-                         'range': f"{int(dates[0][1]):02d}{int(dates[0][2]):02d}-{int(dates[1][1]):02d}{int(dates[1][2]):02d}",
-                         'is_cumu': (int(dates[0][1]) == 1 and int(dates[0][2]) == 1)})
-
-    this_year = max(m['year'] for m in meta)
-    f_lst = sorted([f for f in meta if f['year'] < this_year], key=lambda x: x['year'])[-1]
-    f_cur = next(f for f in meta if f['year'] == this_year and f['is_cumu'])
-    period_files = sorted([f for f in meta if f['year'] == this_year and not f['is_cumu']], key=lambda x: x['start_day'])
-    f_prev, f_wk = period_files[0], period_files[1]
+        if len(dates) < 2: return None
+        df_raw[0] = df_raw[0].astype(str)
+        df_data = df_raw[df_raw[0].str.contains("所|總計|合計", na=False)].rename(
+            columns={0: "Station", 5: "A1_Deaths", 9: "A2_Injuries"})
+        for c in ["A1_Deaths", "A2_Injuries"]:
+            df_data[c] = pd.to_numeric(df_data[c].astype(str).str.replace(",", ""), errors='coerce').fillna(0)
+        df_data['Station_Short'] = df_data['Station'].str.replace('派出所', '所').str.replace('總計', '合計').str.strip()
+        return {'df': df_data, 'year': int(dates[1][0]), 'start_day': int(dates[0][1]) * 100 + int(dates[0][2]),
+                'range': f"{int(dates[0][1]):02d}{int(dates[0][2]):02d}-{int(dates[1][1]):02d}{int(dates[1][2]):02d}",
+                'is_cumu': (int(dates[0][1]) == 1 and int(dates[0][2]) == 1)}
+
+    uploaded = [m for m in (parse_cache.cached(f, "accident.period", parse_accident_file) for f in files) if m]
+    if not uploaded: raise ValueError("上傳的交通事故報表無法辨識統計期間")
+    period_store.save_accident_periods(uploaded)
+
+    # 以本次上傳為準，缺少的期別由存檔補齊（同一期以上傳內容覆蓋存檔）
+    pool = {(m['year'], m['range']): m for m in period_store.load_accident_periods()}
+    pool.update({(m['year'], m['range']): m for m in uploaded})
+    meta = list(pool.values())
+
+    def end_day(m): return int(m['range'][-4:])
+
+    this_year = max(m['year'] for m in uploaded)
+    cutoff = max(end_day(m) for m in uploaded if m['year'] == this_year)
+    cur_year = [m for m in meta if m['year'] == this_year and end_day(m) <= cutoff]
+    cumu = [m for m in cur_year if m['is_cumu']]
+    period_files = sorted([m for m in cur_year if not m['is_cumu']], key=lambda x: (x['start_day'], end_day(x)))
+    if not cumu or len(period_files) < 2:
+        raise ValueError(f"{this_year} 年本年累計或週期報表不足（需本年累計 1 份、週期 2 份，可分次上傳）")
+    f_cur = max(cumu, key=end_day)
+    f_prev, f_wk = period_files[-2], period_files[-1]
+    # 去年同期：去年的累計報表，起日相同、結束日相差不超過 MATCH_DAYS 天；本次有上傳者優先，其次取結束日最接近者
+    uploaded_ids = {id(m) for m in uploaded}
+    last_year = []
+    for m in meta:
+        gap = period_store.period_gap(f_cur['range'], m['range']) if m['year'] == this_year - 1 and m['is_cumu'] else None
+        if gap is not None and gap <= period_store.MATCH_DAYS:
+            last_year.append((id(m) not in uploaded_ids, gap, m))
+    if not last_year: raise ValueError(f"缺少去年同期累計報表（{this_year - 1} 年 {f_cur['range']}）")
+    f_lst = min(last_year, key=lambda x: x[:2])[2]
 
     labels = {"wk": f_wk['range'], "prev": f_prev['range'], "cur": f_cur['range'], "lst": f_lst['range']}
     stations = ['聖亭所', '龍潭所', '中興所', '石門所', '高平所', '三和所']
@@ -824,7 +992,7 @@ def process_accident(files, sh):
 
     a1_res, a2_res = bld_tbl('A1_Deaths'), bld_tbl('A2_Injuries', True)
 
-    c1, c2 = st.columns(2)
+    c1, c2 = ui.columns(2)
     c1.write("📊 **A1 死亡人數統計**"); c1.dataframe(a1_res, hide_index=True)
     c2.write("📊 **A2 受傷人數統計**"); c2.dataframe(a2_res, hide_index=True)
 
@@ -858,65 +1026,46 @@ def process_accident(files, sh):
             _ws_update(ws, 'A3', data_rows)
             _sh_batch_update(sh, {"requests": reqs})
 
-        st.write("✅ 交通事故雲端已更新")
+        ui.write("✅ 交通事故雲端已更新")
 
 
 # ----------------- [6. 靜桃計畫] -----------------
 def process_jing_tao(files, sh):
-    df = None
-    for f in files:
+    def load_jing_tao(f):
+        df = None
         f.seek(0)
         is_excel_file = f.name.lower().endswith(('.xlsx', '.xls'))
         if is_excel_file:
             try:
-                xls = pd.ExcelFile(f)
-                target_sheet = next((s for s in xls.sheet_names if '靜桃' in s), None)
-                if not target_sheet and len(xls.sheet_names) > 1: target_sheet = xls.sheet_names[1]
-                elif not target_sheet: target_sheet = xls.sheet_names[0]
-
-                df_temp = pd.read_excel(xls, sheet_name=target_sheet, header=None, nrows=50)
-                for idx, row in df_temp.iterrows():
-                    row_str = " ".join([str(x) for x in row if pd.notna(x)])
-                    if '通報日期' in row_str:
-                        f.seek(0); df = pd.read_excel(xls, sheet_name=target_sheet, skiprows=idx); break
-                if df is not None: break
+                with Workbook(f) as wb:
+                    target_sheet = next((s for s in wb.sheet_names if '靜桃' in s), None)
+                    if not target_sheet and len(wb.sheet_names) > 1: target_sheet = wb.sheet_names[1]
+                    elif not target_sheet: target_sheet = wb.sheet_names[0]
+                    df = wb.below_header(target_sheet, lambda r: '通報日期' in " ".join([str(x) for x in r if pd.notna(x)]))
+                if df is not None: return df
             except Exception: pass
 
-        if df is None:
-            f.seek(0); raw_bytes = f.read()
-            for enc in ['utf-8-sig', 'utf-8', 'cp950', 'big5']:
-                try:
-                    text = raw_bytes.decode(enc, errors='ignore'); lines = text.splitlines()
-                    for idx, line in enumerate(lines[:50]):
-                        if '通報日期' in line:
-                            f.seek(0); df = pd.read_csv(f, encoding=enc, skiprows=idx, engine='python', on_bad_lines='skip'); break
-                    if df is not None: break
-                except: continue
+        try: return read_jing_tao_csv(f)
+        except Exception: return None
+
+    df = None
+    for f in files:
+        df = parse_cache.cached(f, "jingtao.list", load_jing_tao)
         if df is not None: break
 
     if df is None:
-        st.error("❌ 找不到包含『通報日期』欄位的清冊檔案！")
+        ui.error("❌ 找不到包含『通報日期』欄位的清冊檔案！")
         return
 
-    df.columns = [str(c).strip().replace('\u3000', '').replace('\n', '') for c in df.columns]
-    date_col = next((c for c in df.columns if '通報日期' in c), None)
-    unit_col = next((c for c in df.columns if '所別' in c or ('單位' in c and '舉發單位' not in c)), None)
-    col_22 = next((c for c in df.columns if re.search(r'22.{0,3}0?6|夜間|深夜', c)), None)
-    col_06 = next((c for c in df.columns if re.search(r'0?6.{0,3}22|日間|白天', c)), None)
+    df.columns = [clean_col(c) for c in df.columns]
+    date_col, unit_col, col_22, col_06 = jing_tao_columns(df.columns)
 
     if not date_col or not unit_col: return
-    if not col_22 and not col_06: st.warning("⚠️ 找不到日夜間欄位，將顯示為0但仍會計算總計。")
-
-    def parse_roc_date(val):
-        if pd.isna(val): return pd.NaT
-        s = str(val).strip().split(' ')[0]
-        parts = re.split(r'[/\-]', s)
-        if len(parts) == 3:
-            try: return pd.Timestamp(year=int(parts[0]) + 1911, month=int(parts[1]), day=int(parts[2]))
-            except: pass
-        return pd.NaT
-
-    df['_date'] = df[date_col].apply(parse_roc_date)
+    if not col_22 and not col_06: ui.warning("⚠️ 找不到日夜間欄位，將顯示為0但仍會計算總計。")
+
+    # 民國日期（例：113/01/05 08:30）整欄一次轉換，無效日期為 NaT
+    ymd = df[date_col].astype(str).str.strip().str.split(' ').str[0].str.extract(r'^\s*(\d+)[/\-](\d+)[/\-](\d+)\s*$').astype(float)
+    df['_date'] = pd.to_datetime(pd.DataFrame({'year': ymd[0] + 1911, 'month': ymd[1], 'day': ymd[2]}), errors='coerce')
     today = datetime.now()
     end_dt = today - timedelta(days=1)
     start_dt = end_dt - timedelta(days=6)
@@ -948,8 +1097,8 @@ def process_jing_tao(files, sh):
     h2 = ['', c_22_l, c_06_l, c_22_l, c_06_l, '']
     df_res = pd.DataFrame(results, columns=pd.MultiIndex.from_arrays([h1, h2]))
 
-    st.write("📊 **「靜桃計畫」大執法專案統計表：**")
-    st.dataframe(df_res, use_container_width=True)
+    ui.write("📊 **「靜桃計畫」大執法專案統計表：**")
+    ui.dataframe(df_res, use_container_width=True)
 
     if sh:
         try:
@@ -988,13 +1137,72 @@ def process_jing_tao(files, sh):
                     }})
 
             _sh_batch_update(sh, {"requests": reqs})
-            st.write("✅ 靜桃計畫數據同步完成")
+            ui.write("✅ 靜桃計畫數據同步完成")
         except Exception as e:
-            st.error(f"雲端同步出錯：{e}")
+            ui.error(f"雲端同步出錯：{e}")
 
 
 # ==========================================
-# 5. 首頁與側邊欄選單
+# 5. 批次排程（循序 / 並行）
+# ==========================================
+HUB_TASKS = [
+    ("科技執法", "📸 處理【科技執法】...", process_tech_enforcement),
+    ("超載統計", "🚛 處理【超載統計】...", process_overload),
+    ("重大違規", "🚨 處理【重大交通違規】...", process_major),
+    ("強化專案", "🔥 處理【強化專案】...", process_project),
+    ("交通事故", "🚑 處理【交通事故】...", process_accident),
+    ("靜桃計畫", "🤫 處理【靜桃計畫】...", process_jing_tao),
+]
+
+
+def run_hub(tasks, cat_files, sh, workers):
+    # 各類別在工作執行緒中解析與計算（workers=1 即依序處理）；雲端寫入仍經由 _ACTIVE_WRITER 依序送出
+    job, span = jobs.current(), tracing.current()
+    done = itertools.count(1)
+
+    def run_one(cat, label, fn):
+        with jobs.attach(job), tracing.attach(span):
+            try:
+                with jobs.section(cat, label), _ACTIVE_PLAN.section(cat), tracing.stage(f"hub.{cat}", files=len(cat_files[cat])):
+                    try:
+                        fn(cat_files[cat], sh)
+                    except Exception as e:
+                        ui.error(f"⚠️ {cat} 處理發生錯誤：{e}")
+                        ui.write(traceback.format_exc())
+                        raise
+            except Exception:
+                return cat
+            finally:
+                jobs.progress(next(done) / (len(tasks) + 1), f"{cat} 處理完畢")
+        return None
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(tasks)))) as pool:
+        futures = [pool.submit(run_one, cat, label, fn) for cat, label, fn in tasks]
+        return [f.result() for f in futures if f.result()]
+
+
+def run_hub_job(tasks, cat_files, parallel, full_sync):
+    # 背景工作本體：解析全部類別後一次同步雲端，失敗時拋出例外讓工作標示為錯誤
+    global _ACTIVE_WRITER, _ACTIVE_PLAN
+    with tracing.stage("hub.batch", files=sum(len(v) for v in cat_files.values()), parallel=parallel):
+        sh = get_gsheet_connection()
+        _ACTIVE_WRITER = _SheetsWriter()
+        _ACTIVE_PLAN = WritePlan()
+        try:
+            failed = run_hub(tasks, cat_files, sh, HUB_MAX_WORKERS if parallel else 1)
+            jobs.progress(len(tasks) / (len(tasks) + 1), "☁️ 同步雲端中…")
+            failed += flush_write_plan(_ACTIVE_PLAN, sh, full=full_sync)
+        finally:
+            _ACTIVE_WRITER.close()
+            _ACTIVE_WRITER = None
+            _ACTIVE_PLAN = None
+    if failed:
+        raise RuntimeError("、".join(failed) + " 處理失敗")
+    return len(tasks)
+
+
+# ==========================================
+# 6. 首頁與側邊欄選單
 # ==========================================
 try:
     from menu import show_sidebar
@@ -1010,11 +1218,11 @@ st.divider()
 st.subheader("🚀 啟動全自動批次作業")
 
 if uploads:
-    file_hash = sum([f.size for f in uploads]) + len(uploads)
+    file_hash = parse_cache.batch_digest(uploads)
     if st.session_state.get("last_processed_hash") == file_hash:
         st.success("✅ 目前上傳的檔案皆已全自動處理完畢！")
         st.info("💡 若要處理新報表，請重新整理頁面或拖入新檔案。")
-    else:
+    elif st.session_state.get("hub_job_hash") != file_hash:
         cat_files = {"科技執法": [], "重大違規": [], "超載統計": [], "強化專案": [], "交通事故": [], "靜桃計畫": []}
 
         for f in uploads:
@@ -1026,41 +1234,28 @@ if uploads:
             elif any(k in name for k in ["a1", "a2", "事故", "案件統計"]):     cat_files["交通事故"].append(f)
             elif any(k in name for k in ["靜桃", "噪音", "改裝車", "總表", "詳細資料"]): cat_files["靜桃計畫"].append(f)
 
-        try:
-            sh = get_gsheet_connection()
-
-            if cat_files["科技執法"]:
-                with st.status("📸 處理【科技執法】...", expanded=True):
-                    process_tech_enforcement(cat_files["科技執法"], sh)
-                    time.sleep(1.5)
-
-            if cat_files["超載統計"]:
-                with st.status("🚛 處理【超載統計】...", expanded=True):
-                    process_overload(cat_files["超載統計"], sh)
-                    time.sleep(1.5)
-
-            if cat_files["重大違規"]:
-                with st.status("🚨 處理【重大交通違規】...", expanded=True):
-                    process_major(cat_files["重大違規"], sh)
-                    time.sleep(1.5)
-
-            if cat_files["強化專案"]:
-                with st.status("🔥 處理【強化專案】...", expanded=True):
-                    process_project(cat_files["強化專案"], sh)
-                    time.sleep(1.5)
-
-            if cat_files["交通事故"]:
-                with st.status("🚑 處理【交通事故】...", expanded=True):
-                    process_accident(cat_files["交通事故"], sh)
-                    time.sleep(1.5)
-
-            if cat_files["靜桃計畫"]:
-                with st.status("🤫 處理【靜桃計畫】...", expanded=True):
-                    process_jing_tao(cat_files["靜桃計畫"], sh)
-
-            st.session_state["last_processed_hash"] = file_hash
-            st.balloons()
-
-        except Exception as e:
-            st.error(f"⚠️ 批次處理發生錯誤：{e}")
-            st.write(traceback.format_exc())
+        parallel = st.toggle("⚡ 並行處理模式（各類別同時解析，雲端寫入統一排隊）", value=True)
+        full_sync = st.checkbox("🔁 強制完整重寫雲端表格（雲端曾被手動修改時使用）", value=False)
+        # 選項確定後按下按鈕才送出工作，送出的即為畫面上所選的設定
+        if st.button("🚀 開始處理", type="primary", use_container_width=True):
+            tasks = [(cat, label, fn) for cat, label, fn in HUB_TASKS if cat_files[cat]]
+            # 上傳檔複製後交給背景工作：之後重跑、重新整理或關閉分頁都不會中斷處理
+            frozen = {cat: [jobs.freeze_upload(f) for f in fs] for cat, fs in cat_files.items()}
+            job_id = jobs.submit(f"🚀 批次作業（{len(uploads)} 個檔案）", run_hub_job, tasks, frozen, parallel, full_sync,
+                                 kind="hub", meta={"hash": file_hash})
+            jobs.remember("hub_job", job_id)
+            st.session_state["hub_job_hash"] = file_hash
+            st.rerun()
+
+# 本工作階段（或重新連線前，由網址參數帶回）送出的批次工作；不顯示其他使用者的工作
+hub_job = jobs.get(jobs.recall("hub_job"))
+if hub_job is not None:
+    st.caption(f"工作編號：{hub_job.id}")
+    hub_job = jobs.show(hub_job.id)
+    if hub_job.state == "complete" and st.session_state.get("last_processed_hash") != hub_job.meta.get("hash"):
+        st.session_state["last_processed_hash"] = hub_job.meta.get("hash")
+        if uploads: st.balloons()
+    elif hub_job.state == "error" and uploads and st.button("🔁 重新執行批次作業"):
+        st.session_state.pop("hub_job_hash", None)
+        jobs.forget("hub_job")
+        st.rerun()
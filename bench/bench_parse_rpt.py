@@ -0,0 +1,66 @@
+import os
+import re
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from report_parsers import scan_unit_totals  # noqa: E402
+
+# ==========================================
+# 超載報表掃描：原逐列版 vs 欄向量化版
+#   python bench/bench_parse_rpt.py [明細列數/單位] [重複次數]
+# ==========================================
+UNITS = ['聖亭派出所', '龍潭派出所', '中興派出所', '石門派出所', '高平派出所', '三和派出所', '警備隊', '龍潭交通分隊']
+
+
+def legacy_scan(df):
+    # 原 process_overload.parse_rpt 的逐列掃描（保留作為對照組）
+    out, u = [], None
+    for _, r in df.iterrows():
+        rs = " ".join([str(x) for x in r.values])
+        if "舉發單位：" in rs:
+            m2 = re.search(r"舉發單位：(\S+)", rs)
+            if m2: u = m2.group(1).strip()
+        if "總計" in rs and u:
+            nums = [float(str(x).replace(',', '')) for x in r if str(x).replace('.', '', 1).isdigit()]
+            if nums:
+                out.append((u, int(nums[-1])))
+                u = None
+    return out
+
+
+def make_sheet(rows_per_unit):
+    rows = [["取締超載違規件數統計表", None, None, None, None, None],
+            ["統計期間：1140101 至 1141231", None, None, None, None, None]]
+    for i, unit in enumerate(UNITS):
+        rows.append([f"舉發單位：{unit}", None, None, None, None, None])
+        rows.append(["違規日期", "車號", "法條", "超載噸數", "件數", "備註"])
+        for j in range(rows_per_unit):
+            rows.append([f"114/{j % 12 + 1:02d}/{j % 28 + 1:02d}", f"KLA-{j:04d}", "29條之2", f"{(j % 9) + 0.5}", 1, None])
+        rows.append(["總計", None, None, None, None, rows_per_unit + i])
+    return pd.DataFrame(rows, dtype=object)
+
+
+def bench(fn, df, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        res = fn(df)
+        best = min(best, time.perf_counter() - t0)
+    return best, res
+
+
+def main():
+    rows_per_unit = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    df = make_sheet(rows_per_unit)
+    t_old, r_old = bench(legacy_scan, df, repeat)
+    t_new, r_new = bench(scan_unit_totals, df, repeat)
+    assert r_old == r_new, (r_old, r_new)
+    print(f"rows={len(df)}  legacy={t_old * 1000:.1f} ms  vectorized={t_new * 1000:.1f} ms  speedup={t_old / t_new:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import sheets_backend  # noqa: E402
+from sheets_plan import WritePlan  # noqa: E402
+
+# ==========================================
+# 寫入路徑在本機 Sheets 後端上的比較（不需 Google 憑證）
+#   逐分頁 clear + update  vs  WritePlan 單一 batchUpdate
+#   python bench/bench_sheets_backend.py [分頁數] [延遲秒] [429 機率]
+# ==========================================
+
+
+def make_tables(n_tabs, rows=30):
+    return {f"分頁{i}": [["單位", "本期", "去年同期", "增減"]] +
+            [[f"單位{r}", r * 3 + i, r * 2, r + i] for r in range(rows)]
+            for i in range(n_tabs)}
+
+
+def open_book(path, **opts):
+    sh = sheets_backend.local_client(path=path, **opts).open_by_key("bench")
+    session = sh.client.session
+    return sh, session
+
+
+def per_tab(sh, tables):
+    for title, values in tables.items():
+        ws = sh.worksheet(title)
+        ws.clear()
+        ws.update(values, "A1")
+
+
+def one_batch(sh, tables):
+    plan = WritePlan()
+    for title, values in tables.items():
+        ws = sh.worksheet(title)
+        plan.clear(ws)
+        plan.values(ws, "A1", values)
+    return plan.flush(sh.batch_update)
+
+
+def run(label, fn, path, tables, **opts):
+    sh, session = open_book(path, **opts)
+    session.reset_stats()
+    t0 = time.perf_counter()
+    errors = fn(sh, tables)
+    dt = time.perf_counter() - t0
+    s = session.stats
+    print(f"{label:<12} {dt:7.2f} s  requests={s['requests']:<4} read={s['read']:<4} write={s['write']:<4} 429={s['429']}")
+    assert not errors, errors
+    return {t: sh.worksheet(t).get_all_values() for t in tables}
+
+
+def main():
+    n_tabs = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.05
+    error_rate = float(sys.argv[3]) if len(sys.argv) > 3 else 0.0
+    tables = make_tables(n_tabs)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.sqlite")
+        sh, _ = open_book(path)
+        for title in tables:
+            sh.add_worksheet(title, rows=10, cols=4)
+        opts = {"latency": latency, "error_rate": error_rate, "seed": 0}
+        print(f"tabs={n_tabs}  latency={latency}s  error_rate={error_rate}")
+        a = run("per-tab", per_tab, path, tables, **opts)
+        b = run("one-batch", one_batch, path, tables, **opts)
+        assert a == b
+
+
+if __name__ == "__main__":
+    main()
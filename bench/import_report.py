@@ -0,0 +1,125 @@
+import argparse
+import ast
+import glob
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# ==========================================
+# 各頁面冷啟動匯入耗時報告
+#   python bench/import_report.py                  # 全部頁面（app.py 與 pages/*.py）
+#   python bench/import_report.py p06 p16 app      # 指定頁面
+#   python bench/import_report.py --json out.json  # 另存完整結果（"-" 為輸出到 stdout）
+#   python bench/import_report.py --budget 0.5     # 任一頁面超過 0.5 秒即結束碼 1
+#
+#   每個頁面在獨立子程序中量測：先載入 BASE_MODULES（Streamlit 伺服器啟動時已載入、各頁共用），
+#   再依序執行頁面最上層的 import 敘述並逐條計時，只計頁面自己多付出的匯入成本。
+#   函式內的延遲匯入不列入（那是按下功能時才付出的成本）。
+# ==========================================
+BASE_MODULES = ("streamlit", "pandas")
+TOP_N = 3
+
+_CHILD = r"""
+import json, os, sys, time
+root, path = sys.argv[1], sys.argv[2]
+sys.path[:0] = [root, os.path.dirname(path)]
+os.chdir(root)
+for m in sys.argv[3].split(","):
+    __import__(m)
+out = []
+for src in json.load(sys.stdin):
+    t0 = time.perf_counter()
+    try:
+        exec(src, {"__name__": "__import_report__"})
+        err = ""
+    except BaseException as e:
+        err = f"{type(e).__name__}: {e}"
+    out.append({"stmt": src, "s": time.perf_counter() - t0, "error": err})
+print(json.dumps(out))
+"""
+
+
+def page_imports(path):
+    # 最上層（含 try 區塊內）的 import 敘述原文
+    with open(path, encoding="utf-8") as fh:
+        src = fh.read()
+    stmts = []
+    for node in ast.parse(src, path).body:
+        for n in (node.body if isinstance(node, ast.Try) else [node]):
+            if isinstance(n, (ast.Import, ast.ImportFrom)):
+                stmts.append(ast.get_source_segment(src, n))
+    return stmts
+
+
+def measure(path, base=BASE_MODULES):
+    proc = subprocess.run(
+        [sys.executable, "-c", _CHILD, ROOT, path, ",".join(base)],
+        input=json.dumps(page_imports(path)), capture_output=True, text=True, cwd=ROOT,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "子程序失敗")
+    rows = json.loads(proc.stdout.strip().splitlines()[-1])
+    return {"total_s": round(sum(r["s"] for r in rows), 4),
+            "imports": sorted(({**r, "s": round(r["s"], 4)} for r in rows), key=lambda r: -r["s"])}
+
+
+def page_files(names=()):
+    files = [os.path.join(ROOT, "app.py")] + sorted(glob.glob(os.path.join(ROOT, "pages", "*.py")))
+    if names:
+        files = [f for f in files if os.path.splitext(os.path.basename(f))[0] in names]
+    return files
+
+
+def report(names=(), progress=None):
+    out = {}
+    for f in page_files(names):
+        name = os.path.relpath(f, ROOT)
+        if progress:
+            progress(name)
+        try:
+            out[name] = measure(f)
+        except Exception as e:
+            out[name] = {"total_s": None, "imports": [], "error": str(e)}
+    return out
+
+
+def _note(err):
+    if not err:
+        return ""
+    return " (未安裝)" if err.startswith("ModuleNotFoundError") else " (失敗)"
+
+
+def main():
+    ap = argparse.ArgumentParser(description="各頁面冷啟動匯入耗時報告")
+    ap.add_argument("pages", nargs="*", help="頁面名稱，例：app p06 p16")
+    ap.add_argument("--json", help="另存完整結果的路徑（- 為 stdout）")
+    ap.add_argument("--budget", type=float, help="單頁匯入耗時上限（秒）")
+    args = ap.parse_args()
+
+    res = report(args.pages, progress=None if args.json == "-" else lambda n: print(f"… {n}", file=sys.stderr))
+    if args.json == "-":
+        print(json.dumps(res, ensure_ascii=False, indent=1))
+    else:
+        print(f"\n{'頁面':<16}{'匯入秒':>8}  最耗時的匯入（基準：{', '.join(BASE_MODULES)} 已載入）")
+        for name, r in sorted(res.items(), key=lambda kv: -(kv[1]["total_s"] or 0)):
+            if r["total_s"] is None:
+                print(f"{name:<16}{'失敗':>8}  {r['error']}")
+                continue
+            top = "；".join(f"{i['stmt'].splitlines()[0][:40]} {i['s']:.3f}s" + _note(i["error"])
+                           for i in r["imports"][:TOP_N])
+            print(f"{name:<16}{r['total_s']:>8.3f}  {top}")
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as fh:
+                json.dump(res, fh, ensure_ascii=False, indent=1)
+
+    over = [n for n, r in res.items() if args.budget is not None and (r["total_s"] or 0) > args.budget]
+    if over:
+        print(f"\n超過 {args.budget}s：{', '.join(over)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
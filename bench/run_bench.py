@@ -0,0 +1,249 @@
+import argparse
+import ast
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# ==========================================
+# 各處理器效能測試（合成報表，不需真實資料與 Google 憑證）
+#   python bench/run_bench.py                      # 1 倍，與 bench/baseline.json 比較
+#   python bench/run_bench.py --scale 1 10 100     # 多種倍數
+#   python bench/run_bench.py --only hub. p27.     # 依名稱前綴篩選
+#   python bench/run_bench.py --update-baseline    # 將本次結果存為新基準
+#   python bench/run_bench.py --sheets local       # 連同雲端寫入（本機 Sheets 後端）一起計時
+#
+#   每次重複都使用全新的解析快取目錄（冷啟動）；取中位數與基準比較，
+#   慢於基準 THRESHOLD 倍且差距超過 NOISE_S 秒即列為退步，結束碼為 1。
+# ==========================================
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+DATA_DIR = os.path.join(ROOT, ".cache", "bench")
+THRESHOLD = 1.25
+NOISE_S = 0.05
+
+_TMP = tempfile.mkdtemp(prefix="bench-")
+# 測試期間的快取、紀錄與本機試算表全部放在暫存目錄，不影響正式資料
+os.environ.setdefault("HUB_PARSE_CACHE_DIR", os.path.join(_TMP, "parse"))
+os.environ.setdefault("HUB_PERIOD_STORE", os.path.join(_TMP, "periods.sqlite"))
+os.environ.setdefault("HUB_JOBS_DIR", os.path.join(_TMP, "jobs"))
+os.environ.setdefault("TRACE_LOG", os.path.join(_TMP, "trace.jsonl"))
+os.environ.setdefault("SHEETS_LOCAL_DB", os.path.join(_TMP, "sheets.sqlite"))
+os.environ.setdefault("SHEETS_READ_PER_MIN", "100000")
+os.environ.setdefault("SHEETS_WRITE_PER_MIN", "100000")
+
+import pandas as pd  # noqa: E402
+from streamlit import config as st_config, logger as st_logger  # noqa: E402
+
+import jobs  # noqa: E402
+import parse_cache  # noqa: E402
+import synth  # noqa: E402
+import tracing  # noqa: E402
+
+
+# ==========================================
+# 載入頁面中的函式（略過 st.* 畫面呼叫）
+# ==========================================
+_KEEP = (ast.Import, ast.ImportFrom, ast.FunctionDef, ast.ClassDef, ast.Assign, ast.AnnAssign, ast.Try)
+
+
+def load_defs(rel_path):
+    # 只執行最上層的 import、常數、函式與類別定義；個別失敗（例：缺少 pdf2image）即略過
+    path = os.path.join(ROOT, rel_path)
+    with open(path, encoding="utf-8") as fh:
+        tree = ast.parse(fh.read(), path)
+    ns = {"__name__": "bench_" + os.path.basename(path)[:-3], "__file__": path}
+    for node in tree.body:
+        if isinstance(node, _KEEP):
+            try:
+                exec(compile(ast.Module([node], []), path, "exec"), ns)
+            except Exception:
+                pass
+    return ns
+
+
+# ==========================================
+# 合成檔案（依倍數快取於 .cache/bench，產生一次重複使用）
+# ==========================================
+def files_for(key, scale):
+    folder = os.path.join(DATA_DIR, f"v{synth.SYNTH_VERSION}", f"x{scale}", key)
+    if not os.path.isdir(folder):
+        tmp = folder + ".tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        for f in synth.GENERATORS[key](scale):
+            with open(os.path.join(tmp, f.name), "wb") as fh:
+                fh.write(f.getvalue())
+        os.replace(tmp, folder)
+    out = []
+    for name in sorted(os.listdir(folder)):
+        with open(os.path.join(folder, name), "rb") as fh:
+            out.append(synth.Upload(name, fh.read()))
+    return out
+
+
+# ==========================================
+# 測試項目：(名稱, 合成格式, 執行函式)
+#   頁面的計算邏輯皆為最上層函式，以 load_defs 載入後直接呼叫（不另寫仿製版本）
+# ==========================================
+def _hub(fn_name):
+    def run(files, ctx):
+        ctx["app"][fn_name](files, ctx["sh"])
+    return run
+
+
+def p16_duty(files, ctx):
+    res = ctx["p16"]["extract_duty_v2"](files[0], 9)
+    assert res["roster"], res["cadre_status"]
+
+
+def p16_equip(files, ctx):
+    assert ctx["p16"]["extract_equip_v2"](files[0]) is not None
+
+
+def p27_settle(files, ctx):
+    units = ctx["p27"]["collect_officer_sheets"](files, ctx["db_map"])
+    assert any(s["grand_total"] for u in units.values() for s in u["processed_sheets"])
+
+
+def p28_rewards(files, ctx):
+    reward_df, _, _ = ctx["p28"]["compute_rewards"](pd.read_excel(files[0], sheet_name="list2"))
+    assert not reward_df.empty
+
+
+def p29_categorize(files, ctx):
+    df = ctx["p29"]["load_cases"](pd.read_excel(files[0], sheet_name='案件明細', header=None))
+    assert (df['案件類別'] != '不採計').any()
+
+
+def p30_merits(files, ctx):
+    ns = ctx["p30"]
+    df = ns["process_traffic_data"](files[0])
+    assert df is not None
+    df.groupby('舉發員警1').apply(ns["calculate_merits_for_officer"])
+
+
+CASES = [
+    ("hub.科技執法", "tech", _hub("process_tech_enforcement")),
+    ("hub.超載統計", "overload", _hub("process_overload")),
+    ("hub.重大違規", "major", _hub("process_major")),
+    ("hub.強化專案", "project", _hub("process_project")),
+    ("hub.交通事故", "accident", _hub("process_accident")),
+    ("hub.靜桃計畫", "jing_tao", _hub("process_jing_tao")),
+    ("p16.勤務表", "duty_roster", p16_duty),
+    ("p16.交接簿", "equip_log", p16_equip),
+    ("p27.績效結算", "officer_sheets", p27_settle),
+    ("p28.危險駕車", "list2", p28_rewards),
+    ("p29.無照駕駛", "case_p29", p29_categorize),
+    ("p30.偽變造車牌", "case_p30", p30_merits),
+]
+
+
+def make_context(sheets):
+    # 裸執行（非 streamlit run）時每個 st.* 呼叫都會警告；先讀入設定（讀取時會重設層級）再關閉
+    st_config.get_config_options()
+    st_logger.set_log_level("error")
+    ctx = {"app": load_defs("app.py"), "p16": load_defs("pages/p16.py"), "p27": load_defs("pages/p27.py"),
+           "p28": load_defs("pages/p28.py"), "p29": load_defs("pages/p29.py"), "p30": load_defs("pages/p30.py"),
+           "sh": None}
+    db = synth.score_table()
+    ctx["db_map"] = {r: {'stop': s, 'dir': d} for r, s, d in zip(db['違規條款'], db['攔舉配分'], db['逕舉配分'])}
+    if sheets == "local":
+        import sheets_pool
+        os.environ["SHEETS_BACKEND"] = "local"
+        sh = sheets_pool.spreadsheet("bench")
+        while len(sh.worksheets()) < 4:
+            sh.add_worksheet(title=f"工作表{len(sh.worksheets()) + 1}", rows=100, cols=20)
+        ctx["sh"] = sh
+    return ctx
+
+
+def run_case(fn, files, ctx, repeat):
+    # 第 0 次為暖身（首次載入模組等），不計時
+    times = []
+    for i in range(repeat + 1):
+        # 每次重複使用新的快取目錄與新的檔案物件，量測冷啟動解析
+        parse_cache.CACHE_DIR = os.path.join(_TMP, "parse", str(i))
+        fresh = [synth.Upload(f.name, f.getvalue()) for f in files]
+        # 處理器的 ui.* 輸出記到工作物件，ui.error 即視為失敗
+        job = jobs.Job("bench", "bench")
+        t0 = time.perf_counter()
+        with jobs.attach(job):
+            fn(fresh, ctx)
+        if i:
+            times.append(time.perf_counter() - t0)
+        errors = [e["text"] for e in job.entries if e["kind"] == "error"]
+        if errors:
+            raise RuntimeError(errors[0])
+    return statistics.median(times), min(times)
+
+
+def load_baseline(path=BASELINE_PATH):
+    try:
+        with open(path, encoding="utf-8") as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return {"results": {}}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="各處理器效能測試")
+    ap.add_argument("--scale", type=int, nargs="+", default=[1], choices=synth.SCALES)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--only", nargs="*", default=[], help="名稱前綴，例：hub. p27.")
+    ap.add_argument("--sheets", choices=["none", "local"], default="none")
+    ap.add_argument("--threshold", type=float, default=THRESHOLD)
+    ap.add_argument("--baseline", default=BASELINE_PATH)
+    ap.add_argument("--update-baseline", action="store_true")
+    args = ap.parse_args()
+
+    ctx = make_context(args.sheets)
+    baseline = load_baseline(args.baseline)
+    base = baseline.get("results", {})
+    results, regressions = {}, []
+
+    print(f"版本 {tracing.VERSION}　基準 {baseline.get('version', '—')}　重複 {args.repeat} 次（中位數）")
+    print(f"{'項目':24s}{'中位秒':>10s}{'最快秒':>10s}{'基準秒':>10s}{'變化':>9s}")
+    for scale in args.scale:
+        for name, key, fn in CASES:
+            if args.only and not any(name.startswith(p) for p in args.only):
+                continue
+            label = f"{name}@x{scale}"
+            files = files_for(key, scale)
+            try:
+                med, best = run_case(fn, files, ctx, args.repeat)
+            except Exception as e:
+                print(f"{label:24s}  失敗：{type(e).__name__}: {e}")
+                regressions.append(label)
+                continue
+            results[label] = round(med, 4)
+            old = base.get(label)
+            change = ""
+            if old:
+                ratio = med / old
+                change = f"{(ratio - 1) * 100:+.0f}%"
+                if ratio > args.threshold and med - old > NOISE_S:
+                    change += " ⚠"
+                    regressions.append(label)
+            print(f"{label:24s}{med:10.3f}{best:10.3f}{old if old else float('nan'):10.3f}{change:>9s}")
+
+    if args.update_baseline:
+        base.update(results)
+        with open(args.baseline, "w", encoding="utf-8") as fh:
+            json.dump({"version": tracing.VERSION, "python": sys.version.split()[0], "pandas": pd.__version__,
+                       "results": dict(sorted(base.items()))}, fh, ensure_ascii=False, indent=1)
+        print(f"已更新基準：{args.baseline}")
+    shutil.rmtree(_TMP, ignore_errors=True)
+    if regressions:
+        print("退步或失敗：" + "、".join(regressions))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
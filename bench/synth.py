@@ -0,0 +1,371 @@
+import argparse
+import io
+import os
+import random
+from datetime import date, timedelta
+
+import pandas as pd
+
+# ==========================================
+# 合成報表產生器（效能測試用，不含任何真實資料）
+#   每種上傳格式各一個產生器，scale=1 約為一般分局一週/一年的實際大小，
+#   10、100 倍用於觀察解析時間與記憶體是否隨檔案大小線性成長。
+#   版面（標題列、表頭位置、欄位順序）依各處理器的解析規則仿製。
+#
+#   python bench/synth.py --scale 10 --out /tmp/synth     # 產出檔案供手動上傳測試
+# ==========================================
+# 產生規則有變動時遞增，run_bench 的檔案快取即自動重建
+SYNTH_VERSION = 1
+SCALES = (1, 10, 100)
+
+STATIONS = ['聖亭派出所', '龍潭派出所', '中興派出所', '石門派出所', '高平派出所', '三和派出所']
+UNITS = STATIONS + ['警備隊', '龍潭交通分隊']
+OTHER_STATIONS = ['大溪派出所', '平鎮派出所', '楊梅派出所', '中壢派出所', '八德派出所', '蘆竹派出所']
+SURNAMES = '陳林黃張李王吳劉蔡楊許鄭謝郭洪邱曾廖賴徐周葉蘇莊呂江何蕭羅高潘簡朱鍾彭游詹胡施沈余盧梁趙顏柯翁魏孫戴'
+GIVEN = '志明家豪俊傑建宏宗翰承恩冠宇柏翰彥廷育成明哲信宏偉誠文彬國華士杰'
+ROADS = ['中正路', '中豐路', '北龍路', '大昌路', '東龍路', '民族路', '成功路', '神龍路', '聖亭路', '龍新路',
+         '中興路', '石門路', '高原路', '三和路', '百年路', '渴望路', '工五路', '龍源路', '福龍路', '金龍路']
+
+TODAY = date.today()
+ROC = TODAY.year - 1911
+END = TODAY - timedelta(days=1)
+
+
+class Upload(io.BytesIO):
+    # 仿 Streamlit UploadedFile：具 name、size 與 getvalue()
+    def __init__(self, name, data):
+        super().__init__(data)
+        self.name = name
+        self.size = len(data)
+
+
+def roc(d, sep=''):
+    return f"{d.year - 1911}{sep}{d.month:02d}{sep}{d.day:02d}"
+
+
+def officers(rng, n):
+    names = set()
+    while len(names) < n:
+        names.add(rng.choice(SURNAMES) + rng.choice(GIVEN) + rng.choice(GIVEN))
+    return sorted(names)
+
+
+def rand_day(rng, start=date(TODAY.year, 1, 1), end=END):
+    return start + timedelta(days=rng.randrange((end - start).days + 1))
+
+
+def xlsx(sheets, header=False):
+    # sheets: {分頁名: DataFrame 或 二維 list}；header=False 時內容即原始儲存格
+    buf = io.BytesIO()
+    with pd.ExcelWriter(buf, engine='openpyxl') as w:
+        for name, rows in sheets.items():
+            df = rows if isinstance(rows, pd.DataFrame) else pd.DataFrame(rows, dtype=object)
+            df.to_excel(w, sheet_name=name, index=False, header=header)
+    return buf.getvalue()
+
+
+def csv(df, encoding='utf-8-sig', preamble=()):
+    text = "".join(line + "\n" for line in preamble) + df.to_csv(index=False)
+    return text.encode(encoding, errors='ignore')
+
+
+# ==========================================
+# 首頁（app.py）各類報表
+# ==========================================
+def tech_list(scale=1, seed=1):
+    rng = random.Random(seed)
+    n = 3000 * scale
+    df = pd.DataFrame({
+        '違規日期': [roc(rand_day(rng), '/') for _ in range(n)],
+        '違規時間': [f"{rng.randrange(24):02d}{rng.randrange(60):02d}" for _ in range(n)],
+        '違規地點': [f"桃園市龍潭區{rng.choice(ROADS)}{rng.randrange(1, 400)}號前" if rng.random() < 0.3
+                     else f"桃園市龍潭區{rng.choice(ROADS)}與{rng.choice(ROADS)}口" for _ in range(n)],
+        '車號': [f"{rng.choice('ABKMR')}{rng.choice('ABKMR')}{rng.choice('ABKMR')}-{rng.randrange(10000):04d}" for _ in range(n)],
+        '違規法條': [rng.choice(['53條1項', '40條', '33條1項', '48條1項', '60條2項']) for _ in range(n)],
+    })
+    return [Upload("科技執法_違規地點list.csv", csv(df, encoding='cp950'))]
+
+
+def _overload_book(rng, scale, start, end):
+    rows = [["取締超載違規件數統計表", None, None, None, None, None],
+            [f"統計期間：{roc(start)} 至 {roc(end)}", None, None, None, None, None]]
+    for unit in UNITS:
+        n = rng.randrange(5, 25) * scale
+        rows.append([f"舉發單位：{unit}", None, None, None, None, None])
+        rows.append(["違規日期", "車號", "法條", "超載噸數", "件數", "備註"])
+        for _ in range(n):
+            rows.append([roc(rand_day(rng, start, end), '/'), f"KLA-{rng.randrange(10000):04d}", "29條之2",
+                         f"{rng.randrange(5, 95) / 10}", 1, None])
+        rows.append(["總計", None, None, None, None, n])
+    return xlsx({"超載": rows})
+
+
+def overload(scale=1, seed=2):
+    rng = random.Random(seed)
+    jan1, ly_end = date(TODAY.year, 1, 1), END.replace(year=END.year - 1)
+    return [Upload("stone超載_本期.xlsx", _overload_book(rng, scale, END - timedelta(days=6), END)),
+            Upload("stone超載_本年累計(1).xlsx", _overload_book(rng, scale * 10, jan1, END)),
+            Upload("stone超載_去年累計(2).xlsx", _overload_book(rng, scale * 10, jan1.replace(year=jan1.year - 1), ly_end))]
+
+
+MAJOR_DETAIL = ['酒駕', '闖紅燈', '嚴重超速', '逆向行駛', '轉彎未依規定', '蛇行惡意逼車', '不暫停讓行人']
+
+
+def _major_book(rng, scale, start, end):
+    period = f"統計期間：{roc(start)}至{roc(end)}"
+    units = UNITS + ['交通組(科技執法)']
+    main = [["重大交通違規統計表"] + [None] * 21, [period] + [None] * 21,
+            ["單位"] + [f"項目{i}" for i in range(1, 22)]]
+    detail = [["重大違規細項統計表"] + [None] * 14, [period] + [None] * 14,
+              ["單位"] + [c for c in MAJOR_DETAIL for _ in range(2)],
+              [""] + ["現場攔停", "逕行舉發"] * len(MAJOR_DETAIL)]
+    # 每單位一列合計，另以分組明細列模擬大型報表（scale 倍）
+    for unit in units:
+        for k in range(scale):
+            label = unit if k == 0 else f"{unit}第{k}組"
+            main.append([label] + [rng.randrange(0, 400) for _ in range(21)])
+            detail.append([label] + [rng.randrange(0, 60) for _ in range(14)])
+    main.append(["合計"] + [0] * 21)
+    detail.append(["合計"] + [0] * 14)
+    return xlsx({"總表": main, "細項": detail})
+
+
+def major(scale=1, seed=3):
+    rng = random.Random(seed)
+    jan1 = date(TODAY.year, 1, 1)
+    return [Upload("重大違規_本期.xlsx", _major_book(rng, scale, END - timedelta(days=6), END)),
+            Upload("重大違規_年累計.xlsx", _major_book(rng, scale, jan1, END)),
+            Upload("重大違規_去年累計.xlsx", _major_book(rng, scale, jan1.replace(year=jan1.year - 1), END.replace(year=END.year - 1)))]
+
+
+LAW_COLUMNS = ['35條1項', '35條3項', '35條4項', '73條2項', '73條3項', '53條1項', '53條2項', '43條1項', '43條4項', '40條',
+               '44條1項', '44條2項', '48條1項', '48條2項', '78條1項', '31條1項', '33條1項', '45條1項', '47條', '55條1項',
+               '56條1項', '60條2項', '61條1項', '62條1項', '68條1項', '69條1項', '72條', '74條1項', '82條1項', '84條']
+
+
+def project(scale=1, seed=4):
+    rng = random.Random(seed)
+    start = date(TODAY.year, 1, 1)
+    main = [["強化交通安全執法專案法條統計"] + [None] * (len(LAW_COLUMNS) + 1),
+            [f"統計期間(入案日)：{ROC}年01月01日至{roc(END)[:3]}年{END.month:02d}月{END.day:02d}日"] + [None] * (len(LAW_COLUMNS) + 1),
+            ["製表單位：龍潭分局"] + [None] * (len(LAW_COLUMNS) + 1),
+            ["單位", "舉發員警"] + LAW_COLUMNS]
+    r17 = [["R17 大型車違規統計"] + [None] * 5, [f"統計期間：{roc(start)}至{roc(END)}"] + [None] * 5,
+           ["單位", "舉發員警", "舉發總數", "違反管制規定", "其他微規", "備註"]]
+    for unit in UNITS + ['交通組']:
+        for name in officers(rng, 15 * scale):
+            main.append([f"龍潭分局{unit}", name] + [rng.choice([0, 0, 0, 1, 2, 5]) for _ in LAW_COLUMNS])
+            total = rng.randrange(0, 30)
+            r17.append([f"龍潭分局{unit}", name, total, rng.randrange(0, total + 1) // 2, rng.randrange(0, 3), None])
+    return [Upload("強化專案_法條自選匯出.xlsx", xlsx({"法條": main})),
+            Upload("R17_大貨車.xlsx", xlsx({"R17": r17}))]
+
+
+def _accident_book(rng, scale, start, end, weeks):
+    rows = [["道路交通事故案件統計表"] + [None] * 12,
+            [f"統計期間：{roc(start, '.')} 至 {roc(end, '.')}"] + [None] * 12,
+            ["單位", "A1件數", "A1受傷", "A1財損", "A1其他", "A1死亡", "A2件數", "A2財損", "A2其他", "A2受傷",
+             "A3件數", "A3財損", "備註"]]
+    stations = STATIONS + [s for k in range(scale) for s in OTHER_STATIONS]
+    for s in stations:
+        rows.append([s] + [rng.randrange(0, 3 * weeks + 1) if i in (0, 4) else rng.randrange(0, 40 * weeks + 1)
+                           for i in range(11)] + [None])
+    rows.append(["總計"] + [0] * 11 + [None])
+    return xlsx({"統計": rows})
+
+
+def accident(scale=1, seed=5):
+    rng = random.Random(seed)
+    jan1, ly = date(TODAY.year, 1, 1), date(TODAY.year - 1, 1, 1)
+    wk_start, prev_start = END - timedelta(days=6), END - timedelta(days=13)
+    weeks = max((END - jan1).days // 7, 1)
+    return [Upload("A1A2事故_本年累計.xlsx", _accident_book(rng, scale, jan1, END, weeks)),
+            Upload("A1A2事故_前期.xlsx", _accident_book(rng, scale, prev_start, prev_start + timedelta(days=6), 1)),
+            Upload("A1A2事故_本期.xlsx", _accident_book(rng, scale, wk_start, END, 1)),
+            Upload("A1A2事故_去年同期.xlsx", _accident_book(rng, scale, ly, END.replace(year=END.year - 1), weeks))]
+
+
+def jing_tao(scale=1, seed=6):
+    rng = random.Random(seed)
+    n = 2000 * scale
+    night = [rng.random() < 0.35 for _ in range(n)]
+    df = pd.DataFrame({
+        '序號': range(1, n + 1),
+        '通報日期': [f"{roc(rand_day(rng), '/')} {rng.randrange(24):02d}:{rng.randrange(60):02d}" for _ in range(n)],
+        '通報來源': [rng.choice(['1999', '110', '民眾檢舉', '巡邏發現']) for _ in range(n)],
+        '所別': [f"龍潭分局{rng.choice(UNITS)}" for _ in range(n)],
+        '地點': [f"龍潭區{rng.choice(ROADS)}" for _ in range(n)],
+        '車號': [f"{rng.choice('ABKMR')}{rng.choice('ABKMR')}{rng.choice('ABKMR')}-{rng.randrange(10000):04d}" for _ in range(n)],
+        '車種': [rng.choice(['機車', '自小客', '重機']) for _ in range(n)],
+        '22-06時': ['V' if x else '' for x in night],
+        '06-22時': ['' if x else 'V' for x in night],
+        '處理情形': [rng.choice(['已告發', '勸導', '查無', '移送監理站']) for _ in range(n)],
+        '備註': [''] * n,
+    })
+    return [Upload("靜桃計畫_詳細資料.csv", csv(df, preamble=["靜桃專案通報案件詳細資料"]))]
+
+
+# ==========================================
+# 敘獎統計頁（p28～p30）：自選匯出
+# ==========================================
+P28_RULES = ['1310101', '1810101', '4330001', '1610101', '1610201', '4310101', '4310301', '4310401', '4310501',
+             '5310001', '4000001', '3310101', '5610101', '6020001']
+P28_FACTS = ['改裝排氣管', '消音器不符', '未依規定變更車身', '在道路上蛇行', '闖紅燈', '超速40公里以上', '逆向行駛']
+
+
+def list2(scale=1, seed=7):
+    rng = random.Random(seed)
+    n = 3000 * scale
+    cops = officers(rng, 60)
+    df = pd.DataFrame({
+        '單號': [f"DA{rng.randrange(10 ** 7):07d}" for _ in range(n)],
+        '違規日期': [roc(rand_day(rng)) for _ in range(n)],
+        '條款1': [rng.choice(P28_RULES) for _ in range(n)],
+        '違規事實1': [rng.choice(P28_FACTS) for _ in range(n)],
+        '車種': [rng.choice(['重型機車', '輕型機車', '自用小客車', '自用小貨車']) for _ in range(n)],
+        '舉發單位': [rng.choice(UNITS) for _ in range(n)],
+        '舉發員警': [rng.choice(cops) for _ in range(n)],
+    })
+    return [Upload("自選匯出_list2.xlsx", xlsx({"list2": df}, header=True))]
+
+
+P29_FACTS = ['汽車駕駛人未領有駕駛執照駕駛小型車', '小型車駕駛人駕照經吊銷仍駕車', '機車駕駛人未領有駕駛執照', '汽車駕駛人駕照吊扣期間駕車']
+P29_LAWS = ['2110101', '2110401', '2110501', '2120001', '2110201']
+P30_FACTS = ['使用偽造號牌', '使用變造號牌', '懸掛他車號牌', '未懸掛號牌', '號牌污穢']
+
+
+def case_detail(scale=1, seed=8, variant="p29"):
+    # p29 依欄位位置讀取（固定 6 欄）；p30 依欄名讀取，多一欄「簡式車種名稱」
+    rng = random.Random(seed)
+    n = 1500 * scale
+    cops = officers(rng, 60)
+    facts, laws = (P29_FACTS, P29_LAWS) if variant == "p29" else (P30_FACTS, ['1210101', '1210102', '1210301', '1410101'])
+    cols = ['單號', '違規法條1', '違規事實1', '入案日', '舉發員警1', '違規人年齡']
+    if variant == "p30":
+        cols = ['單號', '簡式車種名稱', '違規法條1', '違規事實1', '入案日', '舉發員警1', '違規人年齡']
+    rows = [["自選匯出 案件明細"] + [None] * (len(cols) - 1), [f"匯出日期：{roc(TODAY, '/')}"] + [None] * (len(cols) - 1), cols]
+    for _ in range(n):
+        rec = {'單號': f"DB{rng.randrange(10 ** 7):07d}", '簡式車種名稱': rng.choice(['汽車', '機車']),
+               '違規法條1': rng.choice(laws), '違規事實1': rng.choice(facts),
+               '入案日': roc(rand_day(rng)), '舉發員警1': rng.choice(cops), '違規人年齡': f"{rng.randrange(15, 70)}"}
+        rows.append([rec[c] for c in cols])
+    return [Upload(f"自選匯出_案件明細_{variant}.xlsx", xlsx({"案件明細": rows, "說明": [["匯出條件"]]}))]
+
+
+# ==========================================
+# 績效結算（p27）：各單位原始舉發報表（每位員警一個分頁）與配分表
+# ==========================================
+def _rule_codes(rng, n):
+    codes = set()
+    while len(codes) < n:
+        codes.add(f"{rng.randrange(12, 92):02d}{rng.randrange(1, 6)}{rng.randrange(0, 10):02d}{rng.randrange(1, 4):02d}")
+    return sorted(codes)
+
+
+def score_table(n_rules=400, seed=9):
+    # 配分表（雲端「配分表」分頁的內容）：違規條款、攔舉配分、逕舉配分、違規事實、類別、取締項目
+    rng = random.Random(seed)
+    rules = _rule_codes(rng, n_rules)
+    return pd.DataFrame({
+        '違規條款': rules,
+        '攔舉配分': [rng.choice([0, 1, 2, 3, 5, 8]) for _ in rules],
+        '逕舉配分': [rng.choice([0, 1, 1, 2, 3]) for _ in rules],
+        '違規事實': [f"違規事實{r}" for r in rules],
+        '類別': [rng.choice(['交通秩序', '交通安全', '重大違規', '']) for _ in rules],
+        '取締項目': [rng.choice(['酒駕', '超速', '闖紅燈', '違停', '']) for _ in rules],
+    })
+
+
+def officer_sheets(scale=1, seed=10, n_rules=400):
+    rng = random.Random(seed)
+    known = list(score_table(n_rules).iloc[:, 0])
+    # 約一成條款不在配分表內，觸發「新條款」比對流程
+    unknown = _rule_codes(random.Random(seed + 1), n_rules // 10)
+    # scale=1：8 個單位各 10 位員警；倍數增加的是每單位的員警分頁數
+    files = []
+    for unit in UNITS:
+        sheets = {}
+        for name in officers(rng, 10 * scale):
+            rows = [["舉發員警績效統計表", None, None, None, None, None, None],
+                    [f"列印日期：{roc(TODAY, '/')}", None, None, f"開單日期：{ROC}/01/01~{roc(END, '/')}", None, None, None],
+                    [f"舉發單位：{unit}", None, None, f"舉發員警：{name}", None, None, None],
+                    ["違規條款", "違規事實", "類別", "取締項目", "攔停數", "逕舉數", "備註"]]
+            for rule in rng.sample(known, 30) + rng.sample(unknown, 3):
+                rows.append([rule, f"違規事實{rule}", "", "", rng.randrange(0, 12), rng.randrange(0, 20), None])
+            rows.append(["合計", None, None, None, None, None, None])
+            rows.append(["舉發單張數", None, None, None, None, None, None])
+            sheets[name] = rows
+        files.append(Upload(f"{unit}_原始舉發.xlsx", xlsx(sheets)))
+    return files
+
+
+# ==========================================
+# 勤務督導（p16）：勤務表與交接簿
+# ==========================================
+DUTY_ROWS = ['值班', '巡邏', '巡邏', '臨檢', '守望', '交通整理', '備勤', '內部管理', '專案勤務(取締酒駕)', '輪休', '慰休']
+TITLES = ['所長', '副所長', '巡佐', '警員', '警員', '警員', '警員', '警員']
+
+
+def duty_roster(scale=1, seed=11, unit='聖亭派出所'):
+    rng = random.Random(seed)
+    # 代號對照區只掃描 20 列（每列 3 人），人數上限 60
+    n_staff = min(20 * scale, 60)
+    codes = [c for c in 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'] + [f"{i:02d}" for i in range(10, 100)]
+    staff = list(zip(codes[:n_staff], officers(rng, n_staff)))
+    slots = [(h, (h + 2) % 24) for h in range(6, 30, 2)]
+    width = 13 + len(slots) * scale
+    rows = [[f"桃園市政府警察局龍潭分局{unit}勤務分配表"] + [''] * (width - 1),
+            [f"日期：{roc(TODAY, '/')}"] + [''] * (width - 1),
+            ['勤務項目', '細項'] + [''] * 11 + [f"{h % 24:02d}-{e:02d}" for k in range(scale) for h, e in slots]]
+    for k in range(scale):
+        for duty in DUTY_ROWS:
+            rows.append([duty, duty if k == 0 else f"{duty}{k}"] + [''] * 11 +
+                        [" ".join(c for c, _ in rng.sample(staff, rng.randrange(1, 3))) for _ in range(len(slots) * scale)])
+    rows.append(['勤務\n備註'] + [''] * (width - 1))
+    # 人員代號對照：每列三組「代號, 職稱姓名, 空欄 ×4」
+    for i in range(0, len(staff), 3):
+        row = ['代號 職稱 姓名' if i == 0 else '代號']
+        for code, name in staff[i:i + 3]:
+            row += [code, f"{TITLES[min(codes.index(code), len(TITLES) - 1)]} {name}", '', '', '', '']
+        rows.append(row + [''] * max(width - len(row), 0))
+    return [Upload(f"{unit}_勤務表.xlsx", xlsx({"勤務表": rows}))]
+
+
+def equip_log(scale=1, seed=12, unit='聖亭派出所'):
+    rng = random.Random(seed)
+    rows = [[f"{unit}械彈交接簿"] + [''] * 9, [f"日期：{roc(TODAY, '/')}"] + [''] * 9,
+            ['時間', '狀態', '手槍', '手槍子彈', '步槍', '步槍子彈', '無線電', '防彈背心', '交班人', '接班人']]
+    for i in range(12 * scale):
+        for label in ('在所', '出勤'):
+            rows.append([f"{(6 + 2 * i) % 24:02d}:00", label, rng.randrange(2, 20), rng.randrange(20, 300),
+                         rng.randrange(0, 4), rng.randrange(0, 120), rng.randrange(2, 20), rng.randrange(2, 20), '', ''])
+    return [Upload(f"{unit}_交接簿.xlsx", xlsx({"交接簿": rows}))]
+
+
+# 格式名稱 → 產生器（run_bench 與命令列共用）
+GENERATORS = {
+    "tech": tech_list, "overload": overload, "major": major, "project": project, "accident": accident,
+    "jing_tao": jing_tao, "list2": list2,
+    "case_p29": lambda scale=1: case_detail(scale, variant="p29"),
+    "case_p30": lambda scale=1: case_detail(scale, variant="p30"),
+    "officer_sheets": officer_sheets, "duty_roster": duty_roster, "equip_log": equip_log,
+}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="產生合成報表檔案")
+    ap.add_argument("--scale", type=int, default=1, choices=SCALES)
+    ap.add_argument("--out", default="synth_out")
+    ap.add_argument("--only", nargs="*", choices=list(GENERATORS))
+    args = ap.parse_args()
+    os.makedirs(args.out, exist_ok=True)
+    for key in args.only or GENERATORS:
+        for f in GENERATORS[key](args.scale):
+            with open(os.path.join(args.out, f.name), "wb") as fh:
+                fh.write(f.getvalue())
+            print(f"{key:15s} {f.name:30s} {f.size / 1024:10.1f} KB")
+    score_table().to_excel(os.path.join(args.out, "配分表.xlsx"), sheet_name="配分表", index=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,351 @@
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import pandas as pd
+import streamlit as st
+
+# ==========================================
+# 背景工作（批次處理、PDF 產製、寄信）
+#   工作在 Streamlit 伺服器程序內的背景執行緒執行，不隸屬任何一次腳本執行：
+#   按鈕重跑、重新整理或關閉分頁都不會中斷。進度與輸出記錄於工作物件，
+#   並寫入 .cache/jobs/<id>.json，重新連線後以 job ID 取回。
+#   （與雲端寫入共用同一程序，才能沿用全程序的 Sheets 配額排程器與連線。）
+#
+#   工作內請以 ui.write / ui.dataframe ... 取代 st.*；不在工作中時 ui 即為 st。
+# ==========================================
+JOBS_DIR = os.environ.get(
+    "HUB_JOBS_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "jobs"),
+)
+MAX_WORKERS = 4
+POLL_SECONDS = 2
+KEEP_DAYS = 7
+
+_POOL = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="job")
+_JOBS = {}
+_JOBS_LOCK = threading.Lock()
+_local = threading.local()
+
+_STATUS = {"queued": "running", "running": "running", "complete": "complete", "error": "error"}
+
+
+def _json_default(o):
+    return o.item() if hasattr(o, "item") else str(o)
+
+
+def _table(df):
+    df = pd.DataFrame(df)
+    cols = [list(map(str, c)) if isinstance(c, tuple) else str(c) for c in df.columns]
+    rows = df.astype(object).where(df.notna(), None).values.tolist()
+    return {"columns": cols, "rows": rows}
+
+
+class Job:
+    def __init__(self, job_id, title, kind="", meta=None):
+        self.id, self.title, self.kind, self.meta = job_id, title, kind, meta or {}
+        self.state, self.progress, self.text = "queued", 0.0, ""
+        self.entries, self.sections = [], {}
+        self.error, self.result = None, None
+        self.created = self.updated = time.time()
+        self._lock = threading.RLock()
+        self._saved = 0.0
+
+    @property
+    def done(self):
+        return self.state in ("complete", "error")
+
+    def add(self, kind, section=None, **payload):
+        with self._lock:
+            self.entries.append(dict(payload, kind=kind, section=section))
+            self._touch()
+
+    def _touch(self, force=False):
+        self.updated = time.time()
+        if force or self.updated - self._saved >= 1.0:
+            self._saved = self.updated
+            self.save()
+
+    def record(self):
+        with self._lock:
+            rec = {k: getattr(self, k) for k in ("id", "title", "kind", "meta", "state", "progress", "text",
+                                                 "entries", "sections", "error", "created", "updated")}
+            try:
+                json.dumps(self.result, default=_json_default)
+                rec["result"] = self.result
+            except (TypeError, ValueError):
+                rec["result"] = None
+            return json.loads(json.dumps(rec, ensure_ascii=False, default=_json_default))
+
+    def save(self):
+        try:
+            os.makedirs(JOBS_DIR, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=JOBS_DIR, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as fh:
+                json.dump(self.record(), fh, ensure_ascii=False)
+            os.replace(tmp, os.path.join(JOBS_DIR, f"{self.id}.json"))
+        except OSError:
+            pass
+
+    @classmethod
+    def load(cls, job_id):
+        try:
+            with open(os.path.join(JOBS_DIR, f"{job_id}.json"), encoding="utf-8") as fh:
+                rec = json.load(fh)
+        except (OSError, ValueError):
+            return None
+        job = cls(rec["id"], rec["title"], rec.get("kind", ""), rec.get("meta"))
+        for k in ("state", "progress", "text", "entries", "sections", "error", "result", "created", "updated"):
+            setattr(job, k, rec.get(k, getattr(job, k)))
+        if not job.done:
+            # 伺服器重新啟動時尚未完成的工作已隨舊程序結束
+            job.state, job.error = "error", "伺服器重新啟動，工作已中斷，請重新執行。"
+        return job
+
+
+# ==========================================
+# 工作內的輸出（取代 st.*）
+# ==========================================
+class _Console:
+    def _add(self, kind, **payload):
+        job = current()
+        if job is not None:
+            job.add(kind, getattr(_local, "section", None), **payload)
+
+    def _text(self, kind, *args):
+        self._add(kind, text=" ".join(str(a) for a in args))
+
+    def write(self, *args, **kwargs):
+        if len(args) == 1 and isinstance(args[0], pd.DataFrame):
+            return self.dataframe(args[0])
+        self._text("write", *args)
+
+    def markdown(self, body, **kwargs): self._text("markdown", body)
+    def info(self, body, **kwargs): self._text("info", body)
+    def success(self, body, **kwargs): self._text("success", body)
+    def warning(self, body, **kwargs): self._text("warning", body)
+    def error(self, body, **kwargs): self._text("error", body)
+
+    def dataframe(self, data, hide_index=None, **kwargs):
+        self._add("dataframe", table=_table(data), hide_index=bool(hide_index))
+
+    def columns(self, spec, **kwargs):
+        return [self] * (spec if isinstance(spec, int) else len(spec))
+
+    @contextmanager
+    def expander(self, label, expanded=False, **kwargs):
+        self._text("markdown", f"**{label}**")
+        yield self
+
+
+_CONSOLE = _Console()
+
+
+class _UI:
+    # 在背景工作中導向 _CONSOLE，其餘情況即為 st
+    def __getattr__(self, name):
+        return getattr(_CONSOLE if current() is not None else st, name)
+
+
+ui = _UI()
+
+
+# ==========================================
+# 工作管理
+# ==========================================
+def current():
+    return getattr(_local, "job", None)
+
+
+@contextmanager
+def attach(job, section=None):
+    # 工作內自行開的執行緒需先 attach，輸出才會記到同一個工作
+    prev = (getattr(_local, "job", None), getattr(_local, "section", None))
+    _local.job, _local.section = job, section
+    try:
+        yield job
+    finally:
+        _local.job, _local.section = prev
+
+
+@contextmanager
+def section(name, label=None):
+    # 工作中的一個分段（例：一個報表類別），各自顯示狀態
+    job = current()
+    if job is None:
+        yield
+        return
+    with job._lock:
+        job.sections[name] = {"label": label or name, "state": "running"}
+        job._touch()
+    prev = getattr(_local, "section", None)
+    _local.section = name
+    try:
+        yield
+    except BaseException:
+        with job._lock:
+            job.sections[name]["state"] = "error"
+        raise
+    else:
+        with job._lock:
+            job.sections[name]["state"] = "complete"
+    finally:
+        _local.section = prev
+        job._touch(force=True)
+
+
+def progress(value, text=None):
+    job = current()
+    if job is not None:
+        with job._lock:
+            job.progress = min(max(float(value), 0.0), 1.0)
+            if text is not None:
+                job.text = text
+            job._touch()
+
+
+def _run(job, fn, args, kwargs):
+    with attach(job):
+        job.state = "running"
+        job._touch(force=True)
+        try:
+            result = fn(*args, **kwargs)
+            with job._lock:
+                job.result, job.state, job.progress = result, "complete", 1.0
+        except Exception as e:
+            with job._lock:
+                job.state, job.error = "error", f"{e}"
+                job.add("code", text=traceback.format_exc())
+        finally:
+            job._touch(force=True)
+
+
+def submit(title, fn, *args, kind="", meta=None, **kwargs):
+    _cleanup()
+    job = Job(uuid.uuid4().hex[:12], title, kind, meta)
+    with _JOBS_LOCK:
+        _JOBS[job.id] = job
+    job.save()
+    _POOL.submit(_run, job, fn, args, kwargs)
+    return job.id
+
+
+def get(job_id):
+    if not job_id:
+        return None
+    with _JOBS_LOCK:
+        job = _JOBS.get(job_id)
+    return job if job is not None else Job.load(job_id)
+
+
+def _cleanup():
+    cutoff = time.time() - KEEP_DAYS * 86400
+    try:
+        for name in os.listdir(JOBS_DIR):
+            path = os.path.join(JOBS_DIR, name)
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+    except OSError:
+        pass
+    with _JOBS_LOCK:
+        for job_id in [k for k, j in _JOBS.items() if j.done and j.updated < cutoff]:
+            del _JOBS[job_id]
+
+
+def expect_ok(fn):
+    # 將回傳 (ok, err) 的函式轉為失敗時拋出例外，供工作狀態判斷
+    def wrapper(*args, **kwargs):
+        ok, err = fn(*args, **kwargs)
+        if not ok:
+            raise RuntimeError(err)
+        return ok
+    return wrapper
+
+
+class _Upload(io.BytesIO):
+    def __init__(self, f):
+        super().__init__(f.getvalue())
+        self.name = f.name
+        if getattr(f, "_sha256", None):
+            self._sha256 = f._sha256
+
+
+def freeze_upload(f):
+    # 上傳檔在工作階段結束後會被釋放；送入背景工作前先複製內容
+    return _Upload(f)
+
+
+# ==========================================
+# 畫面：job ID 存在 session_state 與網址參數，重新整理後仍可取回
+# ==========================================
+def remember(key, job_id):
+    st.session_state[key] = job_id
+    st.query_params[key] = job_id
+
+
+def recall(key):
+    return st.session_state.get(key) or st.query_params.get(key)
+
+
+def forget(key):
+    st.session_state.pop(key, None)
+    if key in st.query_params:
+        del st.query_params[key]
+
+
+def _render_entries(entries):
+    for e in entries:
+        kind = e["kind"]
+        if kind == "dataframe":
+            t = e["table"]
+            cols = t["columns"]
+            if cols and isinstance(cols[0], list):
+                cols = pd.MultiIndex.from_tuples([tuple(c) for c in cols])
+            st.dataframe(pd.DataFrame(t["rows"], columns=cols), hide_index=e.get("hide_index", False))
+        elif kind == "code":
+            st.code(e["text"])
+        else:
+            getattr(st, kind)(e["text"])
+
+
+def _render(job):
+    # 背景執行緒仍在新增輸出與分段；先在鎖內複製一份再顯示
+    with job._lock:
+        state, progress_, text, error = job.state, job.progress, job.text, job.error
+        entries = list(job.entries)
+        sections = [(name, dict(sec)) for name, sec in job.sections.items()]
+    done = state in ("complete", "error")
+    with st.status(job.title, state=_STATUS[state], expanded=not done or state == "error"):
+        if not done:
+            st.progress(progress_, text=text or "處理中…")
+        _render_entries([e for e in entries if e.get("section") is None])
+        if state == "error":
+            st.error(f"⚠️ {error}")
+    for name, sec in sections:
+        with st.status(sec["label"], state=_STATUS.get(sec["state"], "running"), expanded=True):
+            _render_entries([e for e in entries if e.get("section") == name])
+
+
+def show(job_id):
+    """顯示工作狀態；執行中時每 POLL_SECONDS 秒自動更新，完成後整頁重跑一次。回傳 Job。"""
+    job = get(job_id)
+    if job is None:
+        return None
+    running = not job.done
+
+    @st.fragment(run_every=POLL_SECONDS if running else None)
+    def _panel():
+        j = get(job_id)
+        _render(j)
+        if running and j.done:
+            st.rerun()
+
+    _panel()
+    return get(job_id)
@@ -48,6 +48,7 @@ def show_sidebar():
         st.subheader("🛠️ 輔助工具")
         st.page_link("pages/p06.py", label="綜合檔案加工與轉檔中心", icon="🗂️")
         st.page_link("pages/p16.py", label="督導報告極速生成器 v7.0", icon="📋")
+        st.page_link("pages/p31.py", label="系統效能監控", icon="⏱️")
 
 def main():
     show_sidebar()
@@ -8,18 +8,7 @@ show_sidebar()
 import io
 import os
 import zipfile
-from pypdf import PdfReader, PdfWriter
-from reportlab.pdfgen import canvas
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.lib.colors import white, black
-from PIL import Image, ImageDraw, ImageFont
-from pptx import Presentation
-from pptx.util import Pt
-from pptx.dml.color import RGBColor
-from pptx.enum.text import PP_ALIGN, MSO_ANCHOR
-from pptx.oxml.ns import qn
-from pdf2image import convert_from_bytes
+# pypdf / ReportLab / PIL / python-pptx / pdf2image 載入較久，於各功能按下執行時才載入
 
 st.header("🗂️ 綜合檔案加工與轉檔中心")
 st.write("支援：檔案商標遮蓋添加頁碼、PDF 轉 PPTX/圖片、以及多圖合併轉 PDF")
@@ -37,6 +26,7 @@ def get_font_path():
 font_path = get_font_path()
 
 def set_east_asian_font(run, font_name):
+    from pptx.oxml.ns import qn
     rPr = run._r.get_or_add_rPr()
     ea = rPr.find(qn('a:ea'))
     if ea is None:
@@ -45,6 +35,8 @@ def set_east_asian_font(run, font_name):
     ea.set('typeface', font_name)
 
 def create_pdf_overlay(page_width, page_height, page_num, current_font):
+    from reportlab.pdfgen import canvas
+    from reportlab.lib.colors import white, black
     packet = io.BytesIO()
     c = canvas.Canvas(packet, pagesize=(page_width, page_height))
 
@@ -70,6 +62,7 @@ def create_pdf_overlay(page_width, page_height, page_num, current_font):
     return packet
 
 def process_image(image_file, font_p):
+    from PIL import Image, ImageDraw, ImageFont
     img = Image.open(image_file).convert("RGB")
     draw = ImageDraw.Draw(img)
     width, height = img.size
@@ -92,6 +85,11 @@ def process_image(image_file, font_p):
     return img_byte_arr.getvalue()
 
 def process_pptx(pptx_file, font_p):
+    from PIL import ImageFont
+    from pptx import Presentation
+    from pptx.util import Pt
+    from pptx.dml.color import RGBColor
+    from pptx.enum.text import PP_ALIGN, MSO_ANCHOR
     prs = Presentation(pptx_file)
     slide_width = prs.slide_width
     slide_height = prs.slide_height
@@ -164,6 +162,9 @@ with tab1:
 
         try:
             if file_ext == "pdf":
+                from pypdf import PdfReader, PdfWriter
+                from reportlab.pdfbase import pdfmetrics
+                from reportlab.pdfbase.ttfonts import TTFont
                 reader = PdfReader(watermark_file)
                 writer = PdfWriter()
 
@@ -211,6 +212,8 @@ with tab2:
         if st.button(f"🚀 開始{option}"):
             with st.spinner("正在解析 PDF 並處理中..."):
                 try:
+                    from pdf2image import convert_from_bytes
+                    from pptx import Presentation
                     file_bytes = pdf_convert_file.read()
                     images = convert_from_bytes(file_bytes, dpi=150)
                     
@@ -262,6 +265,7 @@ with tab3:
         if st.button("🚀 開始合併為 PDF"):
             with st.spinner("正在處理圖片並建立 PDF..."):
                 try:
+                    from PIL import Image
                     image_list = []
                     for uploaded_img in img_to_pdf_files:
                         img = Image.open(uploaded_img)
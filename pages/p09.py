@@ -1,7 +1,9 @@
 import streamlit as st
 import pandas as pd
-import gspread
-from google.oauth2.service_account import Credentials
+import sheets_pool
+import sheets_tables
+import jobs
+import tracing
 from datetime import datetime
 import smtplib, io, os
 import urllib.parse as _ul
@@ -9,14 +11,6 @@ from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.base import MIMEBase
 from email import encoders
-from reportlab.lib.pagesizes import A4
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import ParagraphStyle
-from reportlab.lib.enums import TA_LEFT, TA_CENTER
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.lib.units import mm
 import re
 from menu import show_sidebar
 
@@ -28,7 +22,6 @@ show_sidebar()
 
 # --- 常數與設定 ---
 SHEET_ID = "1dOrFjewsdpTGy0JyBJXmuBhr8p_LSpSb6Lp2gC39KK0"
-SCOPES = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
 
 WS_MAP = {
     "set": "專案_設定",
@@ -72,6 +65,8 @@ DEFAULT_PTL = pd.DataFrame([
 
 # --- 2. 輔助函數 ---
 def _get_font():
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
     fname = "kaiu"
     if fname in pdfmetrics.getRegisteredFontNames(): return fname
     font_paths = ["kaiu.ttf", "./kaiu.ttf", "C:/Windows/Fonts/kaiu.ttf", "/usr/share/fonts/truetype/custom/kaiu.ttf"]
@@ -91,18 +86,9 @@ def parse_meeting_time(time_str):
     except: pass
     return "19時30分至20時00分"
 
-@st.cache_resource
-def get_client():
-    if "gcp_service_account" not in st.secrets: return None
-    creds_dict = dict(st.secrets["gcp_service_account"])
-    creds_dict["private_key"] = creds_dict["private_key"].replace("\\n", "\n")
-    creds = Credentials.from_service_account_info(creds_dict, scopes=SCOPES)
-    return gspread.authorize(creds)
-
 def init_sheets():
     try:
-        client = get_client()
-        sh = client.open_by_key(SHEET_ID)
+        sh = sheets_pool.spreadsheet(SHEET_ID)
         headers = {
             WS_MAP["set"]: [["Key", "Value"]],
             WS_MAP["cmd"]: [["職稱", "無線電代號", "負責人員", "任務"]],
@@ -115,30 +101,25 @@ def init_sheets():
             except:
                 sh.add_worksheet(title=ws_name, rows="100", cols="20").update(head)
                 st.sidebar.success(f"➕ 已建立 {ws_name}")
-        load_data.clear()
+        sheets_tables.invalidate(SHEET_ID, WS_MAP.values())
         st.rerun()
     except Exception as e:
         st.error(f"初始化失敗：{e}")
 
-@st.cache_data(ttl=10)
+@tracing.traced("p09.load_data")
 def load_data():
     try:
-        client = get_client()
-        if client is None: return None, None, None, "權限不足"
-        sh = client.open_by_key(SHEET_ID)
-        ws_set = sh.worksheet(WS_MAP["set"])
-        ws_cmd = sh.worksheet(WS_MAP["cmd"])
-        ws_ptl = sh.worksheet(WS_MAP["ptl"])
-        return pd.DataFrame(ws_set.get_all_records()).fillna(""), pd.DataFrame(ws_cmd.get_all_records()).fillna(""), pd.DataFrame(ws_ptl.get_all_records()).fillna(""), None
+        sh = sheets_pool.spreadsheet(SHEET_ID)
+        if sh is None: return None, None, None, "權限不足"
+        fr = sheets_tables.read_frames(sh, [WS_MAP["set"], WS_MAP["cmd"], WS_MAP["ptl"]], ttl=10, poll=True)
+        return fr[WS_MAP["set"]].fillna(""), fr[WS_MAP["cmd"]].fillna(""), fr[WS_MAP["ptl"]].fillna(""), None
     except Exception as e: return None, None, None, str(e)
 
+@tracing.traced("p09.save_data")
 def save_data(unit, time_str, project, briefing, station, focus, df_cmd, df_ptl):
     try:
-        client = get_client()
-        sh = client.open_by_key(SHEET_ID)
-        ws_set = sh.worksheet(WS_MAP["set"])
-        ws_set.clear()
-        ws_set.update([
+        sh = sheets_pool.spreadsheet(SHEET_ID)
+        tables = {WS_MAP["set"]: [
             ["Key", "Value"], 
             ["unit_name", unit], 
             ["plan_full_time", time_str], 
@@ -146,14 +127,12 @@ def save_data(unit, time_str, project, briefing, station, focus, df_cmd, df_ptl)
             ["briefing_info", briefing], 
             ["check_station", station],
             ["duty_focus", focus]
-        ])
+        ]}
         for ws_name, df in [(WS_MAP["cmd"], df_cmd), (WS_MAP["ptl"], df_ptl)]:
-            ws = sh.worksheet(ws_name)
-            ws.clear()
             df_cleaned = df.dropna(how='all').fillna("")
-            if not df_cleaned.empty:
-                ws.update([df_cleaned.columns.tolist()] + df_cleaned.values.tolist())
-        load_data.clear()
+            tables[ws_name] = [df_cleaned.columns.tolist()] + df_cleaned.values.tolist() if not df_cleaned.empty else []
+        # 三個分頁的清除與寫入合併為一次 batchUpdate，並以寫入內容更新這三個分頁的快取
+        sheets_tables.write_tables(sh, tables, create=False)
         return True
     except: return False
 
@@ -161,6 +140,7 @@ def save_data(unit, time_str, project, briefing, station, focus, df_cmd, df_ptl)
 A4_SIZE = (float(595.275), float(841.890))
 
 def add_page_number(canvas, doc):
+    from reportlab.lib.units import mm
     canvas.saveState()
     font_name = _get_font()
     canvas.setFont(font_name, 11)
@@ -169,7 +149,13 @@ def add_page_number(canvas, doc):
     canvas.drawCentredString(A4_SIZE[0] / 2.0, 10 * mm, text)
     canvas.restoreState()
 
+@tracing.traced("p09.generate_pdf_from_data")
 def generate_pdf_from_data(unit, project, time_str, briefing, station, focus, df_cmd, df_ptl):
+    from reportlab.lib import colors
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+    from reportlab.lib.styles import ParagraphStyle
+    from reportlab.lib.enums import TA_LEFT
+    from reportlab.lib.units import mm
     font = _get_font()
     buf = io.BytesIO()
     margin_lr = float(12 * mm)
@@ -298,7 +284,12 @@ def generate_pdf_from_data(unit, project, time_str, briefing, station, focus, df
     doc.build(story, onFirstPage=add_page_number, onLaterPages=add_page_number)
     return buf.getvalue()
 
+@tracing.traced("p09.generate_attendance_pdf")
 def generate_attendance_pdf(unit, project, time_str, briefing):
+    from reportlab.lib import colors
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+    from reportlab.lib.styles import ParagraphStyle
+    from reportlab.lib.units import mm
     font = _get_font()
     buf = io.BytesIO()
     margin_lr, margin_tb = float(15 * mm), float(15 * mm)
@@ -425,7 +416,6 @@ if st.sidebar.button("⚠️ 強制重置為最新專案資料 (覆蓋雲端)"):
     with st.spinner("重置中..."):
         save_data(DEFAULT_UNIT, DEFAULT_TIME, DEFAULT_PROJ, DEFAULT_BRIEF, DEFAULT_STATION, DEFAULT_FOCUS, DEFAULT_CMD, DEFAULT_PTL)
         if "ptl_editable_df" in st.session_state: del st.session_state.ptl_editable_df
-        st.cache_data.clear()
         st.rerun()
 
 df_set, df_cmd, df_ptl, err = load_data()
@@ -489,9 +479,9 @@ st.markdown("---")
 if st.button("💾 同步雲端並發送備份郵件", use_container_width=True):
     with st.spinner("處理中..."):
         save_data(u, p_time, p_name, b_info, s_info, f_info, res_cmd, res_ptl)
-        ok, max_err = send_report_email(u, p_name, p_time, b_info, s_info, f_info, res_cmd, res_ptl)
-        if ok: 
-            st.success("✅ 同步與郵件發送成功！")
-            if "ptl_editable_df" in st.session_state: del st.session_state.ptl_editable_df
-            st.rerun()
-        else: st.warning(f"⚠️ 雲端已同步，但郵件失敗: {max_err}")
+        # PDF 產製與寄信改由背景工作執行，重跑或關閉分頁都不會中斷
+        jobs.remember("p09_mail_job", jobs.submit("📧 產製 PDF 並寄送備份郵件", jobs.expect_ok(send_report_email),
+                                                  u, p_name, p_time, b_info, s_info, f_info, res_cmd, res_ptl))
+        if "ptl_editable_df" in st.session_state: del st.session_state.ptl_editable_df
+        st.rerun()
+jobs.show(jobs.recall("p09_mail_job"))
@@ -1,24 +1,19 @@
 import streamlit as st
 import pandas as pd
 import gspread
-from google.oauth2.service_account import Credentials
+import sheets_pool
+import sheets_tables
+import jobs
+import tracing
 import io, os, smtplib
 import urllib.parse as _ul
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.base import MIMEBase
 from email import encoders
-from reportlab.lib.pagesizes import A4
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import ParagraphStyle
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.lib.units import mm
 import numpy as np
 from datetime import datetime, timedelta
 import re
-import time
 
 st.set_page_config(page_title="防制危險駕車勤務", layout="wide", page_icon="🚔")
 
@@ -33,7 +28,6 @@ except ImportError:
 # =========================
 SHEET_ID = "1dOrFjewsdpTGy0JyBJXmuBhr8p_LSpSb6Lp2gC39KK0"
 WS_MAP = {"set": "危駕_設定", "cmd": "危駕_指揮組", "ptl": "危駕_警力佈署"}
-SCOPES = ["https://www.googleapis.com/auth/spreadsheets", "https://www.googleapis.com/auth/drive"]
 UNIT_TITLE = "桃園市政府警察局龍潭分局"
 CMD_COLS = ["職稱", "代號", "姓名", "任務"]
 PTL_COLS = ["勤務時段", "代號", "編組", "服勤人員", "巡邏路段"]
@@ -86,6 +80,8 @@ DEFAULT_NOTES = "一、各編組執行前由帶班人員在駐地實施勤前教
 # =========================
 @st.cache_resource
 def _get_font():
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
     fname = "kaiu"
     if fname in pdfmetrics.getRegisteredFontNames():
         return fname
@@ -98,24 +94,9 @@ def _get_font():
                 pass
     return "Helvetica"
 
-@st.cache_resource
-def get_client():
-    if "gcp_service_account" not in st.secrets:
-        st.error("❌ 找不到 gcp_service_account，請確認 Secrets 設定。")
-        return None
-    try:
-        info = dict(st.secrets["gcp_service_account"])
-        info["private_key"] = info["private_key"].replace("\\n", "\n")
-        creds = Credentials.from_service_account_info(info, scopes=SCOPES)
-        return gspread.authorize(creds)
-    except Exception as e:
-        st.error(f"Google 授權失敗：{e}")
-        return None
-
 def init_sheets():
-    client = get_client()
-    if client is None: return
-    sh = client.open_by_key(SHEET_ID)
+    sh = sheets_pool.spreadsheet(SHEET_ID)
+    if sh is None: return
     headers = {WS_MAP["set"]: [["Key", "Value"]], WS_MAP["cmd"]: [CMD_COLS], WS_MAP["ptl"]: [PTL_COLS]}
     for name, header in headers.items():
         try:
@@ -123,50 +104,43 @@ def init_sheets():
         except:
             sh.add_worksheet(title=name, rows="200", cols="20").update(header)
     st.success("初始化完成")
-    st.cache_data.clear()
+    sheets_tables.invalidate(SHEET_ID, WS_MAP.values())
     if "sheets_data" in st.session_state:
         del st.session_state["sheets_data"]
     st.rerun()
 
-# ⚠️ 升級版 load_data：拉長指數退避時間與取消 Spinner 閃爍
-@st.cache_data(ttl=600, show_spinner=False)
+# ⚠️ 升級版 load_data：限速與 429 退避交由共用配額排程 (QuotaHTTPClient)，並取消 Spinner 閃爍
+@tracing.traced("p10.load_data_from_api")
 def load_data_from_api():
-    max_retries = 4
-    for attempt in range(max_retries):
-        try:
-            client = get_client()
-            if client is None:
-                return None, None, None, {}, "授權失敗"
-            sh = client.open_by_key(SHEET_ID)
-            
-            # 抓取資料，若發生錯誤會直接跳到 except 區塊
-            set_df = pd.DataFrame(sh.worksheet(WS_MAP["set"]).get_all_records()).fillna("")
-            cmd_df = pd.DataFrame(sh.worksheet(WS_MAP["cmd"]).get_all_records()).fillna("")
-            ptl_df = pd.DataFrame(sh.worksheet(WS_MAP["ptl"]).get_all_records()).fillna("")
-            
-            if not ptl_df.empty:
-                if "任務分工" in ptl_df.columns:
-                    ptl_df = ptl_df.rename(columns={"任務分工": "巡邏路段"})
-                ptl_df = ptl_df.reindex(columns=PTL_COLS, fill_value="")
-                ptl_df = ptl_df[ptl_df["勤務時段"].astype(str).str.strip() != ""].reset_index(drop=True)
-            
-            settings = {}
-            if not set_df.empty and set_df.shape[1] >= 2:
-                settings = dict(zip(set_df.iloc[:,0].astype(str), set_df.iloc[:,1].astype(str)))
-            
-            return set_df, cmd_df, ptl_df, settings, None
+    try:
+        sh = sheets_pool.spreadsheet(SHEET_ID)
+        if sh is None:
+            return None, None, None, {}, "授權失敗"
+        
+        # 三個分頁一次 batchGet 讀回，若發生錯誤會直接跳到 except 區塊
+        fr = sheets_tables.read_frames(sh, [WS_MAP["set"], WS_MAP["cmd"], WS_MAP["ptl"]], ttl=600)
+        set_df = fr[WS_MAP["set"]].fillna("")
+        cmd_df = fr[WS_MAP["cmd"]].fillna("")
+        ptl_df = fr[WS_MAP["ptl"]].fillna("")
+        
+        if not ptl_df.empty:
+            if "任務分工" in ptl_df.columns:
+                ptl_df = ptl_df.rename(columns={"任務分工": "巡邏路段"})
+            ptl_df = ptl_df.reindex(columns=PTL_COLS, fill_value="")
+            ptl_df = ptl_df[ptl_df["勤務時段"].astype(str).str.strip() != ""].reset_index(drop=True)
         
-        except gspread.exceptions.APIError as e:
-            if "429" in str(e):
-                if attempt < max_retries - 1:
-                    wait_time = 5 * (attempt + 1) # 等待 5, 10, 15 秒
-                    time.sleep(wait_time) 
-                    continue
-            return None, None, None, {}, f"API 限制或連線錯誤: {str(e)}"
-        except Exception as e:
-            return None, None, None, {}, str(e)
-            
-    return None, None, None, {}, "達到最大重試次數，API 仍然超限，請等待 1 分鐘後再試。"
+        settings = {}
+        if not set_df.empty and set_df.shape[1] >= 2:
+            settings = dict(zip(set_df.iloc[:,0].astype(str), set_df.iloc[:,1].astype(str)))
+        
+        return set_df, cmd_df, ptl_df, settings, None
+    
+    except gspread.exceptions.APIError as e:
+        if "429" in str(e):
+            return None, None, None, {}, "達到最大重試次數，API 仍然超限，請等待 1 分鐘後再試。"
+        return None, None, None, {}, f"API 限制或連線錯誤: {str(e)}"
+    except Exception as e:
+        return None, None, None, {}, str(e)
 
 # 負責管理 Session State 緩存，徹底杜絕無限 API 請求
 def ensure_data_loaded():
@@ -182,33 +156,21 @@ def ensure_data_loaded():
             }
     return st.session_state["sheets_data"]
 
-# ⚠️ 升級版 save_data：儲存後直接手動更新快取，省去 3 次 Read Quota
+# ⚠️ 升級版 save_data：寫入時一併以寫入內容更新分頁快取，重新載入不耗 Read Quota
+@tracing.traced("p10.save_data")
 def save_data(settings_dict, cmd, ptl):
     try:
-        client = get_client()
-        if client is None: return False
-        sh = client.open_by_key(SHEET_ID)
-        ws_set = sh.worksheet(WS_MAP["set"])
-        ws_set.clear()
-        ws_set.update([["Key", "Value"]] + [[k, v] for k, v in settings_dict.items()])
+        sh = sheets_pool.spreadsheet(SHEET_ID)
+        if sh is None: return False
+        tables = {WS_MAP["set"]: [["Key", "Value"]] + [[k, v] for k, v in settings_dict.items()]}
         
         for ws_name, df, cols in [(WS_MAP["cmd"], cmd, CMD_COLS), (WS_MAP["ptl"], ptl, PTL_COLS)]:
-            ws = sh.worksheet(ws_name)
-            ws.clear()
             df_clean = df[cols].fillna("")
-            if not df_clean.empty:
-                ws.update([df_clean.columns.tolist()] + df_clean.values.tolist())
+            tables[ws_name] = [df_clean.columns.tolist()] + df_clean.values.tolist() if not df_clean.empty else []
+        sheets_tables.write_tables(sh, tables, sizes={n: (200, 20) for n in tables}, create=False)
         
-        # 儲存成功後，不要清除快取，直接手動更新 Session State 中的資料
-        set_df = pd.DataFrame(list(settings_dict.items()), columns=["Key", "Value"])
-        st.session_state["sheets_data"] = {
-            "set_df": set_df, 
-            "cmd_df": cmd.copy(), 
-            "ptl_df": ptl.copy(), 
-            "settings": settings_dict, 
-            "err": None
-        }
-            
+        # 分頁快取已是剛寫入的內容，Session State 直接由快取重建（不呼叫 API）
+        st.session_state.pop("sheets_data", None)
         return True
     except Exception as e:
         st.error(f"❌ 儲存失敗：{e}")
@@ -217,7 +179,13 @@ def save_data(settings_dict, cmd, ptl):
 # =========================
 # PDF 生成
 # =========================
+@tracing.traced("p10.generate_pdf")
 def generate_pdf(time_str, project_name, fast_cmd, cmd_df, ptl_df, sign_points, notes):
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib import colors
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+    from reportlab.lib.styles import ParagraphStyle
+    from reportlab.lib.units import mm
     font = _get_font()
     buf = io.BytesIO()
     doc = SimpleDocTemplate(buf, pagesize=A4, leftMargin=12*mm, rightMargin=12*mm, topMargin=12*mm, bottomMargin=15*mm)
@@ -349,7 +317,7 @@ if st.sidebar.button("🔧 初始化工作表"):
     init_sheets()
 
 if st.sidebar.button("🔄 強制重新載入"):
-    st.cache_data.clear()
+    sheets_tables.invalidate(SHEET_ID, WS_MAP.values())
     if "sheets_data" in st.session_state:
         del st.session_state["sheets_data"]
     st.rerun()
@@ -475,15 +443,15 @@ dynamic_filename = f"{UNIT_TITLE}執行「{project_name}」規劃表{file_date_s
 if st.button("💾 同步雲端並發送郵件", use_container_width=True):
     s = {"project_name": project_name, "time": time_val, "fast_cmd": fast_cmd, "sign_points": sign_points, "notes": notes}
     save_ok = save_data(s, res_cmd, res_ptl)
-    
-    pdf_buf = generate_pdf(time_val, project_name, fast_cmd, res_cmd, res_ptl, sign_points, notes)
-    mail_ok, mail_err = send_email(dynamic_filename, pdf_buf, dynamic_filename)
-    
-    if save_ok and mail_ok:
-        st.success("✅ 已成功同步至雲端並寄出郵件！")
-    elif save_ok and not mail_ok:
-        st.warning(f"⚠️ 已儲存至雲端，但發送郵件失敗：{mail_err}")
-    elif not save_ok and mail_ok:
-        st.warning("⚠️ 郵件已寄出，但未能儲存至雲端！")
+    if save_ok:
+        st.success("✅ 已成功同步至雲端！")
     else:
-        st.error(f"❌ 儲存與發送均失敗 (發送錯誤：{mail_err})")
+        st.warning("⚠️ 未能儲存至雲端！")
+
+    # PDF 產製與寄信改由背景工作執行，重跑或關閉分頁都不會中斷
+    def pdf_and_mail():
+        pdf_buf = generate_pdf(time_val, project_name, fast_cmd, res_cmd, res_ptl, sign_points, notes)
+        return jobs.expect_ok(send_email)(dynamic_filename, pdf_buf, dynamic_filename)
+
+    jobs.remember("p10_mail_job", jobs.submit("📧 產製 PDF 並寄送郵件", pdf_and_mail))
+jobs.show(jobs.recall("p10_mail_job"))
@@ -9,8 +9,10 @@ except ImportError:
     pass
 
 import pandas as pd
-import gspread
-from google.oauth2.service_account import Credentials
+import sheets_pool
+import sheets_tables
+import jobs
+import tracing
 import smtplib
 import io
 import os
@@ -21,20 +23,12 @@ from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.base import MIMEBase
 from email import encoders
-from reportlab.lib.pagesizes import A4
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import ParagraphStyle
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.lib.units import mm
 
 # =========================
 # 常數與設定
 # =========================
 SHEET_ID = "1dOrFjewsdpTGy0JyBJXmuBhr8p_LSpSb6Lp2gC39KK0"
 WS_MAP = {"set": "危駕月_設定", "cmd": "危駕月_指揮組", "sch": "危駕月_勤務表"}
-SCOPES = ["https://www.googleapis.com/auth/spreadsheets", "https://www.googleapis.com/auth/drive"]
 UNIT = "桃園市政府警察局龍潭分局"
 CMD_COLS = ["職稱", "代號", "姓名", "任務"]
 SCH_COLS = ["日期（22時至翌日6時）", "單位", "巡邏路段"]
@@ -147,24 +141,9 @@ def parse_holidays(holiday_str, roc_year_str):
 # =========================
 # Google Sheets
 # =========================
-@st.cache_resource
-def get_client():
-    if "gcp_service_account" not in st.secrets:
-        st.error("❌ 找不到 gcp_service_account，請確認 Secrets 設定。")
-        return None
-    try:
-        info = dict(st.secrets["gcp_service_account"])
-        info["private_key"] = info["private_key"].replace("\\n", "\n")
-        creds = Credentials.from_service_account_info(info, scopes=SCOPES)
-        return gspread.authorize(creds)
-    except Exception as e:
-        st.error(f"Google 授權失敗：{e}")
-        return None
-
 def init_sheets():
-    client = get_client()
-    if client is None: return
-    sh = client.open_by_key(SHEET_ID)
+    sh = sheets_pool.spreadsheet(SHEET_ID)
+    if sh is None: return
     headers = {WS_MAP["set"]: [["Key", "Value"]], WS_MAP["cmd"]: [CMD_COLS], WS_MAP["sch"]: [SCH_COLS]}
     for name, header in headers.items():
         try:
@@ -172,19 +151,19 @@ def init_sheets():
         except:
             sh.add_worksheet(title=name, rows="200", cols="20").update(header)
     st.success("✅ 初始化完成")
-    st.cache_data.clear()
+    sheets_tables.invalidate(SHEET_ID, WS_MAP.values())
     st.rerun()
 
-@st.cache_data(ttl=600)
+@tracing.traced("p11.load_data")
 def load_data():
     try:
-        client = get_client()
-        if client is None:
+        sh = sheets_pool.spreadsheet(SHEET_ID)
+        if sh is None:
             return None, None, None, {}, "授權失敗"
-        sh = client.open_by_key(SHEET_ID)
-        set_df = pd.DataFrame(sh.worksheet(WS_MAP["set"]).get_all_records()).fillna("")
-        cmd_df = pd.DataFrame(sh.worksheet(WS_MAP["cmd"]).get_all_records()).fillna("")
-        sch_df = pd.DataFrame(sh.worksheet(WS_MAP["sch"]).get_all_records()).fillna("")
+        fr = sheets_tables.read_frames(sh, [WS_MAP["set"], WS_MAP["cmd"], WS_MAP["sch"]], ttl=600)
+        set_df = fr[WS_MAP["set"]].fillna("")
+        cmd_df = fr[WS_MAP["cmd"]].fillna("")
+        sch_df = fr[WS_MAP["sch"]].fillna("")
         if not sch_df.empty:
             if "分工" in sch_df.columns and "巡邏路段" not in sch_df.columns:
                 sch_df = sch_df.rename(columns={"分工": "巡邏路段"})
@@ -196,21 +175,16 @@ def load_data():
     except Exception as e:
         return None, None, None, {}, str(e)
 
+@tracing.traced("p11.save_data")
 def save_data(settings_dict, cmd, sch):
     try:
-        client = get_client()
-        if client is None: return False
-        sh = client.open_by_key(SHEET_ID)
-        ws_set = sh.worksheet(WS_MAP["set"])
-        ws_set.clear()
-        ws_set.update([["Key", "Value"]] + [[k, v] for k, v in settings_dict.items()])
+        sh = sheets_pool.spreadsheet(SHEET_ID)
+        if sh is None: return False
+        tables = {WS_MAP["set"]: [["Key", "Value"]] + [[k, v] for k, v in settings_dict.items()]}
         for ws_name, df, cols in [(WS_MAP["cmd"], cmd, CMD_COLS), (WS_MAP["sch"], sch, SCH_COLS)]:
-            ws = sh.worksheet(ws_name)
-            ws.clear()
             df_clean = df[cols].fillna("")
-            if not df_clean.empty:
-                ws.update([df_clean.columns.tolist()] + df_clean.values.tolist())
-        load_data.clear()
+            tables[ws_name] = [df_clean.columns.tolist()] + df_clean.values.tolist() if not df_clean.empty else []
+        sheets_tables.write_tables(sh, tables, sizes={n: (200, 20) for n in tables}, create=False)
         return True
     except Exception as e:
         st.error(f"❌ 儲存失敗：{e}")
@@ -221,6 +195,8 @@ def save_data(settings_dict, cmd, sch):
 # =========================
 @st.cache_resource
 def _get_font():
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
     fname = "kaiu"
     if fname in pdfmetrics.getRegisteredFontNames(): return fname
     for p in ["kaiu.ttf", "./kaiu.ttf", "/usr/share/fonts/truetype/kaiu.ttf", "/app/kaiu.ttf", "C:/Windows/Fonts/kaiu.ttf"]:
@@ -229,7 +205,13 @@ def _get_font():
             return fname
     return "Helvetica"
 
+@tracing.traced("p11.generate_pdf")
 def generate_pdf(full_title, df_cmd, df_schedule):
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib import colors
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+    from reportlab.lib.styles import ParagraphStyle
+    from reportlab.lib.units import mm
     font = _get_font()
     buf = io.BytesIO()
     doc = SimpleDocTemplate(buf, pagesize=A4, leftMargin=12*mm, rightMargin=12*mm, topMargin=15*mm, bottomMargin=15*mm)
@@ -354,7 +336,7 @@ st.title("🚔 防制危險駕車專案勤務規劃表（月份版）")
 if st.sidebar.button("🔧 初始化工作表"):
     init_sheets()
 if st.sidebar.button("🔄 強制重新載入"):
-    st.cache_data.clear()
+    sheets_tables.invalidate(SHEET_ID, WS_MAP.values())
     st.rerun()
 
 df_set, df_cmd_raw, df_sch_raw, settings, err = load_data()
@@ -408,11 +390,13 @@ if st.button("💾 儲存至雲端並發送 Email", use_container_width=True):
         save_ok = save_data(s, res_cmd, res_sch)
         if save_ok:
             st.success("✅ 雲端試算表資料儲存成功！")
-            pdf_buf = generate_pdf(full_title, res_cmd, res_sch)
-            mail_ok, mail_err = send_email(full_title, pdf_buf, full_title)
-            if mail_ok:
-                st.success("📧 最新勤務表 PDF 已成功寄出！")
-            else:
-                st.error(f"❌ Email 發送失敗：{mail_err}")
+
+            # PDF 產製與寄信改由背景工作執行，重跑或關閉分頁都不會中斷
+            def pdf_and_mail():
+                pdf_buf = generate_pdf(full_title, res_cmd, res_sch)
+                return jobs.expect_ok(send_email)(full_title, pdf_buf, full_title)
+
+            jobs.remember("p11_mail_job", jobs.submit("📧 產製勤務表 PDF 並寄送 Email", pdf_and_mail))
         else:
             st.error("❌ 雲端儲存失敗，已中止發送 Email 作業。")
+jobs.show(jobs.recall("p11_mail_job"))
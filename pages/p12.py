@@ -9,8 +9,10 @@ except ImportError:
     st.sidebar.warning("找不到 menu.py，跳過側邊欄載入。")
 
 import pandas as pd
-import gspread
-from google.oauth2.service_account import Credentials
+import sheets_pool
+import sheets_tables
+import jobs
+import tracing
 from datetime import datetime, timedelta
 import calendar
 import smtplib
@@ -23,17 +25,10 @@ from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.base import MIMEBase
 from email import encoders
-from reportlab.lib.pagesizes import A4
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import ParagraphStyle
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.lib.units import mm
 
 # --- 常數與設定 ---
 SHEET_ID = "1dOrFjewsdpTGy0JyBJXmuBhr8p_LSpSb6Lp2gC39KK0"
-SCOPES = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
+WS_NAMES = ["護老_設定", "護老_指揮組", "護老_勤務表"]
 UNIT = "桃園市政府警察局龍潭分局"
 WEEKDAY_ZH = ["星期一", "星期二", "星期三", "星期四", "星期五", "星期六", "星期日"]
 
@@ -168,68 +163,43 @@ def build_schedule_df(month_str, holiday_str):
 
 
 # --- Google Sheets ---
-@st.cache_resource
-def get_client():
-    try:
-        creds_dict = dict(st.secrets["gcp_service_account"])
-        creds_dict["private_key"] = creds_dict["private_key"].replace("\\n", "\n")
-        creds = Credentials.from_service_account_info(creds_dict, scopes=SCOPES)
-        return gspread.authorize(creds)
-    except Exception as e:
-        st.error(f"Google 授權失敗：{e}")
-        return None
-
 def clean_df_to_list(df):
     return df.astype(str).values.tolist()
 
-@st.cache_data(ttl=600)
+@tracing.traced("p12.load_data")
 def load_data():
     try:
-        client = get_client()
-        if client is None: return None, None, None, None, {}, "權限不足或未設定 Secrets"
-        sh       = client.open_by_key(SHEET_ID)
-        ws_list  = sh.worksheets()
-        ws_set   = next((w for w in ws_list if w.title == "護老_設定"), None)
-        ws_cmd   = next((w for w in ws_list if w.title == "護老_指揮組"), None)
-        ws_sch   = next((w for w in ws_list if w.title == "護老_勤務表"), None)
-        df_set   = pd.DataFrame(ws_set.get_all_records()).fillna("") if ws_set else None
-        df_cmd   = pd.DataFrame(ws_cmd.get_all_records()).fillna("") if ws_cmd else pd.DataFrame()
-        df_sch   = pd.DataFrame(ws_sch.get_all_records()).fillna("") if ws_sch else pd.DataFrame()
+        sh       = sheets_pool.spreadsheet(SHEET_ID)
+        if sh is None: return None, None, None, None, {}, "權限不足或未設定 Secrets"
+        fr       = sheets_tables.read_frames(sh, WS_NAMES, required=False, ttl=600)
+        df_set   = fr["護老_設定"].fillna("") if fr["護老_設定"] is not None else None
+        df_cmd   = fr["護老_指揮組"].fillna("") if fr["護老_指揮組"] is not None else pd.DataFrame()
+        df_sch   = fr["護老_勤務表"].fillna("") if fr["護老_勤務表"] is not None else pd.DataFrame()
         sd       = dict(zip(df_set.iloc[:,0], df_set.iloc[:,1])) if (df_set is not None and not df_set.empty) else {}
         notes    = sd.get("notes", DEFAULT_NOTES)
         return df_set, df_cmd, df_sch, notes, sd, None
     except Exception as e:
         return None, None, None, DEFAULT_NOTES, {}, str(e)
 
+@tracing.traced("p12.save_data")
 def save_data(month, holidays, df_cmd, df_schedule, notes):
     try:
-        client = get_client()
-        if client is None: return False
-        sh = client.open_by_key(SHEET_ID)
-
-        try:
-            ws_set = sh.worksheet("護老_設定")
-        except Exception:
-            ws_set = sh.add_worksheet(title="護老_設定", rows="50", cols="5")
-        ws_set.clear()
-        ws_set.update(range_name='A1', values=[
+        sh = sheets_pool.spreadsheet(SHEET_ID)
+        if sh is None: return False
+
+        tables = {"護老_設定": [
             ["Key", "Value"],
             ["month", month],
             ["holidays", holidays],
             ["notes", notes],
-        ])
+        ]}
 
         for ws_title, df in [("護老_指揮組", df_cmd), ("護老_勤務表", df_schedule)]:
-            try:
-                ws = sh.worksheet(ws_title)
-            except Exception:
-                ws = sh.add_worksheet(title=ws_title, rows="100", cols="20")
-            ws.clear()
             clean = df.dropna(how="all").fillna("")
-            if not clean.empty:
-                ws.update(range_name='A1', values=[clean.columns.tolist()] + clean_df_to_list(clean))
+            tables[ws_title] = [clean.columns.tolist()] + clean_df_to_list(clean) if not clean.empty else []
 
-        load_data.clear()
+        # 缺少的分頁連同清除、寫入一次 batchUpdate 完成
+        sheets_tables.write_tables(sh, tables, sizes={"護老_設定": (50, 5)})
         return True
     except Exception as e:
         st.error(f"❌ 雲端同步失敗：{e}")
@@ -238,6 +208,8 @@ def save_data(month, holidays, df_cmd, df_schedule, notes):
 
 # --- PDF ---
 def _get_font():
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
     fname = "kaiu"
     if fname in pdfmetrics.getRegisteredFontNames(): return fname
     for p in ["kaiu.ttf", "./kaiu.ttf", "C:/Windows/Fonts/kaiu.ttf", "/usr/share/fonts/truetype/custom/kaiu.ttf"]:
@@ -246,7 +218,13 @@ def _get_font():
             return fname
     return "Helvetica"
 
+@tracing.traced("p12.generate_pdf")
 def generate_pdf(month, df_cmd, df_schedule, notes_content):
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib import colors
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+    from reportlab.lib.styles import ParagraphStyle
+    from reportlab.lib.units import mm
     font = _get_font()
     buf  = io.BytesIO()
     doc  = SimpleDocTemplate(buf, pagesize=A4, leftMargin=12*mm, rightMargin=12*mm, topMargin=12*mm, bottomMargin=18*mm)
@@ -363,7 +341,7 @@ def send_report_email(subject, month, df_cmd, df_schedule, notes):
 st.title("🚶 行人及護老交通安全專案勤務規劃表")
 
 if st.sidebar.button("🔄 強制重新載入"):
-    st.cache_data.clear()
+    sheets_tables.invalidate(SHEET_ID, WS_NAMES)
     if "current_holidays" in st.session_state:
         del st.session_state["current_holidays"]
     st.rerun()
@@ -449,11 +427,10 @@ if st.button("💾 同步雲端並發送電子郵件備份", type="primary", use
         res_cmd_clean = res_cmd.dropna(how="all").fillna("")
         res_sch_clean = res_sch.dropna(how="all").fillna("")
         if save_data(c_month, c_holidays, res_cmd_clean, res_sch_clean, ed_notes):
-            with st.spinner("同步成功，正在寄送郵件…"):
-                ok, mail_err = send_report_email(full_header_name, c_month, res_cmd_clean, res_sch_clean, ed_notes)
-            if ok:
-                st.success("📧 資料已同步至 Google Sheets，規劃表 PDF 已成功寄出！")
-            else:
-                st.error(f"❌ 雲端已更新，但寄信失敗：{mail_err}")
+            st.success("✅ 資料已同步至 Google Sheets，規劃表 PDF 於背景寄送中")
+            # PDF 產製與寄信改由背景工作執行，重跑或關閉分頁都不會中斷
+            jobs.remember("p12_mail_job", jobs.submit("📧 產製規劃表 PDF 並寄送郵件", jobs.expect_ok(send_report_email),
+                                                      full_header_name, c_month, res_cmd_clean, res_sch_clean, ed_notes))
         else:
             st.error("❌ 雲端同步失敗，請檢查網路、Secrets 金鑰或試算表權限。")
+jobs.show(jobs.recall("p12_mail_job"))
@@ -9,8 +9,10 @@ except ImportError:
     pass
 
 import pandas as pd
-import gspread
-from google.oauth2.service_account import Credentials
+import sheets_pool
+import sheets_tables
+import jobs
+import tracing
 from datetime import datetime
 import smtplib, io, os
 import urllib.parse as _ul
@@ -20,17 +22,10 @@ from email.mime.base import MIMEBase
 from email import encoders
 import re
 
-from reportlab.lib.pagesizes import A4
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, KeepTogether
-from reportlab.lib.styles import ParagraphStyle
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.lib.units import mm
 
 # --- 常數與設定 ---
 SHEET_ID = "1dOrFjewsdpTGy0JyBJXmuBhr8p_LSpSb6Lp2gC39KK0"
-SCOPES = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
+WS_NAMES = ["砂石_設定", "砂石_指揮組", "砂石_勤務表"]
 UNIT = "桃園市政府警察局龍潭分局"
 
 WEEKDAY_ZH = ["星期一", "星期二", "星期三", "星期四", "星期五", "星期六", "星期日"]
@@ -112,30 +107,16 @@ def parse_holidays(holiday_str, roc_year_str):
     return pd.DataFrame(rows, columns=["勤務日期", "執行單位", "執行人數", "執行路段"])
 
 # --- Google Sheets ---
-@st.cache_resource
-def get_client():
-    if "gcp_service_account" not in st.secrets:
-        st.error("❌ 找不到 gcp_service_account，請確認 Secrets 設定。")
-        return None
-    try:
-        creds_dict = dict(st.secrets["gcp_service_account"])
-        creds_dict["private_key"] = creds_dict["private_key"].replace("\\n", "\n")
-        creds = Credentials.from_service_account_info(creds_dict, scopes=SCOPES)
-        return gspread.authorize(creds)
-    except Exception as e:
-        st.error(f"Google 授權失敗：{e}")
-        return None
-
-@st.cache_data(ttl=600)
+@tracing.traced("p13.load_data")
 def load_data():
     try:
-        client = get_client()
-        if client is None:
+        sh  = sheets_pool.spreadsheet(SHEET_ID)
+        if sh is None:
             return None, None, None, "授權失敗"
-        sh  = client.open_by_key(SHEET_ID)
-        df_set = pd.DataFrame(sh.worksheet("砂石_設定").get_all_records()).fillna("")
-        df_cmd = pd.DataFrame(sh.worksheet("砂石_指揮組").get_all_records()).fillna("")
-        df_sch = pd.DataFrame(sh.worksheet("砂石_勤務表").get_all_records()).fillna("")
+        fr = sheets_tables.read_frames(sh, WS_NAMES, ttl=600)
+        df_set = fr["砂石_設定"].fillna("")
+        df_cmd = fr["砂石_指揮組"].fillna("")
+        df_sch = fr["砂石_勤務表"].fillna("")
         if not df_sch.empty and "日期" in df_sch.columns:
             df_sch.rename(columns={"日期": "勤務日期"}, inplace=True)
         sd = dict(zip(df_set.iloc[:,0], df_set.iloc[:,1])) if not df_set.empty else {}
@@ -143,21 +124,16 @@ def load_data():
     except Exception as e:
         return None, None, {}, str(e)
 
+@tracing.traced("p13.save_data")
 def save_data(month, holidays, df_cmd, df_schedule):
     try:
-        client = get_client()
-        if client is None: return False
-        sh = client.open_by_key(SHEET_ID)
-        ws_set = sh.worksheet("砂石_設定")
-        ws_set.clear()
-        ws_set.update([["Key", "Value"], ["month", month], ["holidays", holidays]])
+        sh = sheets_pool.spreadsheet(SHEET_ID)
+        if sh is None: return False
+        tables = {"砂石_設定": [["Key", "Value"], ["month", month], ["holidays", holidays]]}
         for ws_name, df in [("砂石_指揮組", df_cmd), ("砂石_勤務表", df_schedule)]:
-            ws = sh.worksheet(ws_name)
-            ws.clear()
             df_cleaned = df.dropna(how='all').fillna("")
-            if not df_cleaned.empty:
-                ws.update([df_cleaned.columns.tolist()] + df_cleaned.values.tolist())
-        load_data.clear()
+            tables[ws_name] = [df_cleaned.columns.tolist()] + df_cleaned.values.tolist() if not df_cleaned.empty else []
+        sheets_tables.write_tables(sh, tables, create=False)
         return True
     except Exception as e:
         st.error(f"❌ 同步失敗：{e}")
@@ -165,6 +141,8 @@ def save_data(month, holidays, df_cmd, df_schedule):
 
 # --- PDF 產生 ---
 def _get_font():
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
     fname = "kaiu"
     if fname in pdfmetrics.getRegisteredFontNames(): return fname
     for p in ["kaiu.ttf", "./kaiu.ttf", "C:/Windows/Fonts/kaiu.ttf", "/usr/share/fonts/truetype/custom/kaiu.ttf"]:
@@ -173,7 +151,13 @@ def _get_font():
             return fname
     return "Helvetica"
 
+@tracing.traced("p13.generate_pdf")
 def generate_pdf(month, df_cmd, df_schedule, title_full):
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib import colors
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, KeepTogether
+    from reportlab.lib.styles import ParagraphStyle
+    from reportlab.lib.units import mm
     font = _get_font()
     buf  = io.BytesIO()
     doc  = SimpleDocTemplate(buf, pagesize=A4, leftMargin=12*mm, rightMargin=12*mm, topMargin=12*mm, bottomMargin=12*mm)
@@ -273,7 +257,7 @@ st.title("🚛 取締砂石（大型貨）車重點違規專案勤務規劃表")
 if st.sidebar.button("🔧 初始化工作表"):
     pass  # 工作表已存在，略過
 if st.sidebar.button("🔄 強制重新載入"):
-    st.cache_data.clear()
+    sheets_tables.invalidate(SHEET_ID, WS_NAMES)
     st.rerun()
 
 df_cmd_raw, df_sch_raw, sd, err = load_data()
@@ -326,11 +310,14 @@ if st.button("💾 同步雲端並發送備份郵件", type="primary", use_conta
         res_cmd_clean = res_cmd.dropna(how="all").fillna("")
         res_sch_clean = res_sch.dropna(how="all").fillna("")
         if save_data(month_val, holiday_val, res_cmd_clean, res_sch_clean):
-            pdf_bytes = generate_pdf(month_val, res_cmd_clean, res_sch_clean, full_table_title)
-            ok, mail_err = send_report_email(full_table_title, pdf_bytes, full_table_title)
-            if ok:
-                st.success("✅ 同步與郵件發送成功！")
-            else:
-                st.warning(f"⚠️ 雲端已同步，但郵件失敗：{mail_err}")
+            st.success("✅ 雲端同步成功，郵件於背景寄送中")
+
+            # PDF 產製與寄信改由背景工作執行，重跑或關閉分頁都不會中斷
+            def pdf_and_mail():
+                pdf_bytes = generate_pdf(month_val, res_cmd_clean, res_sch_clean, full_table_title)
+                return jobs.expect_ok(send_report_email)(full_table_title, pdf_bytes, full_table_title)
+
+            jobs.remember("p13_mail_job", jobs.submit("📧 產製 PDF 並寄送備份郵件", pdf_and_mail))
         else:
             st.error("❌ 雲端同步失敗，請檢查權限設定。")
+jobs.show(jobs.recall("p13_mail_job"))
@@ -11,29 +11,20 @@ except ImportError:
 
 import io, os, re, smtplib, urllib.parse as _ul
 import pandas as pd
-import gspread
-from google.oauth2.service_account import Credentials
+import sheets_pool
+import sheets_tables
+import jobs
+import tracing
 from datetime import datetime
 from email import encoders
 from email.mime.base import MIMEBase
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
-from reportlab.lib import colors
-from reportlab.lib.enums import TA_CENTER, TA_LEFT
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import ParagraphStyle
-from reportlab.lib.units import mm
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.platypus import (Paragraph, SimpleDocTemplate, Spacer, Table,
-                                TableStyle)
 
 # ══════════════════════════════════════════════════════════════════════════════
 # 1. 常數
 # ══════════════════════════════════════════════════════════════════════════════
 SHEET_ID = "1dOrFjewsdpTGy0JyBJXmuBhr8p_LSpSb6Lp2gC39KK0"
-SCOPES   = ["https://www.googleapis.com/auth/spreadsheets",
-            "https://www.googleapis.com/auth/drive"]
 
 DEFAULT_UNIT      = "桃園市政府警察局龍潭分局"
 DEFAULT_TIME      = "115年4月10日 19時至23時"
@@ -110,6 +101,8 @@ DEFAULT_ATT_ROWS = pd.DataFrame([
 # 2. 工具函數
 # ══════════════════════════════════════════════════════════════════════════════
 def _get_font():
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
     fname = "kaiu"
     if fname in pdfmetrics.getRegisteredFontNames():
         return fname
@@ -385,6 +378,8 @@ def calculate_stats(df_cmd, df_ptl, df_cp):
 # 5. PDF 工具
 # ══════════════════════════════════════════════════════════════════════════════
 def _make_styles(font):
+    from reportlab.lib.enums import TA_CENTER, TA_LEFT
+    from reportlab.lib.styles import ParagraphStyle
     def S(name, size, align, leading=None, space_after=0, space_before=0):
         return ParagraphStyle(name, fontName=font, fontSize=size,
                               leading=leading or size * 1.4,
@@ -403,9 +398,12 @@ def _clean(t):
     return safe_str(t).replace("\n", "<br/>")
 
 def _header_row(headers, style):
+    from reportlab.platypus import Paragraph
     return [Paragraph(f"<b>{h}</b>", style) for h in headers]
 
 def _base_table_style(font, header_color="#f2f2f2"):
+    from reportlab.lib import colors
+    from reportlab.platypus import TableStyle
     return TableStyle([
         ("FONTNAME",    (0, 0), (-1, -1), font),
         ("GRID",        (0, 0), (-1, -1), 0.5, colors.black),
@@ -429,10 +427,16 @@ def _apply_spans(style_cmds, data_list, merge_cols):
                     style_cmds.append(("SPAN", (col, start), (col, r - 1)))
                 start = r
 
+@tracing.traced("p15.generate_main_pdf")
 def generate_main_pdf(unit, project, time_str, briefing,
                       df_cmd, df_ptl, df_cp, stats,
                       ptl_time, ptl_focus, cp_time, cp_focus,
                       brief_time, brief_loc, cp_loc):
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import ParagraphStyle
+    from reportlab.lib.units import mm
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Table, TableStyle
     font   = _get_font()
     buf    = io.BytesIO()
     PW     = A4[0] - 20 * mm
@@ -597,7 +601,12 @@ def generate_main_pdf(unit, project, time_str, briefing,
     return buf.getvalue()
 
 
+@tracing.traced("p15.generate_attendance_pdf")
 def generate_attendance_pdf(unit, project, time_str, brief_time, brief_loc, df_att_units):
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import mm
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
     font  = _get_font()
     buf   = io.BytesIO()
     # A4 尺寸扣除左右邊界
@@ -671,52 +680,36 @@ def generate_attendance_pdf(unit, project, time_str, brief_time, brief_loc, df_a
 # ══════════════════════════════════════════════════════════════════════════════
 # 6. Google Sheets
 # ══════════════════════════════════════════════════════════════════════════════
-@st.cache_resource
-def get_client():
-    if "gcp_service_account" not in st.secrets:
-        return None
-    try:
-        d = dict(st.secrets["gcp_service_account"])
-        d["private_key"] = d["private_key"].replace("\\n", "\n")
-        creds = Credentials.from_service_account_info(d, scopes=SCOPES)
-        return gspread.authorize(creds)
-    except Exception:
-        return None
-
-@st.cache_data(ttl=30)
+@tracing.traced("p15.load_data")
 def load_data():
-    client = get_client()
-    if client is None:
-        return None, None, None, None, None, "無法建立 Google Sheets 連線"
     try:
-        sh    = client.open_by_key(SHEET_ID)
+        sh = sheets_pool.spreadsheet(SHEET_ID)
+        if sh is None:
+            return None, None, None, None, None, "無法建立 Google Sheets 連線"
+        # 五個分頁一次 batchGet 讀回；簽到單位分頁可有可無
+        main_tabs = ["三合一_設定", "三合一_指揮組", "三合一_巡邏組", "三合一_擴大臨檢組"]
+        recs = sheets_tables.read_records(sh, main_tabs + ["三合一_簽到單位"], required=main_tabs, ttl=30)
         cfg   = {r["Key"]: r["Value"]
-                 for r in sh.worksheet("三合一_設定").get_all_records()
+                 for r in recs["三合一_設定"]
                  if r.get("Key")}
-        df_cmd = pd.DataFrame(sh.worksheet("三合一_指揮組").get_all_records()).fillna("")
-        df_ptl = pd.DataFrame(sh.worksheet("三合一_巡邏組").get_all_records()).fillna("")
-        df_cp  = pd.DataFrame(sh.worksheet("三合一_擴大臨檢組").get_all_records()).fillna("")
-        
-        try:
-            df_att = pd.DataFrame(sh.worksheet("三合一_簽到單位").get_all_records()).fillna("")
-        except Exception:
-            df_att = pd.DataFrame()
-            
+        df_cmd = pd.DataFrame(recs["三合一_指揮組"]).fillna("")
+        df_ptl = pd.DataFrame(recs["三合一_巡邏組"]).fillna("")
+        df_cp  = pd.DataFrame(recs["三合一_擴大臨檢組"]).fillna("")
+        df_att = pd.DataFrame(recs["三合一_簽到單位"] or []).fillna("")
+
         return cfg, df_cmd, df_ptl, df_cp, df_att, None
     except Exception as e:
         return None, None, None, None, None, str(e)
 
+@tracing.traced("p15.save_data")
 def save_data(unit, time_str, project, briefing,
               ptl_time, ptl_focus, cp_time, cp_focus, brief_time, brief_loc, cp_loc,
               df_cmd, df_ptl, df_cp, df_att_units, stats):
-    client = get_client()
-    if client is None:
-        return False, "無法建立連線"
     try:
-        sh = client.open_by_key(SHEET_ID)
-        ws = sh.worksheet("三合一_設定")
-        ws.clear()
-        ws.update([
+        sh = sheets_pool.spreadsheet(SHEET_ID)
+        if sh is None:
+            return False, "無法建立連線"
+        tables = {"三合一_設定": [
             ["Key", "Value"],
             ["unit_name",    unit],
             ["plan_time",    time_str],
@@ -734,20 +727,15 @@ def save_data(unit, time_str, project, briefing,
             ["stats_ptl_场所", str(stats["ptl_场所"])],
             ["stats_inv",    str(stats["inv"])],
             ["stats_total",  str(stats["total"])],
-        ])
+        ]}
         for ws_name, df in [("三合一_指揮組", df_cmd),
                              ("三合一_巡邏組", df_ptl),
                              ("三合一_擴大臨檢組", df_cp),
                              ("三合一_簽到單位", df_att_units)]:
-            try:
-                ws2 = sh.worksheet(ws_name)
-            except Exception:
-                ws2 = sh.add_worksheet(title=ws_name, rows="100", cols="10")
-            ws2.clear()
             clean = df.dropna(how="all").fillna("")
-            if not clean.empty:
-                ws2.update([clean.columns.tolist()] + clean.astype(str).values.tolist())
-        st.cache_data.clear()
+            tables[ws_name] = [clean.columns.tolist()] + clean.astype(str).values.tolist() if not clean.empty else []
+        # 五個分頁的清除與寫入（缺少的分頁一併新建）合併為一次 batchUpdate
+        sheets_tables.write_tables(sh, tables, default_size=(100, 10))
         return True, None
     except Exception as e:
         return False, str(e)
@@ -988,14 +976,12 @@ if st.button("💾 同步雲端並發送郵件", use_container_width=True, type=
             st.error(f"❌ 雲端同步失敗：{err}")
             st.stop()
 
-        mail_ok, mail_err = send_email(
+        # PDF 產製與寄信改由背景工作執行，重跑或關閉分頁都不會中斷
+        jobs.remember("p15_mail_job", jobs.submit(
+            f"📧 產製 PDF 並寄送郵件（{p_name}）", jobs.expect_ok(send_email),
             DEFAULT_UNIT, p_name, p_time, b_info,
             ptl_time, ptl_focus, cp_time, cp_focus, brief_time, brief_loc, cp_loc,
-            st.session_state.df_cmd, st.session_state.df_ptl, st.session_state.df_cp,
-            st.session_state.df_att_units, live_stats)
-        if mail_ok:
-            st.success(f"✅ 雲端同步完成！專案：「{p_name}」，郵件已發送！")
-            st.cache_data.clear()
-            st.rerun()
-        else:
-            st.warning(f"⚠️ 雲端同步成功，但郵件發送失敗：{mail_err}")
+            st.session_state.df_cmd.copy(), st.session_state.df_ptl.copy(), st.session_state.df_cp.copy(),
+            st.session_state.df_att_units.copy(), live_stats))
+        st.rerun()
+jobs.show(jobs.recall("p15_mail_job"))
@@ -10,13 +10,6 @@ import smtplib
 from email.mime.text import MIMEText
 from email.header import Header
 from datetime import datetime, timedelta
-from pdf2image import convert_from_bytes
-
-try:
-    import google.generativeai as genai
-    GENAI_AVAILABLE = True
-except ImportError:
-    GENAI_AVAILABLE = False
 
 # ==========================================
 # 0. 系統初始化與路徑設定
@@ -36,15 +29,22 @@ if "unit_reports" not in st.session_state:
 # ==========================================
 # 1. Gemini API 初始化與設定
 # ==========================================
-model = None
-try:
-    api_key = st.secrets["api"]["GOOGLE_API_KEY"]
-    if GENAI_AVAILABLE:
-        genai.configure(api_key=api_key)
-        # 保持使用 2.5-flash
-        model = genai.GenerativeModel('gemini-2.5-flash')
-except Exception as e:
-    st.error(f"Gemini API 初始化失敗，請檢查 secrets 設定: {e}")
+# google.generativeai 載入需數秒，第一次辨識刑案單時才載入並初始化
+@st.cache_resource(show_spinner=False)
+def _init_model(api_key):
+    import google.generativeai as genai
+    genai.configure(api_key=api_key)
+    # 保持使用 2.5-flash
+    return genai.GenerativeModel('gemini-2.5-flash')
+
+def get_model():
+    try:
+        return _init_model(st.secrets["api"]["GOOGLE_API_KEY"])
+    except ImportError:
+        return None
+    except Exception as e:
+        st.error(f"Gemini API 初始化失敗，請檢查 secrets 設定: {e}")
+        return None
 
 safety_settings = [
     {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"},
@@ -416,6 +416,8 @@ def extract_equip_v2(e_file):
 # 6. Gemini 2.5 Vision 強效刑案單辨識核心
 # ==========================================
 def parse_crime_pdf_gemini(pdf_file, roster: list, unit_idx: int) -> list:
+    from pdf2image import convert_from_bytes
+    model = get_model()
     if model is None:
         st.error("Gemini 模型未初始化，無法辨識刑案單。")
         return []
@@ -603,7 +605,7 @@ if submit_btn:
                 equip = extract_equip_v2(io.BytesIO(e_file.read()))
 
             crimes = []
-            if p_file and model is not None:
+            if p_file and get_model() is not None:
                 crimes = parse_crime_pdf_gemini(p_file, duty_info.get('roster', []), i)
                 if not crimes:
                     st.warning(f"⚠️ 單位 {i+1} 刑案單已上傳，但 AI 未能提取出任何有效資料。")
@@ -15,7 +15,7 @@ from datetime import datetime
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 try:
-    from app import show_sidebar
+    from menu import show_sidebar
 except ImportError:
     def show_sidebar():
         pass
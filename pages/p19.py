@@ -11,8 +11,10 @@ except ImportError:
     st.sidebar.warning("找不到 menu.py，跳過側邊欄載入。")
 
 import pandas as pd
-import gspread
-from google.oauth2.service_account import Credentials
+import sheets_pool
+import sheets_tables
+import jobs
+import tracing
 from datetime import datetime
 import smtplib, io, os, traceback
 import urllib.parse as _ul
@@ -20,24 +22,12 @@ from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.base import MIMEBase
 from email import encoders
-from reportlab.lib.pagesizes import A4
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import ParagraphStyle
-from reportlab.lib.enums import TA_LEFT, TA_CENTER
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.lib.units import mm
 
 # 💡 使用安全別名導入 re 模組，徹底解決 UnboundLocalError 作用域衝突問題
 import re as _re_safe
 
 # --- 常數與設定 ---
 SHEET_ID = "1dOrFjewsdpTGy0JyBJXmuBhr8p_LSpSb6Lp2gC39KK0"
-SCOPES = [
-    "https://spreadsheets.google.com/feeds",
-    "https://www.googleapis.com/auth/drive"
-]
 
 PTL_COLS = ["組別", "無線電代號", "派遣單位", "職別", "姓名", "任務分工", "攜行裝備", "路檢地點"]
 CP_COLS  = ["組別", "無線電代號", "派遣單位", "職別", "姓名", "任務分工", "攜行裝備", "臨檢場所"]
@@ -118,6 +108,8 @@ DEFAULT_CHECKPOINT = pd.DataFrame([
 # ─────────────── 核心輔助函數 ───────────────
 
 def _get_font():
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
     fname = "kaiu"
     if fname in pdfmetrics.getRegisteredFontNames():
         return fname
@@ -150,52 +142,21 @@ def get_commander_name(df_cmd):
             return safe_str(cmd_row.iloc[0]["負責人員"])
     return "分局長"
 
-# ─────────────── ★ get_client ───────────────
-
-@st.cache_resource
-def get_client():
-    try:
-        info = dict(st.secrets["gcp_service_account"])
-        info["private_key"] = info["private_key"].replace("\\n", "\n")
-        creds = Credentials.from_service_account_info(info, scopes=SCOPES)
-        return gspread.authorize(creds)
-    except Exception as e:
-        st.error(f"Google 授權失敗：{e}")
-        return None
-
 # ─────────────── 資料載入 ───────────────
 
-@st.cache_data(ttl=10)
+@tracing.traced("p19.load_data")
 def load_data():
     try:
-        client = get_client()
-        if client is None:
+        sh = sheets_pool.spreadsheet(SHEET_ID)
+        if sh is None:
             return None, None, None, None, "權限不足或未設定 Secrets"
-        sh = client.open_by_key(SHEET_ID)
-
-        try:
-            ws_set = sh.worksheet(WS_SET_NAME)
-            df_set = pd.DataFrame(ws_set.get_all_records()).fillna("")
-        except Exception:
-            df_set = None
-
-        try:
-            ws_cmd = sh.worksheet(WS_CMD_NAME)
-            df_cmd = pd.DataFrame(ws_cmd.get_all_records()).fillna("")
-        except Exception:
-            df_cmd = pd.DataFrame()
-
-        try:
-            ws_ptl = sh.worksheet(WS_PTL_NAME)
-            df_ptl = pd.DataFrame(ws_ptl.get_all_records()).fillna("")
-        except Exception:
-            df_ptl = pd.DataFrame()
-
-        try:
-            ws_cp = sh.worksheet(WS_CP_NAME)
-            df_cp = pd.DataFrame(ws_cp.get_all_records()).fillna("")
-        except Exception:
-            df_cp = None
+
+        # 四個分頁一次 batchGet 讀回；不存在的分頁為 None
+        fr = sheets_tables.read_frames(sh, [WS_SET_NAME, WS_CMD_NAME, WS_PTL_NAME, WS_CP_NAME], required=False, ttl=10, poll=True)
+        df_set = fr[WS_SET_NAME].fillna("") if fr[WS_SET_NAME] is not None else None
+        df_cmd = fr[WS_CMD_NAME].fillna("") if fr[WS_CMD_NAME] is not None else pd.DataFrame()
+        df_ptl = fr[WS_PTL_NAME].fillna("") if fr[WS_PTL_NAME] is not None else pd.DataFrame()
+        df_cp = fr[WS_CP_NAME].fillna("") if fr[WS_CP_NAME] is not None else None
 
         return df_set, df_cmd, df_ptl, df_cp, None
 
@@ -204,20 +165,15 @@ def load_data():
 
 # ─────────────── 資料儲存 ───────────────
 
+@tracing.traced("p19.save_data")
 def save_data(unit, time_str, project, briefing, df_cmd, df_ptl, df_cp, stats, ptl_f, cp_f):
     try:
-        client = get_client()
-        if client is None:
+        sh = sheets_pool.spreadsheet(SHEET_ID)
+        if sh is None:
             st.error("❌ 無法取得 Google 授權，請確認 Secrets 設定。")
             return False
-        sh = client.open_by_key(SHEET_ID)
-
-        try:
-            ws_set = sh.worksheet(WS_SET_NAME)
-        except Exception:
-            ws_set = sh.add_worksheet(title=WS_SET_NAME, rows="50", cols="5")
-        ws_set.clear()
-        ws_set.update(range_name="A1", values=[
+
+        tables = {WS_SET_NAME: [
             ["Key", "Value"],
             ["unit_name",      unit],
             ["plan_full_time", time_str],
@@ -235,36 +191,14 @@ def save_data(unit, time_str, project, briefing, df_cmd, df_ptl, df_cp, stats, p
             ["loc_3",          str(stats["loc_3"])],
             ["ptl_focus",      ptl_f],
             ["cp_focus",       cp_f],
-        ])
+        ]}
+
+        for ws_name, df in [(WS_CMD_NAME, df_cmd), (WS_PTL_NAME, df_ptl), (WS_CP_NAME, df_cp)]:
+            clean = df.dropna(how="all").fillna("")
+            tables[ws_name] = [clean.columns.tolist()] + clean_df_to_list(clean) if not clean.empty else []
 
-        try:
-            ws_c = sh.worksheet(WS_CMD_NAME)
-        except Exception:
-            ws_c = sh.add_worksheet(title=WS_CMD_NAME, rows="100", cols="20")
-        ws_c.clear()
-        clean_cmd = df_cmd.dropna(how="all").fillna("")
-        if not clean_cmd.empty:
-            ws_c.update(range_name="A1", values=[clean_cmd.columns.tolist()] + clean_df_to_list(clean_cmd))
-
-        try:
-            ws_p = sh.worksheet(WS_PTL_NAME)
-        except Exception:
-            ws_p = sh.add_worksheet(title=WS_PTL_NAME, rows="100", cols="20")
-        ws_p.clear()
-        clean_ptl = df_ptl.dropna(how="all").fillna("")
-        if not clean_ptl.empty:
-            ws_p.update(range_name="A1", values=[clean_ptl.columns.tolist()] + clean_df_to_list(clean_ptl))
-
-        try:
-            ws_cp = sh.worksheet(WS_CP_NAME)
-        except Exception:
-            ws_cp = sh.add_worksheet(title=WS_CP_NAME, rows="100", cols="20")
-        ws_cp.clear()
-        clean_cp = df_cp.dropna(how="all").fillna("")
-        if not clean_cp.empty:
-            ws_cp.update(range_name="A1", values=[clean_cp.columns.tolist()] + clean_df_to_list(clean_cp))
-
-        load_data.clear()
+        # 四個分頁（含缺少時新建）的清除與寫入合併為一次 batchUpdate
+        sheets_tables.write_tables(sh, tables, sizes={WS_SET_NAME: (50, 5)})
         return True
 
     except Exception as e:
@@ -276,6 +210,7 @@ def save_data(unit, time_str, project, briefing, df_cmd, df_ptl, df_cp, stats, p
 
 def apply_simulated_span(data_table, ts_list, m_groups, cols):
     """將合併效果轉換為視覺化留白（消除跨頁斷行 Bug）"""
+    from reportlab.lib import colors
     total_rows = len(data_table)
     for (rs, re) in m_groups:
         if re > rs:
@@ -288,7 +223,13 @@ def apply_simulated_span(data_table, ts_list, m_groups, cols):
             for col in cols:
                 ts_list.append(("LINEBELOW", (col, re), (col, re), 0.5, colors.black))
 
+@tracing.traced("p19.generate_pdf_from_data")
 def generate_pdf_from_data(unit, project, time_str, briefing, df_cmd, df_ptl, df_cp, stats, ptl_f, cp_f):
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib import colors
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+    from reportlab.lib.styles import ParagraphStyle
+    from reportlab.lib.units import mm
     font = _get_font()
     buf  = io.BytesIO()
     doc  = SimpleDocTemplate(
@@ -613,7 +554,13 @@ def generate_pdf_from_data(unit, project, time_str, briefing, df_cmd, df_ptl, df
 
 # ─────────────── PDF 生成：簽到表 ───────────────
 
+@tracing.traced("p19.generate_attendance_pdf")
 def generate_attendance_pdf(unit, project, time_str, stats, df_cmd):
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib import colors
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+    from reportlab.lib.styles import ParagraphStyle
+    from reportlab.lib.units import mm
     font = _get_font()
     buf  = io.BytesIO()
     doc  = SimpleDocTemplate(
@@ -1002,13 +949,12 @@ if st.button("💾 同步雲端並發送郵件", use_container_width=True):
             current_stats, res_ptl_focus, res_cp_focus,
         )
     if ok:
-        with st.spinner("同步成功，正在寄送郵件…"):
-            mail_ok, mail_err = send_report_email(
-                u, p_name, p_time, DEFAULT_BRIEF,
-                res_cmd, res_ptl, res_cp,
-                current_stats, res_ptl_focus, res_cp_focus,
-            )
-        if mail_ok:
-            st.success("✅ 資料已同步至 Google Sheets，郵件發送成功！")
-        else:
-            st.warning(f"⚠️ 同步成功，但郵件發送失敗：{mail_err}")
+        st.success("✅ 資料已同步至 Google Sheets，郵件於背景寄送中")
+        # PDF 產製與寄信改由背景工作執行，重跑或關閉分頁都不會中斷
+        jobs.remember("p19_mail_job", jobs.submit(
+            "📧 產製 PDF 並寄送郵件", jobs.expect_ok(send_report_email),
+            u, p_name, p_time, DEFAULT_BRIEF,
+            res_cmd, res_ptl, res_cp,
+            current_stats, res_ptl_focus, res_cp_focus,
+        ))
+jobs.show(jobs.recall("p19_mail_job"))
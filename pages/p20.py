@@ -1,8 +1,10 @@
 import streamlit as st
 import pandas as pd
-import gspread
-from gspread.exceptions import WorksheetNotFound, APIError
-from google.oauth2.service_account import Credentials
+import sheets_pool
+import sheets_tables
+import jobs
+import tracing
+from gspread.exceptions import APIError
 from datetime import datetime
 import smtplib, io, os, traceback
 import urllib.parse as _ul
@@ -10,14 +12,6 @@ from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.base import MIMEBase
 from email import encoders
-from reportlab.lib.pagesizes import A4
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import ParagraphStyle
-from reportlab.lib.enums import TA_LEFT, TA_CENTER
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.lib.units import mm
 import re
 
 # --- 1. 頁面設定 (必須是第一個 Streamlit 指令) ---
@@ -32,7 +26,6 @@ except ImportError:
 
 # --- 常數與設定 ---
 SHEET_ID = "1dOrFjewsdpTGy0JyBJXmuBhr8p_LSpSb6Lp2gC39KK0"
-SCOPES = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
 
 WS_MAP = {
     "set": "專案_設定",
@@ -72,6 +65,8 @@ DEFAULT_CP = pd.DataFrame([
 
 # --- 2. 輔助函數 ---
 def _get_font():
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
     fname = "kaiu"
     if fname in pdfmetrics.getRegisteredFontNames(): return fname
     font_paths = ["kaiu.ttf", "./kaiu.ttf", "C:/Windows/Fonts/kaiu.ttf", "/usr/share/fonts/truetype/custom/kaiu.ttf"]
@@ -142,18 +137,9 @@ def get_merge_styles(df, merge_cols):
             start_idx = end_idx + 1
     return span_styles
 
-@st.cache_resource
-def get_client():
-    if "gcp_service_account" not in st.secrets: return None
-    creds_dict = dict(st.secrets["gcp_service_account"])
-    creds_dict["private_key"] = creds_dict["private_key"].replace("\\n", "\n")
-    creds = Credentials.from_service_account_info(creds_dict, scopes=SCOPES)
-    return gspread.authorize(creds)
-
 def init_sheets():
     try:
-        client = get_client()
-        sh = client.open_by_key(SHEET_ID)
+        sh = sheets_pool.spreadsheet(SHEET_ID)
         headers = {
             WS_MAP["set"]: [["Key", "Value"]],
             WS_MAP["cmd"]: [["職稱", "無線電代號", "負責人員", "任務"]],
@@ -167,57 +153,48 @@ def init_sheets():
             except:
                 sh.add_worksheet(title=ws_name, rows="100", cols="20").update(range_name='A1', values=head)
                 st.sidebar.success(f"➕ 已建立 {ws_name}")
-        st.cache_data.clear()
+        sheets_tables.invalidate(SHEET_ID, WS_MAP.values())
         st.rerun()
     except Exception as e:
         st.error(f"初始化失敗：{e}")
 
-@st.cache_data(ttl=600)
+@tracing.traced("p20.load_data")
 def load_data():
     try:
-        client = get_client()
-        if client is None: return None, None, None, None, "權限不足"
-        sh = client.open_by_key(SHEET_ID)
+        sh = sheets_pool.spreadsheet(SHEET_ID)
+        if sh is None: return None, None, None, None, "權限不足"
         
-        try: df_set = pd.DataFrame(sh.worksheet(WS_MAP["set"]).get_all_records()).fillna("")
-        except: df_set = pd.DataFrame()
-        try: df_cmd = pd.DataFrame(sh.worksheet(WS_MAP["cmd"]).get_all_records()).fillna("")
-        except: df_cmd = pd.DataFrame()
-        try: df_ptl = pd.DataFrame(sh.worksheet(WS_MAP["ptl"]).get_all_records()).fillna("")
-        except: df_ptl = pd.DataFrame()
-        try: df_cp  = pd.DataFrame(sh.worksheet(WS_MAP["cp"]).get_all_records()).fillna("")
-        except: df_cp  = pd.DataFrame()
+        # 四個分頁一次 batchGet 讀回；不存在的分頁視為空表
+        fr = sheets_tables.read_frames(sh, [WS_MAP[k] for k in ("set", "cmd", "ptl", "cp")], required=False, ttl=600)
+        df_set, df_cmd, df_ptl, df_cp = (fr[WS_MAP[k]].fillna("") if fr[WS_MAP[k]] is not None else pd.DataFrame()
+                                         for k in ("set", "cmd", "ptl", "cp"))
 
         return df_set, df_cmd, df_ptl, df_cp, None
     except Exception as e: return None, None, None, None, str(e)
 
+@tracing.traced("p20.save_data")
 def save_data(unit, time_str, project, briefing, station, p1_desc, p2_desc, df_cmd, df_ptl, df_cp):
     try:
-        client = get_client()
-        sh = client.open_by_key(SHEET_ID)
+        sh = sheets_pool.spreadsheet(SHEET_ID)
         
-        try: ws_set = sh.worksheet(WS_MAP["set"])
-        except WorksheetNotFound: ws_set = sh.add_worksheet(title=WS_MAP["set"], rows="50", cols="5")
-        ws_set.clear()
-        ws_set.update(range_name='A1', values=[
+        tables = {WS_MAP["set"]: [
             ["Key", "Value"], ["unit_name", unit], ["plan_full_time", time_str], ["project_name", project], 
             ["briefing_info", briefing], ["check_station", station], ["phase1_desc", p1_desc], ["phase2_desc", p2_desc]
-        ])
+        ]}
         
         for ws_name, df, expected_cols in [(WS_MAP["cmd"], df_cmd, ["職稱", "無線電代號", "負責人員", "任務"]), 
                                            (WS_MAP["ptl"], df_ptl, EXPECTED_PTL_COLS), 
                                            (WS_MAP["cp"], df_cp, EXPECTED_CP_COLS)]:
-            try: ws = sh.worksheet(ws_name)
-            except WorksheetNotFound: ws = sh.add_worksheet(title=ws_name, rows="100", cols="20")
-            ws.clear()
             df_cleaned = df.dropna(how='all').fillna("")
             if not df_cleaned.empty:
                 cols = df_cleaned.columns.tolist()
-                ws.update(range_name='A1', values=[cols] + clean_df_to_list(df_cleaned))
+                tables[ws_name] = [cols] + clean_df_to_list(df_cleaned)
             else:
-                ws.update(range_name='A1', values=[expected_cols])
+                tables[ws_name] = [expected_cols]
+
+        # 四個分頁（含缺少時新建）的清除與寫入合併為一次 batchUpdate
+        sheets_tables.write_tables(sh, tables, sizes={WS_MAP["set"]: (50, 5)})
                 
-        st.cache_data.clear()
         return True
     except Exception as e: 
         st.error(f"儲存失敗：{e}")
@@ -227,6 +204,7 @@ def save_data(unit, time_str, project, briefing, station, p1_desc, p2_desc, df_c
 A4_SIZE = (float(595.275), float(841.890))
 
 def add_page_number(canvas, doc):
+    from reportlab.lib.units import mm
     canvas.saveState()
     canvas.setFont(_get_font(), 11)
     page_num = canvas.getPageNumber()
@@ -234,7 +212,13 @@ def add_page_number(canvas, doc):
     canvas.drawCentredString(A4_SIZE[0] / 2.0, 10 * mm, text)
     canvas.restoreState()
 
+@tracing.traced("p20.generate_pdf_from_data")
 def generate_pdf_from_data(unit, project, time_str, briefing, station, p1_desc, p2_desc, df_cmd, df_ptl, df_cp):
+    from reportlab.lib import colors
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+    from reportlab.lib.styles import ParagraphStyle
+    from reportlab.lib.enums import TA_LEFT
+    from reportlab.lib.units import mm
     font = _get_font()
     buf = io.BytesIO()
     margin_lr, margin_tb = float(12 * mm), float(15 * mm)
@@ -349,7 +333,12 @@ def generate_pdf_from_data(unit, project, time_str, briefing, station, p1_desc,
     doc.build(story, onFirstPage=add_page_number, onLaterPages=add_page_number)
     return buf.getvalue()
 
+@tracing.traced("p20.generate_attendance_pdf")
 def generate_attendance_pdf(unit, project, time_str, briefing):
+    from reportlab.lib import colors
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+    from reportlab.lib.styles import ParagraphStyle
+    from reportlab.lib.units import mm
     font = _get_font()
     buf = io.BytesIO()
     margin_lr, margin_tb = float(15 * mm), float(15 * mm)
@@ -486,7 +475,6 @@ if st.sidebar.button("⚠️ 強制重置為預設資料 (覆蓋雲端)"):
         save_data(DEFAULT_UNIT, DEFAULT_TIME, DEFAULT_PROJ, DEFAULT_BRIEF, DEFAULT_STATION, DEFAULT_P1_DESC, DEFAULT_P2_DESC, DEFAULT_CMD, DEFAULT_PTL, DEFAULT_CP)
         if "ptl_editable_df" in st.session_state: del st.session_state.ptl_editable_df
         if "cp_editable_df" in st.session_state: del st.session_state.cp_editable_df
-        st.cache_data.clear()
         st.rerun()
 
 df_set, df_cmd, df_ptl, df_cp, err = load_data()
@@ -575,10 +563,10 @@ st.markdown("---")
 if st.button("💾 同步雲端並發送備份郵件", use_container_width=True):
     with st.spinner("處理中..."):
         save_data(u, p_time, p_name, b_info, s_info, phase1_desc, phase2_desc, res_cmd, res_ptl, res_cp)
-        ok, max_err = send_report_email(u, p_name, p_time, b_info, s_info, phase1_desc, phase2_desc, res_cmd, res_ptl, res_cp)
-        if ok: 
-            st.success("✅ 同步與郵件發送成功！")
-            if "ptl_editable_df" in st.session_state: del st.session_state.ptl_editable_df
-            if "cp_editable_df" in st.session_state: del st.session_state.cp_editable_df
-            st.rerun()
-        else: st.warning(f"⚠️ 雲端已同步，但郵件失敗: {max_err}")
+        # PDF 產製與寄信改由背景工作執行，重跑或關閉分頁都不會中斷
+        jobs.remember("p20_mail_job", jobs.submit("📧 產製 PDF 並寄送備份郵件", jobs.expect_ok(send_report_email),
+                                                  u, p_name, p_time, b_info, s_info, phase1_desc, phase2_desc, res_cmd, res_ptl, res_cp))
+        if "ptl_editable_df" in st.session_state: del st.session_state.ptl_editable_df
+        if "cp_editable_df" in st.session_state: del st.session_state.cp_editable_df
+        st.rerun()
+jobs.show(jobs.recall("p20_mail_job"))
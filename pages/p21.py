@@ -1,7 +1,10 @@
 import streamlit as st
 import pandas as pd
-import gspread
-from google.oauth2.service_account import Credentials
+import sheets_pool
+import sheets_tables
+from gspread.exceptions import WorksheetNotFound
+import jobs
+import tracing
 from datetime import datetime
 import smtplib, io, os, traceback
 import urllib.parse as _ul
@@ -9,13 +12,6 @@ from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.base import MIMEBase
 from email import encoders
-from reportlab.lib.pagesizes import A4
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import ParagraphStyle
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.lib.units import mm
 import re as _re_safe
 
 try:
@@ -28,7 +24,6 @@ except ImportError:
 # 常數與 Google 授權設定 (使用全新 Sheet Tab)
 # ==========================================
 SHEET_ID = "1dOrFjewsdpTGy0JyBJXmuBhr8p_LSpSb6Lp2gC39KK0"
-SCOPES = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
 
 S1_COLS = ["組別", "無線電代號", "派遣單位", "職別", "姓名", "任務分工", "攜行裝備", "機動攔檢區域"]
 S2_COLS = ["組別", "無線電代號", "派遣單位", "職別", "姓名", "任務分工", "臨檢目標場所"]
@@ -69,6 +64,8 @@ DEFAULT_S3 = pd.DataFrame([{"組別": "第1路檢組", "無線電代號": "隆
 # 工具函數區塊
 # ==========================================
 def _get_font():
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
     fname = "kaiu"
     if fname in pdfmetrics.getRegisteredFontNames(): return fname
     for p in ["./kaiu.ttf", "kaiu.ttf", "/usr/share/fonts/truetype/custom/kaiu.ttf", "C:/Windows/Fonts/kaiu.ttf"]:
@@ -90,31 +87,23 @@ def get_commander_name(df_cmd):
         if not cmd_row.empty: return safe_str(cmd_row.iloc[0]["負責人員"])
     return "分局長"
 
-@st.cache_resource
-def get_client():
-    try:
-        info = dict(st.secrets["gcp_service_account"])
-        info["private_key"] = info["private_key"].replace("\\n", "\n")
-        creds = Credentials.from_service_account_info(info, scopes=SCOPES)
-        return gspread.authorize(creds)
-    except Exception as e:
-        st.error(f"Google 授權失敗：{e}")
-        return None
-
 # ==========================================
 # 資料存取區塊 (全面強化手動列新增防呆)
 # ==========================================
-@st.cache_data(ttl=3) # 快取優化至 3 秒，重新整理更即時
+@tracing.traced("p21.load_data")
 def load_data():
     try:
-        client = get_client()
-        if client is None: return None, None, None, None, None, "權限不足"
-        sh = client.open_by_key(SHEET_ID)
+        sh = sheets_pool.spreadsheet(SHEET_ID)
+        if sh is None: return None, None, None, None, None, "權限不足"
         
+        # 五個分頁一次 batchGet 讀回；仍用原始儲存格值（同 get_all_values）避免對齊崩潰
+        vals = sheets_tables.read_values(sh, [WS_SET_NAME, WS_CMD_NAME, WS_S1_NAME, WS_S2_NAME, WS_S3_NAME], ttl=3, poll=True) # 每 3 秒比對版本戳記，有人儲存才整批重讀
+
         def _get_ws(name, default_df):
             try:
-                ws = sh.worksheet(name)
-                raw_data = ws.get_all_values() # 改用更強韌的 get_all_values 避免對齊崩潰
+                raw_data = vals[name]
+                if raw_data is None:
+                    raise WorksheetNotFound(name)
                 if not raw_data or len(raw_data) < 1:
                     return default_df.copy() if default_df is not None else pd.DataFrame()
                 
@@ -144,22 +133,16 @@ def load_data():
     except Exception as e:
         return None, None, None, None, None, str(e)
 
+@tracing.traced("p21.save_data")
 def save_data(unit, time_str, project, briefing, df_cmd, df_s1, df_s2, df_s3, stats, t_s1, t_s2, t_s3, f_s1, f_s2, f_s3):
     try:
-        client = get_client()
-        if client is None: return False
-        sh = client.open_by_key(SHEET_ID)
-        def _update_ws(name, df, cols=20):
-            try: ws = sh.worksheet(name)
-            except: ws = sh.add_worksheet(title=name, rows="100", cols=str(cols))
-            ws.clear()
+        sh = sheets_pool.spreadsheet(SHEET_ID)
+        if sh is None: return False
+        def _table(df):
             clean_df = df.dropna(how="all").fillna("")
-            if not clean_df.empty: ws.update(range_name="A1", values=[clean_df.columns.tolist()] + clean_df_to_list(clean_df))
+            return [clean_df.columns.tolist()] + clean_df_to_list(clean_df) if not clean_df.empty else []
         
-        try: ws_set = sh.worksheet(WS_SET_NAME)
-        except: ws_set = sh.add_worksheet(title=WS_SET_NAME, rows="50", cols="5")
-        ws_set.clear()
-        ws_set.update(range_name="A1", values=[
+        tables = {WS_SET_NAME: [
             ["Key", "Value"], ["unit_name", unit], ["plan_full_time", time_str], ["project_name", project],
             ["briefing_info", briefing], ["stats_cmd", str(stats["cmd"])],
             ["stats_s1", str(stats["s1"])], ["stats_s2", str(stats["s2"])], ["stats_s3", str(stats["s3"])],
@@ -167,10 +150,11 @@ def save_data(unit, time_str, project, briefing, df_cmd, df_s1, df_s2, df_s3, st
             ["briefing_time", str(stats["b_time"])], ["briefing_loc", str(stats["b_loc"])],
             ["s1_time", t_s1], ["s2_time", t_s2], ["s3_time", t_s3], 
             ["s1_focus", f_s1], ["s2_focus", f_s2], ["s3_focus", f_s3],
-        ])
+        ]}
+        tables.update({WS_CMD_NAME: _table(df_cmd), WS_S1_NAME: _table(df_s1), WS_S2_NAME: _table(df_s2), WS_S3_NAME: _table(df_s3)})
 
-        _update_ws(WS_CMD_NAME, df_cmd); _update_ws(WS_S1_NAME, df_s1); _update_ws(WS_S2_NAME, df_s2); _update_ws(WS_S3_NAME, df_s3)
-        load_data.clear()
+        # 五個分頁（含缺少時新建）的清除與寫入合併為一次 batchUpdate
+        sheets_tables.write_tables(sh, tables, sizes={WS_SET_NAME: (50, 5)})
         return True
     except Exception as e:
         st.error(f"❌ 同步失敗：{e}")
@@ -179,7 +163,13 @@ def save_data(unit, time_str, project, briefing, df_cmd, df_s1, df_s2, df_s3, st
 # ==========================================
 # PDF 產出區塊
 # ==========================================
+@tracing.traced("p21.generate_pdf_from_data")
 def generate_pdf_from_data(unit, project, time_str, briefing, df_cmd, df_s1, df_s2, df_s3, stats, t_s1, t_s2, t_s3, f_s1, f_s2, f_s3):
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib import colors
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+    from reportlab.lib.styles import ParagraphStyle
+    from reportlab.lib.units import mm
     font = _get_font()
     buf = io.BytesIO()
     doc = SimpleDocTemplate(buf, pagesize=A4, leftMargin=10*mm, rightMargin=10*mm, topMargin=12*mm, bottomMargin=15*mm)
@@ -271,7 +261,13 @@ def generate_pdf_from_data(unit, project, time_str, briefing, df_cmd, df_s1, df_
     doc.build(story, onFirstPage=add_footer, onLaterPages=add_footer)
     return buf.getvalue()
 
+@tracing.traced("p21.generate_attendance_pdf")
 def generate_attendance_pdf(unit, project, time_str, stats, df_cmd):
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib import colors
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+    from reportlab.lib.styles import ParagraphStyle
+    from reportlab.lib.units import mm
     font = _get_font()
     buf  = io.BytesIO()
     doc  = SimpleDocTemplate(buf, pagesize=A4, leftMargin=15*mm, rightMargin=15*mm, topMargin=10*mm, bottomMargin=10*mm)
@@ -336,13 +332,13 @@ df_set, df_cmd, df_s1, df_s2, df_s3, err = load_data()
 # 自動匯入二合一舊資料當預設值 (精準判斷三階段設定表是否為空)
 if not err and (df_set is None or (isinstance(df_set, pd.DataFrame) and df_set.empty)):
     try:
-        client = get_client()
-        if client:
-            sh = client.open_by_key(SHEET_ID)
-            old_set = pd.DataFrame(sh.worksheet("二合一_設定").get_all_records()).fillna("")
-            old_cmd = pd.DataFrame(sh.worksheet("二合一_指揮組").get_all_records()).fillna("")
-            old_ptl = pd.DataFrame(sh.worksheet("二合一_路檢組").get_all_records()).fillna("")
-            old_cp  = pd.DataFrame(sh.worksheet("二合一_擴大臨檢組").get_all_records()).fillna("")
+        sh = sheets_pool.spreadsheet(SHEET_ID)
+        if sh:
+            fr = sheets_tables.read_frames(sh, ["二合一_設定", "二合一_指揮組", "二合一_路檢組", "二合一_擴大臨檢組"])
+            old_set = fr["二合一_設定"].fillna("")
+            old_cmd = fr["二合一_指揮組"].fillna("")
+            old_ptl = fr["二合一_路檢組"].fillna("")
+            old_cp  = fr["二合一_擴大臨檢組"].fillna("")
             
             if not old_set.empty:
                 st.toast("✨ 偵測到首次啟用，已自動為您匯入舊版『二合一』的人員名單！", icon="📥")
@@ -487,7 +483,8 @@ st.markdown("---")
 if st.button("💾 儲存【三階段專案】規劃並發送郵件", use_container_width=True):
     with st.spinner("同步至 Google Sheets 中..."):
         if save_data(u, p_time, p_name, DEFAULT_BRIEF, res_cmd, res_s1, res_s2, res_s3, current_stats, res_s1_time, res_s2_time, res_s3_time, res_s1_focus, res_s2_focus, res_s3_focus):
-            with st.spinner("正在產生 PDF 並寄送郵件..."):
-                ok, err = send_report_email(u, p_name, p_time, DEFAULT_BRIEF, res_cmd, res_s1, res_s2, res_s3, current_stats, res_s1_time, res_s2_time, res_s3_time, res_s1_focus, res_s2_focus, res_s3_focus)
-                if ok: st.success("✅ 資料已同步，且郵件發送成功！")
-                else: st.warning(f"⚠️ 同步成功，但郵件失敗：{err}")
+            st.success("✅ 資料已同步，郵件於背景寄送中")
+            # PDF 產製與寄信改由背景工作執行，重跑或關閉分頁都不會中斷
+            jobs.remember("p21_mail_job", jobs.submit("📧 產生 PDF 並寄送郵件", jobs.expect_ok(send_report_email),
+                                                      u, p_name, p_time, DEFAULT_BRIEF, res_cmd, res_s1, res_s2, res_s3, current_stats, res_s1_time, res_s2_time, res_s3_time, res_s1_focus, res_s2_focus, res_s3_focus))
+jobs.show(jobs.recall("p21_mail_job"))
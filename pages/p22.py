@@ -1,7 +1,5 @@
 import streamlit as st
 import pandas as pd
-import gspread
-from google.oauth2.service_account import Credentials
 import io, os, re, smtplib, calendar
 from datetime import datetime, timedelta
 import urllib.parse as _ul
@@ -9,13 +7,6 @@ from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.base import MIMEBase
 from email import encoders
-from reportlab.lib.pagesizes import A4
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import ParagraphStyle
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.lib.units import mm
 
 st.set_page_config(page_title="綜合勤務規劃總署", layout="wide", page_icon="🚓")
 
@@ -30,7 +21,6 @@ except ImportError:
 # 1. 核心設定與預設資料庫 (DUTY_PROFILES)
 # ==========================================
 SHEET_ID = "1dOrFjewsdpTGy0JyBJXmuBhr8p_LSpSb6Lp2gC39KK0"
-SCOPES = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
 UNIT = "桃園市政府警察局龍潭分局"
 
 # --- 預設指揮組 ---
@@ -100,6 +90,8 @@ DUTY_PROFILES = {
 # ==========================================
 @st.cache_resource
 def _get_font():
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
     fname = "kaiu"
     if fname in pdfmetrics.getRegisteredFontNames(): return fname
     for p in ["./kaiu.ttf", "kaiu.ttf", "/usr/share/fonts/truetype/custom/kaiu.ttf", "C:/Windows/Fonts/kaiu.ttf"]:
@@ -112,6 +104,11 @@ def generate_universal_pdf(duty_name, project_name, meta_dict, dfs_dict):
     """
     終極 PDF 產出引擎：無論傳入幾個 DataFrame、長什麼形狀，都會自動計算欄寬、自動繪製表格，並自動合併相同屬性的列。
     """
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib import colors
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+    from reportlab.lib.styles import ParagraphStyle
+    from reportlab.lib.units import mm
     font = _get_font()
     buf = io.BytesIO()
     doc = SimpleDocTemplate(buf, pagesize=A4, leftMargin=12*mm, rightMargin=12*mm, topMargin=12*mm, bottomMargin=15*mm)
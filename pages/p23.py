@@ -11,9 +11,11 @@ except ImportError:
     pass
 
 import pandas as pd
-import gspread
-from gspread.exceptions import WorksheetNotFound, APIError
-from google.oauth2.service_account import Credentials
+import sheets_pool
+import sheets_tables
+import jobs
+import tracing
+from gspread.exceptions import APIError
 from datetime import datetime
 import smtplib, io, os, traceback
 import urllib.parse as _ul
@@ -21,19 +23,10 @@ from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.base import MIMEBase
 from email import encoders
-from reportlab.lib.pagesizes import A4
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import ParagraphStyle
-from reportlab.lib.enums import TA_LEFT, TA_CENTER
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.lib.units import mm
 import re
 
 # --- 常數與工作表設定 ---
 SHEET_ID = "1dOrFjewsdpTGy0JyBJXmuBhr8p_LSpSb6Lp2gC39KK0"
-SCOPES = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
 
 WS_MAP = {
     "set": "巡邏_設定",
@@ -51,6 +44,8 @@ EXPECTED_PTL_COLS = ["無線電代號", "單位", "服勤人員", "巡邏路段"
 
 # --- 2. 輔助函數 ---
 def _get_font():
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
     fname = "kaiu"
     if fname in pdfmetrics.getRegisteredFontNames(): return fname
     font_paths = ["./kaiu.ttf", "kaiu.ttf", "/usr/share/fonts/truetype/custom/kaiu.ttf", "C:/Windows/Fonts/kaiu.ttf"]
@@ -111,6 +106,7 @@ def clean_df_to_list(df):
     return df.astype(str).values.tolist()
 
 def draw_page_number(canvas, doc):
+    from reportlab.lib.units import mm
     page_num = canvas.getPageNumber()
     text = f"- 第 {page_num} 頁 -"
     canvas.setFont(_get_font(), 10)
@@ -148,91 +144,49 @@ def get_merge_styles(df, merge_cols):
             
     return span_styles
 
-# --- Google 授權 ---
-@st.cache_resource
-def get_client():
-    try:
-        info = dict(st.secrets["gcp_service_account"])
-        info["private_key"] = info["private_key"].replace("\\n", "\n")
-        creds = Credentials.from_service_account_info(info, scopes=SCOPES)
-        return gspread.authorize(creds)
-    except Exception as e:
-        st.error(f"Google 授權失敗：{e}")
-        return None
-
-@st.cache_data(ttl=600)
+@tracing.traced("p23.load_data")
 def load_data():
     try:
-        client = get_client()
-        if client is None: return None, None, None, "權限不足或未設定密鑰"
-        sh = client.open_by_key(SHEET_ID)
+        sh = sheets_pool.spreadsheet(SHEET_ID)
+        if sh is None: return None, None, None, "權限不足或未設定密鑰"
 
-        try:
-            df_set = pd.DataFrame(sh.worksheet(WS_MAP["set"]).get_all_records()).fillna("")
-        except:
-            df_set = None
+        # 連同舊專案(二階段)的指揮組一次 batchGet 讀回；不存在的分頁為 None
+        fr = sheets_tables.read_frames(sh, [WS_MAP["set"], WS_MAP["cmd"], "二階段_指揮組", WS_MAP["ptl"]], required=False, ttl=600)
+        df_set = fr[WS_MAP["set"]].fillna("") if fr[WS_MAP["set"]] is not None else None
 
         # --- 自動抓取舊專案(二階段)的指揮組資料 ---
-        try:
-            df_cmd = pd.DataFrame(sh.worksheet(WS_MAP["cmd"]).get_all_records()).fillna("")
-            if df_cmd.empty:
-                df_cmd = pd.DataFrame(sh.worksheet("二階段_指揮組").get_all_records()).fillna("")
-        except WorksheetNotFound:
-            try:
-                df_cmd = pd.DataFrame(sh.worksheet("二階段_指揮組").get_all_records()).fillna("")
-            except Exception:
-                df_cmd = pd.DataFrame()
-        except Exception:
-            df_cmd = pd.DataFrame()
-
-        try:
-            df_ptl = pd.DataFrame(sh.worksheet(WS_MAP["ptl"]).get_all_records()).fillna("")
-        except:
-            df_ptl = pd.DataFrame()
+        df_cmd = fr[WS_MAP["cmd"]]
+        if df_cmd is None or df_cmd.empty:
+            df_cmd = fr["二階段_指揮組"] if fr["二階段_指揮組"] is not None else pd.DataFrame()
+        df_cmd = df_cmd.fillna("")
+
+        df_ptl = fr[WS_MAP["ptl"]].fillna("") if fr[WS_MAP["ptl"]] is not None else pd.DataFrame()
 
         return df_set, df_cmd, df_ptl, None
     except Exception as e:
         return None, None, None, str(e)
 
+@tracing.traced("p23.save_data")
 def save_data(unit, time_str, project, briefing, df_cmd, df_ptl, ptl_desc):
     try:
-        client = get_client()
-        if client is None: return False
-        sh = client.open_by_key(SHEET_ID)
-
-        try:
-            ws_set = sh.worksheet(WS_MAP["set"])
-        except WorksheetNotFound:
-            ws_set = sh.add_worksheet(title=WS_MAP["set"], rows="50", cols="5")
-        ws_set.clear()
-        ws_set.update(range_name='A1', values=[
+        sh = sheets_pool.spreadsheet(SHEET_ID)
+        if sh is None: return False
+
+        tables = {WS_MAP["set"]: [
             ["Key", "Value"],
             ["unit_name", unit],
             ["plan_full_time", time_str],
             ["project_name", project],
             ["briefing_info", briefing],
             ["ptl_desc", ptl_desc]
-        ])
+        ]}
+
+        for key, df in [("cmd", df_cmd), ("ptl", df_ptl)]:
+            clean = df.dropna(how="all").fillna("")
+            tables[WS_MAP[key]] = [clean.columns.tolist()] + clean_df_to_list(clean) if not clean.empty else []
 
-        try:
-            ws_cmd = sh.worksheet(WS_MAP["cmd"])
-        except WorksheetNotFound:
-            ws_cmd = sh.add_worksheet(title=WS_MAP["cmd"], rows="100", cols="20")
-        ws_cmd.clear()
-        clean_cmd = df_cmd.dropna(how="all").fillna("")
-        if not clean_cmd.empty:
-            ws_cmd.update(range_name='A1', values=[clean_cmd.columns.tolist()] + clean_df_to_list(clean_cmd))
-
-        try:
-            ws_ptl = sh.worksheet(WS_MAP["ptl"])
-        except WorksheetNotFound:
-            ws_ptl = sh.add_worksheet(title=WS_MAP["ptl"], rows="100", cols="20")
-        ws_ptl.clear()
-        clean_ptl = df_ptl.dropna(how="all").fillna("")
-        if not clean_ptl.empty:
-            ws_ptl.update(range_name='A1', values=[clean_ptl.columns.tolist()] + clean_df_to_list(clean_ptl))
-
-        st.cache_data.clear()
+        # 三個分頁（含缺少時新建）的清除與寫入合併為一次 batchUpdate
+        sheets_tables.write_tables(sh, tables, sizes={WS_MAP["set"]: (50, 5)})
         return True
     except APIError as e:
         st.error(f"❌ Google API 流量限制或連線錯誤：{e}")
@@ -243,7 +197,14 @@ def save_data(unit, time_str, project, briefing, df_cmd, df_ptl, ptl_desc):
         return False
 
 # --- PDF 相關函數 ---
+@tracing.traced("p23.generate_pdf_from_data")
 def generate_pdf_from_data(unit, project, time_str, briefing, df_cmd, df_ptl, ptl_desc):
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib import colors
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+    from reportlab.lib.styles import ParagraphStyle
+    from reportlab.lib.enums import TA_LEFT
+    from reportlab.lib.units import mm
     font = _get_font()
     buf = io.BytesIO()
     doc = SimpleDocTemplate(buf, pagesize=A4, leftMargin=12*mm, rightMargin=12*mm, topMargin=15*mm, bottomMargin=15*mm)
@@ -316,7 +277,13 @@ def generate_pdf_from_data(unit, project, time_str, briefing, df_cmd, df_ptl, pt
     doc.build(story, onFirstPage=draw_page_number, onLaterPages=draw_page_number)
     return buf.getvalue()
 
+@tracing.traced("p23.generate_attendance_pdf")
 def generate_attendance_pdf(unit, project, time_str, briefing):
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib import colors
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+    from reportlab.lib.styles import ParagraphStyle
+    from reportlab.lib.units import mm
     font = _get_font()
     buf = io.BytesIO()
     doc = SimpleDocTemplate(buf, pagesize=A4, leftMargin=15*mm, rightMargin=15*mm, topMargin=15*mm, bottomMargin=15*mm)
@@ -425,7 +392,7 @@ def auto_assign_radio_code(df):
 # --- 3. 主程式介面 ---
 
 if st.sidebar.button("🔄 強制從雲端更新資料"):
-    st.cache_data.clear()
+    sheets_tables.invalidate(SHEET_ID, [*WS_MAP.values(), "二階段_指揮組"])
     st.rerun()
 
 st.title("🚓 純巡邏勤務規劃系統")
@@ -499,10 +466,8 @@ st.markdown("---")
 if st.button("💾 同步雲端並發送 Email 備份", use_container_width=True):
     with st.spinner("同步中，請稍候…"):
         if save_data(u, p_time, p_name, b_info, res_cmd, res_ptl, phase1_desc):
-            with st.spinner("同步成功，正在寄送郵件…"):
-                ok, mail_err = send_report_email(u, p_name, p_time, b_info, res_cmd, res_ptl, phase1_desc)
-            if ok:
-                st.success(f"✅ 同步與發信成功！已在後台為專案自動補上「{date_code}」代碼。")
-                st.rerun()  # 同步成功後重整前端，確保畫面立即更新最新配發的呼叫代碼
-            else:
-                st.error(f"❌ 發信失敗: {mail_err}")
+            # PDF 產製與寄信改由背景工作執行，重跑或關閉分頁都不會中斷
+            jobs.remember("p23_mail_job", jobs.submit(f"📧 產製 PDF 並寄送 Email 備份（{date_code}）", jobs.expect_ok(send_report_email),
+                                                      u, p_name, p_time, b_info, res_cmd, res_ptl, phase1_desc))
+            st.rerun()  # 同步成功後重整前端，確保畫面立即更新最新配發的呼叫代碼
+jobs.show(jobs.recall("p23_mail_job"))
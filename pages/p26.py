@@ -1,6 +1,4 @@
 import streamlit as st
-import openpyxl
-from openpyxl.styles import Alignment, Font
 import io
 import os
 import smtplib
@@ -11,27 +9,17 @@ from email.mime.base import MIMEBase
 from email import encoders
 import datetime
 
-# ReportLab 相關匯入 (用於生成正式交辦單 PDF)
-from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib import colors
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-
-# 優先載入專案資料夾中的 kaiu.ttf (標楷體)
-font_path = 'kaiu.ttf'
-if os.path.exists(font_path):
-    pdfmetrics.registerFont(TTFont('KaiTi', font_path))
-    FONT_NAME = 'KaiTi'
-else:
-    # 若找不到則嘗試 Linux 系統備援路徑或內建字型
-    fallback_path = '/usr/share/fonts/truetype/droid/DroidSansFallbackFull.ttf'
-    if os.path.exists(fallback_path):
-        pdfmetrics.registerFont(TTFont('KaiTi', fallback_path))
-        FONT_NAME = 'KaiTi'
-    else:
-        FONT_NAME = 'Helvetica'
+# 交辦單 PDF 字型：優先載入專案資料夾中的 kaiu.ttf (標楷體)，
+# 若找不到則嘗試 Linux 系統備援路徑或內建字型；產製 PDF 時才載入 ReportLab
+def _get_font():
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    if 'KaiTi' in pdfmetrics.getRegisteredFontNames(): return 'KaiTi'
+    for path in ('kaiu.ttf', '/usr/share/fonts/truetype/droid/DroidSansFallbackFull.ttf'):
+        if os.path.exists(path):
+            pdfmetrics.registerFont(TTFont('KaiTi', path))
+            return 'KaiTi'
+    return 'Helvetica'
 
 # 匯入系統原本的側邊欄設定
 try:
@@ -84,25 +72,30 @@ def send_file_email(file_bytes, file_name, mime_type="application/vnd.openxmlfor
         return False, str(e)
 
 def generate_all_slips_pdf():
+    from reportlab.lib.pagesizes import A4
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak
+    from reportlab.lib.styles import ParagraphStyle
+    from reportlab.lib import colors
+    font_name = _get_font()
     buffer = io.BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=A4, right_margin=30, left_margin=30, top_margin=15, bottom_margin=15)
     story = []
     
     title_style = ParagraphStyle(
-        'TitleStyle', fontName=FONT_NAME, fontSize=17, leading=22, alignment=1
+        'TitleStyle', fontName=font_name, fontSize=17, leading=22, alignment=1
     )
     
     header_style = ParagraphStyle(
-        'HeaderStyle', fontName=FONT_NAME, fontSize=13, leading=16, alignment=1
+        'HeaderStyle', fontName=font_name, fontSize=13, leading=16, alignment=1
     )
 
     body_style = ParagraphStyle(
-        'BodyStyle', fontName=FONT_NAME, fontSize=13, leading=18, alignment=4
+        'BodyStyle', fontName=font_name, fontSize=13, leading=18, alignment=4
     )
     
     # 建立簽核區專屬樣式 (靠左對齊，避免空白被拉扯)
     sign_style = ParagraphStyle(
-        'SignStyle', fontName=FONT_NAME, fontSize=13, leading=18, alignment=0
+        'SignStyle', fontName=font_name, fontSize=13, leading=18, alignment=0
     )
     
     # 針對 13pt 字體設定懸掛縮排
@@ -193,6 +186,8 @@ def generate_all_slips_pdf():
     return buffer
 
 def generate_excel_file(combined_date_str, total_hours):
+    import openpyxl
+    from openpyxl.styles import Alignment, Font
     file_path = '376431843C_1150087037_ATTACH4.xlsx'
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"找不到範本檔案 {file_path}")
@@ -10,34 +10,21 @@ from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.base import MIMEBase
 from email import encoders
-from openpyxl import Workbook
-from openpyxl.styles import PatternFill, Font, Alignment
-from openpyxl.utils import get_column_letter
-import gspread
-from google.oauth2.service_account import Credentials
+import score_table
 
 # ==========================================
 # 💡 PDF 產出相關套件 (ReportLab)
 # ==========================================
-from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib import colors
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-
-# 設定標楷體字型
-font_path = 'kaiu.ttf'
-if os.path.exists(font_path):
-    pdfmetrics.registerFont(TTFont('KaiTi', font_path))
-    FONT_NAME = 'KaiTi'
-else:
-    fallback_path = '/usr/share/fonts/truetype/droid/DroidSansFallbackFull.ttf'
-    if os.path.exists(fallback_path):
-        pdfmetrics.registerFont(TTFont('KaiTi', fallback_path))
-        FONT_NAME = 'KaiTi'
-    else:
-        FONT_NAME = 'Helvetica'
+# 設定標楷體字型（產製 PDF 時才載入 ReportLab 並註冊）
+def _get_font():
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    if 'KaiTi' in pdfmetrics.getRegisteredFontNames(): return 'KaiTi'
+    for path in ('kaiu.ttf', '/usr/share/fonts/truetype/droid/DroidSansFallbackFull.ttf'):
+        if os.path.exists(path):
+            pdfmetrics.registerFont(TTFont('KaiTi', path))
+            return 'KaiTi'
+    return 'Helvetica'
 
 # ==========================================
 # 💡 匯入系統原本的側邊欄設定
@@ -53,19 +40,14 @@ except ImportError:
 # ==========================================
 TARGET_GSHEET_URL = "https://docs.google.com/spreadsheets/d/1HaFu5PZkFDUg7WZGV9khyQ0itdGXhXUakP4_BClFTUg/edit"
 
+# 只有寫回配分表時才需要 gspread，開啟頁面不必載入；連線與試算表 handle 由 sheets_pool 全程序共用
 def get_gspread_client():
-    scopes = [
-        "https://www.googleapis.com/auth/spreadsheets",
-        "https://www.googleapis.com/auth/drive"
-    ]
-    if "gcp_service_account" in st.secrets:
-        creds_dict = dict(st.secrets["gcp_service_account"])
-    elif "connections" in st.secrets and "gsheets" in st.secrets["connections"]:
-        creds_dict = dict(st.secrets["connections"]["gsheets"])
-    else:
-        return None
-    creds = Credentials.from_service_account_info(creds_dict, scopes=scopes)
-    return gspread.authorize(creds)
+    import sheets_pool
+    return sheets_pool.client()
+
+def open_gspread_sheet(sheet_id):
+    import sheets_pool
+    return sheets_pool.spreadsheet(sheet_id)
 
 # ==========================================
 # 0. 輔助函式：發送 Email
@@ -152,14 +134,19 @@ def autofit_columns(ws, min_row=1, max_width=60):
 # 💡 核心 PDF 產出邏輯
 # ==========================================
 def generate_traffic_enforcement_pdf(target_roc_year, period_text, months_text):
+    from reportlab.lib.pagesizes import A4
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak
+    from reportlab.lib.styles import ParagraphStyle
+    from reportlab.lib import colors
+    font_name = _get_font()
     buffer = io.BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=A4, right_margin=30, left_margin=30, top_margin=15, bottom_margin=15)
     story = []
     
-    title_style = ParagraphStyle('TitleStyle', fontName=FONT_NAME, fontSize=17, leading=22, alignment=1)
-    header_style = ParagraphStyle('HeaderStyle', fontName=FONT_NAME, fontSize=13, leading=16, alignment=1)
-    body_style = ParagraphStyle('BodyStyle', fontName=FONT_NAME, fontSize=13, leading=18, alignment=4)
-    sign_style = ParagraphStyle('SignStyle', fontName=FONT_NAME, fontSize=13, leading=18, alignment=0)
+    title_style = ParagraphStyle('TitleStyle', fontName=font_name, fontSize=17, leading=22, alignment=1)
+    header_style = ParagraphStyle('HeaderStyle', fontName=font_name, fontSize=13, leading=16, alignment=1)
+    body_style = ParagraphStyle('BodyStyle', fontName=font_name, fontSize=13, leading=18, alignment=4)
+    sign_style = ParagraphStyle('SignStyle', fontName=font_name, fontSize=13, leading=18, alignment=0)
     
     char_w = 13
     body_l1 = ParagraphStyle('BodyL1', parent=body_style, leftIndent=char_w*2, firstLineIndent=-char_w*2)
@@ -234,6 +221,175 @@ def generate_traffic_enforcement_pdf(target_roc_year, period_text, months_text):
     buffer.seek(0)
     return buffer
 
+# ==========================================
+# 原始舉發資料：逐分頁讀取員警報表並結算
+# ==========================================
+def extract_officer_name(df_head):
+    for r_idx, row in df_head.iterrows():
+        for c_idx, val in enumerate(row.values):
+            val_str = str(val).strip()
+            if "舉發員警" in val_str:
+                clean = re.sub(r'舉發員警[:：]?', '', val_str).strip()
+                if clean: return clean
+                if c_idx + 1 < len(row.values):
+                    next_val = str(row.values[c_idx + 1]).strip()
+                    if next_val and next_val.lower() != 'nan': return next_val
+    return ""
+
+def extract_unit_name(df_head):
+    for r_idx, row in df_head.iterrows():
+        for c_idx, val in enumerate(row.values):
+            val_str = str(val).strip()
+            if "舉發單位" in val_str:
+                clean = re.sub(r'舉發單位[:：]?', '', val_str).strip()
+                if clean: return clean
+                if c_idx + 1 < len(row.values):
+                    next_val = str(row.values[c_idx + 1]).strip()
+                    if next_val and next_val.lower() != 'nan': return next_val
+    return ""
+
+def collect_officer_sheets(data_files, db_map):
+    """各單位原始舉發報表 -> {單位: {processed_sheets, quota, ...}}，各分頁已填入配分、小計與總分。"""
+    for f in data_files:
+        f.seek(0)
+
+    unit_collected_data = {}
+    settle_jobs = []
+
+    for f in data_files:
+        try:
+            xls = pd.ExcelFile(f)
+            for sheet_name in xls.sheet_names:
+                # 不整表轉 object；要寫入配分的欄由 score_table.settle 轉型
+                raw_df = pd.read_excel(xls, sheet_name=sheet_name, header=None)
+                header_idx = -1
+                officer_name = extract_officer_name(raw_df.head(20))
+                if not officer_name: officer_name = sheet_name.strip()
+
+                detected_unit = extract_unit_name(raw_df.head(20))
+                if not detected_unit: detected_unit = re.sub(r'\.[a-zA-Z0-9]+$', '', f.name) 
+
+                for idx, row in raw_df.iterrows():
+                    if "違規條款" in row.astype(str).str.replace(" ", "").values:
+                        header_idx = idx
+                        break
+                if header_idx == -1: continue
+
+                print_date_val = ""
+                issue_date_val = ""
+                unit_val = ""
+                officer_val = ""
+
+                for r_search in range(header_idx):
+                    for c_search in range(len(raw_df.columns)):
+                        val = raw_df.iat[r_search, c_search]
+                        if pd.notna(val) and str(val).strip() != "":
+                            val_str = str(val).strip()
+                            val_no_space = val_str.replace(" ", "")
+                            if "列印日期" in val_no_space: print_date_val = val_str
+                            elif "開單日期" in val_no_space: issue_date_val = val_str
+                            elif "舉發單位" in val_no_space: unit_val = val_str
+                            elif "舉發員警" in val_no_space: officer_val = val_str
+
+                raw_df = raw_df.iloc[header_idx:].reset_index(drop=True)
+                header_idx = 0 
+
+                header_row_temp = [str(x).strip().replace(" ", "") for x in raw_df.iloc[header_idx]]
+                cols_to_keep = [c for c, val in enumerate(header_row_temp) if val not in ["nan", "None", ""]]
+
+                raw_df = raw_df.iloc[:, cols_to_keep]
+                raw_df.columns = range(raw_df.shape[1])
+
+                header_row = [str(x).strip().replace(" ", "") for x in raw_df.iloc[header_idx]]
+                col_rule = header_row.index("違規條款") if "違規條款" in header_row else -1
+                col_s_cnt = header_row.index("攔停數") if "攔停數" in header_row else -1
+                col_d_cnt = header_row.index("逕舉數") if "逕舉數" in header_row else -1
+
+                col_s_score = header_row.index("攔舉配分") if "攔舉配分" in header_row else -1
+                col_d_score = header_row.index("逕舉配分") if "逕舉配分" in header_row else -1
+                col_subtotal = header_row.index("小計") if "小計" in header_row else -1
+
+                if col_rule == -1 or col_s_cnt == -1 or col_d_cnt == -1: continue
+
+                if col_s_score == -1:
+                    idx_s_score = col_s_cnt + 1
+                    raw_df.insert(idx_s_score, f'new_{idx_s_score}', None)
+                    raw_df.iat[header_idx, idx_s_score] = "攔舉配分"
+                    col_s_score = idx_s_score
+
+                    if col_d_cnt >= idx_s_score: col_d_cnt += 1
+                    if col_subtotal >= idx_s_score: col_subtotal += 1
+
+                    idx_d_score = col_d_cnt + 1
+                    raw_df.insert(idx_d_score, f'new_{idx_d_score}', None)
+                    raw_df.iat[header_idx, idx_d_score] = "逕舉配分"
+                    col_d_score = idx_d_score
+
+                    if col_subtotal >= idx_d_score: col_subtotal += 1
+
+                    idx_subtotal = idx_d_score + 1
+                    raw_df.insert(idx_subtotal, f'new_{idx_subtotal}', None)
+                    raw_df.iat[header_idx, idx_subtotal] = "小計"
+                    col_subtotal = idx_subtotal
+                    raw_df.columns = range(raw_df.shape[1])
+
+                sheet_data = {
+                    "officer": officer_name.replace(" ", ""),
+                    "df": raw_df,
+                    "yellow_cells": [],
+                    "grand_total": 0,
+                    "col_d_score": col_d_score,
+                    "print_date": print_date_val,
+                    "issue_date": issue_date_val,
+                    "unit_val": unit_val,
+                    "officer_val": officer_val
+                }
+
+                if detected_unit not in unit_collected_data:
+                    is_800 = "交通分隊" in detected_unit
+                    quota_val = 800 if is_800 else 400
+                    unit_collected_data[detected_unit] = {
+                        "processed_sheets": [],
+                        "quota": quota_val,
+                        "threshold_7x": quota_val * 7,
+                        "unit_type_label": f"{detected_unit} (基準 {quota_val} 分)"
+                    }
+                unit_collected_data[detected_unit]["processed_sheets"].append(sheet_data)
+                settle_jobs.append((f.name, detected_unit, sheet_data,
+                                    (raw_df, header_idx, col_rule, col_s_cnt, col_d_cnt,
+                                     col_s_score, col_d_score, col_subtotal)))
+
+        except Exception as e:
+            st.error(f"❌ 處理檔案 {f.name} 時發生錯誤：{e}")
+            continue
+
+    # 所有員警分頁合併後一次整欄計算配分、小計與總分
+    rules = score_table.rule_frame(db_map)
+    try:
+        settled = score_table.settle([job for *_, job in settle_jobs], rules)
+    except Exception:
+        # 整批失敗時改為逐檔結算，找出有問題的檔案回報並略過（其餘檔案照常結算）
+        by_file = {}
+        for item in settle_jobs:
+            by_file.setdefault(item[0], []).append(item)
+        settle_jobs, settled = [], []
+        for file_name, items in by_file.items():
+            try:
+                settled += score_table.settle([job for *_, job in items], rules)
+                settle_jobs += items
+            except Exception as e:
+                st.error(f"❌ 處理檔案 {file_name} 時發生錯誤：{e}")
+                for _, unit, sheet_data, _ in items:
+                    sheets = unit_collected_data[unit]["processed_sheets"]
+                    sheets[:] = [s for s in sheets if s is not sheet_data]
+        for unit in [u for u, info in unit_collected_data.items() if not info["processed_sheets"]]:
+            del unit_collected_data[unit]
+    for (_, _, sheet_data, _), (grand_total, yellow_cells) in zip(settle_jobs, settled):
+        sheet_data["grand_total"] = grand_total
+        sheet_data["yellow_cells"] = yellow_cells
+
+    return unit_collected_data
+
 # ==========================================
 # 主程式執行區塊
 # ==========================================
@@ -299,63 +455,22 @@ def main():
     # ==========================================
     with tab_excel:
         db_map = {}
-        df_db = None
         sheet_id = TARGET_GSHEET_URL.split("/d/")[1].split("/")[0]
-        xlsx_export_url = f"https://docs.google.com/spreadsheets/d/{sheet_id}/export?format=xlsx"
 
+        # 配分表由本機快取提供，雲端版本號有變動時才重讀（不再每次重跑都匯出整本活頁簿）
         try:
-            df_db = pd.read_excel(xlsx_export_url, sheet_name="配分表")
+            db_map = score_table.load(sheet_id)
             connection_status = True
+        except score_table.FormatError as e:
+            st.error(f"❌ {e}")
+            st.stop()
         except Exception as e:
             connection_status = False
             error_msg = e
 
-        incomplete_rules = [] 
-        if connection_status:
-            if '違規條款' not in df_db.columns:
-                st.error("❌ 雲端配分表缺少『違規條款』欄位！")
-                st.stop()
-            if '違規事實' not in df_db.columns: df_db['違規事實'] = ""
-            if '類別' not in df_db.columns: df_db['類別'] = ""
-            if '取締項目' not in df_db.columns: df_db['取締項目'] = ""
-
-            for row_idx, row in df_db.iterrows():
-                rule = str(row.get('違規條款', '')).strip()
-                if rule:
-                    s = pd.to_numeric(row.get('攔舉配分', 0), errors='coerce')
-                    d = pd.to_numeric(row.get('逕舉配分', 0), errors='coerce')
-                    fact = str(row.get('違規事實', '')).strip()
-                    cat = str(row.get('類別', '')).strip()
-                    item = str(row.get('取締項目', '')).strip()
-                    
-                    if fact.lower() == 'nan': fact = ""
-                    if cat.lower() == 'nan': cat = ""
-                    if item.lower() == 'nan': item = ""
-                        
-                    db_map[rule] = {
-                        'stop': 0 if pd.isna(s) else int(s),
-                        'dir': 0 if pd.isna(d) else int(d),
-                        'fact': fact,
-                        'category': cat,
-                        'item': item,
-                        'gsheet_row': row_idx + 2 
-                    }
-                    
-                    if not cat and not item:
-                        incomplete_rules.append(rule)
-
-        def find_closest_reference(new_rule_str, existing_db):
-            best_match = None
-            max_prefix_len = 0
-            for old_rule, data in existing_db.items():
-                match_len = 0
-                for c1, c2 in zip(new_rule_str, old_rule):
-                    if c1 == c2: match_len += 1
-                    else: break
-                if match_len > max_prefix_len and (data['category'] or data['item']):
-                    max_prefix_len = match_len
-                    best_match = data
-            return best_match
+        incomplete_rules = [rule for rule, v in db_map.items() if not v['category'] and not v['item']]
+
+        rule_index = score_table.RuleIndex(db_map)
 
         with st.expander("⚙️ 系統運行狀態與結算基準 (點擊展開)", expanded=bool(incomplete_rules)):
             if connection_status:
@@ -375,10 +490,10 @@ def main():
                             st.error("❌ 找不到 GCP 憑證，無法寫入雲端。")
                         else:
                             try:
-                                worksheet = client.open_by_key(sheet_id).worksheet("配分表")
+                                worksheet = open_gspread_sheet(sheet_id).worksheet("配分表")
                                 updates = []
                                 for rule in incomplete_rules:
-                                    ref_data = find_closest_reference(rule, db_map)
+                                    ref_data = rule_index.closest(rule, db_map[rule]['fact'])
                                     if ref_data:
                                         target_row = db_map[rule]['gsheet_row']
                                         new_cat = ref_data['category']
@@ -387,8 +502,10 @@ def main():
                                         updates.append({'range': f'F{target_row}', 'values': [[new_item]]})
                                         db_map[rule]['category'] = new_cat
                                         db_map[rule]['item'] = new_item
+                                        rule_index.update(rule)
                                 if updates:
                                     worksheet.batch_update(updates) 
+                                    score_table.store(sheet_id, db_map)
                                     st.success("✅ 修復完成！已成功將參照類別補上。")
                                     st.rerun() 
                                 else:
@@ -466,7 +583,7 @@ def main():
 
             for rule_key, data in missing_rules.items():
                 if not data["category"] and not data["item"]:
-                    ref_data = find_closest_reference(rule_key, db_map)
+                    ref_data = rule_index.closest(rule_key, data["fact"])
                     if ref_data:
                         data["category"] = ref_data["category"]
                         data["item"] = ref_data["item"]
@@ -507,7 +624,7 @@ def main():
                             st.error("❌ 找不到對應的 GCP 憑證設定。")
                             st.stop()
                         try:
-                            worksheet = client.open_by_key(sheet_id).worksheet("配分表")
+                            worksheet = open_gspread_sheet(sheet_id).worksheet("配分表")
                             new_rows_data = []
                             for _, row in edited_missing.iterrows():
                                 rule_val = str(row["違規條款"])
@@ -518,182 +635,28 @@ def main():
                                 item_val = str(row["取締項目"]) if pd.notna(row["取締項目"]) else ""
                                 
                                 new_rows_data.append([rule_val, s_val, d_val, fact_val, cat_val, item_val])
-                                db_map[rule_val] = {'stop': s_val, 'dir': d_val}
+                                db_map[rule_val] = {'stop': s_val, 'dir': d_val, 'fact': fact_val,
+                                                    'category': cat_val, 'item': item_val}
                                 
                             if new_rows_data:
-                                worksheet.append_rows(new_rows_data)
+                                resp = worksheet.append_rows(new_rows_data)
+                                # 依回傳的寫入範圍補上新條款所在列號，直接更新本機快取
+                                updated = (resp or {}).get("updates", {}).get("updatedRange", "")
+                                if "!" in updated:
+                                    from gspread.utils import a1_to_rowcol
+                                    first_row = a1_to_rowcol(updated.split("!")[1].split(":")[0])[0]
+                                    for i, r in enumerate(new_rows_data):
+                                        db_map[r[0]]['gsheet_row'] = first_row + i
+                                    score_table.store(sheet_id, db_map)
+                                else:
+                                    score_table.invalidate(sheet_id)
                             st.success("✅ 新條款與對應資訊已「整批」成功寫回 Google 試算表最下方！")
                         except Exception as write_err:
                             st.error(f"❌ 寫入雲端失敗，詳細錯誤：{write_err}")
                             st.stop()
 
             with st.spinner("🔄 正在讀取並結算各單位資料，請稍候..."):
-                for f in data_files:
-                    f.seek(0)
-                    
-                def extract_officer_name(df_head):
-                    for r_idx, row in df_head.iterrows():
-                        for c_idx, val in enumerate(row.values):
-                            val_str = str(val).strip()
-                            if "舉發員警" in val_str:
-                                clean = re.sub(r'舉發員警[:：]?', '', val_str).strip()
-                                if clean: return clean
-                                if c_idx + 1 < len(row.values):
-                                    next_val = str(row.values[c_idx + 1]).strip()
-                                    if next_val and next_val.lower() != 'nan': return next_val
-                    return ""
-
-                def extract_unit_name(df_head):
-                    for r_idx, row in df_head.iterrows():
-                        for c_idx, val in enumerate(row.values):
-                            val_str = str(val).strip()
-                            if "舉發單位" in val_str:
-                                clean = re.sub(r'舉發單位[:：]?', '', val_str).strip()
-                                if clean: return clean
-                                if c_idx + 1 < len(row.values):
-                                    next_val = str(row.values[c_idx + 1]).strip()
-                                    if next_val and next_val.lower() != 'nan': return next_val
-                    return ""
-
-                unit_collected_data = {}
-
-                for f in data_files:
-                    try:
-                        xls = pd.ExcelFile(f)
-                        for sheet_name in xls.sheet_names:
-                            raw_df = pd.read_excel(xls, sheet_name=sheet_name, header=None).astype('object')
-                            header_idx = -1
-                            officer_name = extract_officer_name(raw_df.head(20))
-                            if not officer_name: officer_name = sheet_name.strip()
-                                
-                            detected_unit = extract_unit_name(raw_df.head(20))
-                            if not detected_unit: detected_unit = re.sub(r'\.[a-zA-Z0-9]+$', '', f.name) 
-                            
-                            for idx, row in raw_df.iterrows():
-                                if "違規條款" in row.astype(str).str.replace(" ", "").values:
-                                    header_idx = idx
-                                    break
-                            if header_idx == -1: continue
-                            
-                            print_date_val = ""
-                            issue_date_val = ""
-                            unit_val = ""
-                            officer_val = ""
-                            
-                            for r_search in range(header_idx):
-                                for c_search in range(len(raw_df.columns)):
-                                    val = raw_df.iat[r_search, c_search]
-                                    if pd.notna(val) and str(val).strip() != "":
-                                        val_str = str(val).strip()
-                                        val_no_space = val_str.replace(" ", "")
-                                        if "列印日期" in val_no_space: print_date_val = val_str
-                                        elif "開單日期" in val_no_space: issue_date_val = val_str
-                                        elif "舉發單位" in val_no_space: unit_val = val_str
-                                        elif "舉發員警" in val_no_space: officer_val = val_str
-
-                            raw_df = raw_df.iloc[header_idx:].reset_index(drop=True)
-                            header_idx = 0 
-                            
-                            header_row_temp = [str(x).strip().replace(" ", "") for x in raw_df.iloc[header_idx]]
-                            cols_to_keep = [c for c, val in enumerate(header_row_temp) if val not in ["nan", "None", ""]]
-                            
-                            raw_df = raw_df.iloc[:, cols_to_keep]
-                            raw_df.columns = range(raw_df.shape[1])
-
-                            header_row = [str(x).strip().replace(" ", "") for x in raw_df.iloc[header_idx]]
-                            col_rule = header_row.index("違規條款") if "違規條款" in header_row else -1
-                            col_s_cnt = header_row.index("攔停數") if "攔停數" in header_row else -1
-                            col_d_cnt = header_row.index("逕舉數") if "逕舉數" in header_row else -1
-                            
-                            col_s_score = header_row.index("攔舉配分") if "攔舉配分" in header_row else -1
-                            col_d_score = header_row.index("逕舉配分") if "逕舉配分" in header_row else -1
-                            col_subtotal = header_row.index("小計") if "小計" in header_row else -1
-                            
-                            if col_rule == -1 or col_s_cnt == -1 or col_d_cnt == -1: continue
-
-                            if col_s_score == -1:
-                                idx_s_score = col_s_cnt + 1
-                                raw_df.insert(idx_s_score, f'new_{idx_s_score}', None)
-                                raw_df.iat[header_idx, idx_s_score] = "攔舉配分"
-                                col_s_score = idx_s_score
-                                
-                                if col_d_cnt >= idx_s_score: col_d_cnt += 1
-                                if col_subtotal >= idx_s_score: col_subtotal += 1
-                                
-                                idx_d_score = col_d_cnt + 1
-                                raw_df.insert(idx_d_score, f'new_{idx_d_score}', None)
-                                raw_df.iat[header_idx, idx_d_score] = "逕舉配分"
-                                col_d_score = idx_d_score
-                                
-                                if col_subtotal >= idx_d_score: col_subtotal += 1
-                                
-                                idx_subtotal = idx_d_score + 1
-                                raw_df.insert(idx_subtotal, f'new_{idx_subtotal}', None)
-                                raw_df.iat[header_idx, idx_subtotal] = "小計"
-                                col_subtotal = idx_subtotal
-                                raw_df.columns = range(raw_df.shape[1])
-
-                            grand_total = 0
-                            yellow_cells = []
-                            
-                            for r in range(header_idx + 1, len(raw_df)):
-                                rule = str(raw_df.iloc[r, col_rule]).strip()
-                                if not rule or "合計" in rule or "製表" in rule or "舉發單張數" in rule or rule.lower() == 'nan':
-                                    continue
-                                    
-                                def safe_int(val):
-                                    try: return int(float(str(val).replace(",", "")))
-                                    except: return 0
-                                        
-                                stop_cnt = safe_int(raw_df.iloc[r, col_s_cnt])
-                                dir_cnt = safe_int(raw_df.iloc[r, col_d_cnt])
-                                
-                                if rule in db_map:
-                                    s_score = db_map[rule]['stop']
-                                    d_score = db_map[rule]['dir']
-                                else:
-                                    s_score = 0
-                                    d_score = 0
-                                    
-                                raw_df.iat[r, col_s_score] = s_score if s_score != 0 else 0
-                                raw_df.iat[r, col_d_score] = d_score if d_score != 0 else 0
-                                
-                                row_subtotal = (s_score * stop_cnt) + (d_score * dir_cnt)
-                                if col_subtotal != -1:
-                                    raw_df.iat[r, col_subtotal] = row_subtotal
-                                
-                                if s_score == 0 and d_score == 0:
-                                    yellow_cells.append((r, col_s_score))
-                                    yellow_cells.append((r, col_d_score))
-                                    
-                                grand_total += row_subtotal
-                                
-                            sheet_data = {
-                                "officer": officer_name.replace(" ", ""),
-                                "df": raw_df,
-                                "yellow_cells": yellow_cells,
-                                "grand_total": grand_total,
-                                "col_d_score": col_d_score,
-                                "print_date": print_date_val,
-                                "issue_date": issue_date_val,
-                                "unit_val": unit_val,
-                                "officer_val": officer_val
-                            }
-                            
-                            if detected_unit not in unit_collected_data:
-                                is_800 = "交通分隊" in detected_unit
-                                quota_val = 800 if is_800 else 400
-                                unit_collected_data[detected_unit] = {
-                                    "processed_sheets": [],
-                                    "quota": quota_val,
-                                    "threshold_7x": quota_val * 7,
-                                    "unit_type_label": f"{detected_unit} (基準 {quota_val} 分)"
-                                }
-                            unit_collected_data[detected_unit]["processed_sheets"].append(sheet_data)
-                            
-                    except Exception as e:
-                        st.error(f"❌ 處理檔案 {f.name} 時發生錯誤：{e}")
-                        continue
+                unit_collected_data = collect_officer_sheets(data_files, db_map)
 
                 all_summaries = {}
                 all_output_buffers = {}
@@ -728,6 +691,8 @@ def main():
 
                         all_summaries[unit_name] = df_summary
 
+                        from openpyxl import Workbook
+                        from openpyxl.styles import PatternFill, Font, Alignment
                         output = io.BytesIO()
                         wb = Workbook()
                         
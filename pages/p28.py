@@ -80,6 +80,66 @@ def calculate_tiered_rewards(row):
     
     return pd.Series([jiajiang, dagong, rem_jiajiang])
 
+def compute_rewards(df):
+    """list2 明細 -> (員警獎勵核算表, Group A 明細, Group B 明細)。"""
+    # 確保欄位為字串型態，避免比對出錯及 NaN 問題
+    df['條款1'] = df['條款1'].astype(str).str.strip()
+    df['違規事實1'] = df['違規事實1'].astype(str).fillna('')
+    df['車種'] = df['車種'].astype(str).fillna('')
+    df['舉發員警'] = df['舉發員警'].astype(str).str.strip()
+
+    # ==========================================
+    # 條件篩選邏輯區
+    # ==========================================
+    # Group A (2件 = 1嘉獎): 第13-1, 18-1, 43-3 條
+    mask_A = df['條款1'].str.startswith(('131', '181', '433'))
+
+    # Group B (4件 = 1嘉獎): 
+    # 1-1. 第16條第1項第1款 (16101開頭)：限定機車(包含機車或重型)
+    mask_16_1_1 = df['條款1'].str.startswith('16101') & df['車種'].str.contains('機車|重型|輕型', na=False)
+
+    # 1-2. 第16條第1項第2款 (16102開頭)：限定排氣管或消音器
+    mask_16_1_2 = df['條款1'].str.startswith('16102') & df['違規事實1'].str.contains('排氣管|消音器', na=False)
+
+    # 2. 第43-1-1, 43-1-3, 43-1-4, 43-1-5
+    mask_43_1 = df['條款1'].str.startswith(('43101', '43103', '43104', '43105'))
+
+    mask_B = mask_16_1_1 | mask_16_1_2 | mask_43_1
+
+    # 切分出符合條件的 DataFrame
+    df_A = df[mask_A]
+    df_B = df[mask_B]
+
+    # ==========================================
+    # 獎勵核算區 (套用加倍懲罰算法)
+    # ==========================================
+    # 定義長標題欄位名稱
+    col_name_A = '舉發違反道交條例第13條第1款、第18條第1項及第43條第3項案件'
+    col_name_B = '舉發違反道交條例第16條第1項第1、2款（限定排氣管及消音器設備）、第43條第1項第1、3、4、5款案件'
+
+    counts_A = df_A['舉發員警'].value_counts().rename(col_name_A)
+    counts_B = df_B['舉發員警'].value_counts().rename(col_name_B)
+
+    reward_df = pd.concat([counts_A, counts_B], axis=1).fillna(0).astype(int)
+
+    if 'nan' in reward_df.index:
+        reward_df = reward_df.drop('nan')
+
+    # 應用動態門檻演算法
+    reward_df[['嘉獎次數', '大功數 (倍增指標)', '階梯嘉獎數']] = reward_df.apply(calculate_tiered_rewards, axis=1)
+
+    # 排序與重命名
+    reward_df = reward_df.sort_values(by=["嘉獎次數", col_name_A], ascending=[False, False]).reset_index()
+    if '舉發員警' in reward_df.columns:
+        reward_df = reward_df.rename(columns={"舉發員警": "舉發員警名稱"})
+    elif 'index' in reward_df.columns:
+        reward_df = reward_df.rename(columns={"index": "舉發員警名稱"})
+
+    reward_df = reward_df[(reward_df[col_name_A] > 0) | (reward_df[col_name_B] > 0)]
+    reward_df = reward_df[['舉發員警名稱', col_name_A, col_name_B, '嘉獎次數', '大功數 (倍增指標)', '階梯嘉獎數']]
+
+    return reward_df, df_A, df_B
+
 # ==========================================
 # 主程式執行區塊
 # ==========================================
@@ -111,61 +171,7 @@ def main():
                 # 讀取資料
                 df = pd.read_excel(uploaded_file, sheet_name="list2")
                 
-                # 確保欄位為字串型態，避免比對出錯及 NaN 問題
-                df['條款1'] = df['條款1'].astype(str).str.strip()
-                df['違規事實1'] = df['違規事實1'].astype(str).fillna('')
-                df['車種'] = df['車種'].astype(str).fillna('')
-                df['舉發員警'] = df['舉發員警'].astype(str).str.strip()
-                
-                # ==========================================
-                # 條件篩選邏輯區
-                # ==========================================
-                # Group A (2件 = 1嘉獎): 第13-1, 18-1, 43-3 條
-                mask_A = df['條款1'].str.startswith(('131', '181', '433'))
-                
-                # Group B (4件 = 1嘉獎): 
-                # 1-1. 第16條第1項第1款 (16101開頭)：限定機車(包含機車或重型)
-                mask_16_1_1 = df['條款1'].str.startswith('16101') & df['車種'].str.contains('機車|重型|輕型', na=False)
-                
-                # 1-2. 第16條第1項第2款 (16102開頭)：限定排氣管或消音器
-                mask_16_1_2 = df['條款1'].str.startswith('16102') & df['違規事實1'].str.contains('排氣管|消音器', na=False)
-                
-                # 2. 第43-1-1, 43-1-3, 43-1-4, 43-1-5
-                mask_43_1 = df['條款1'].str.startswith(('43101', '43103', '43104', '43105'))
-                
-                mask_B = mask_16_1_1 | mask_16_1_2 | mask_43_1
-                
-                # 切分出符合條件的 DataFrame
-                df_A = df[mask_A]
-                df_B = df[mask_B]
-                
-                # ==========================================
-                # 獎勵核算區 (套用加倍懲罰算法)
-                # ==========================================
-                # 定義長標題欄位名稱
-                col_name_A = '舉發違反道交條例第13條第1款、第18條第1項及第43條第3項案件'
-                col_name_B = '舉發違反道交條例第16條第1項第1、2款（限定排氣管及消音器設備）、第43條第1項第1、3、4、5款案件'
-                
-                counts_A = df_A['舉發員警'].value_counts().rename(col_name_A)
-                counts_B = df_B['舉發員警'].value_counts().rename(col_name_B)
-                
-                reward_df = pd.concat([counts_A, counts_B], axis=1).fillna(0).astype(int)
-                
-                if 'nan' in reward_df.index:
-                    reward_df = reward_df.drop('nan')
-                    
-                # 應用動態門檻演算法
-                reward_df[['嘉獎次數', '大功數 (倍增指標)', '階梯嘉獎數']] = reward_df.apply(calculate_tiered_rewards, axis=1)
-                
-                # 排序與重命名
-                reward_df = reward_df.sort_values(by=["嘉獎次數", col_name_A], ascending=[False, False]).reset_index()
-                if '舉發員警' in reward_df.columns:
-                    reward_df = reward_df.rename(columns={"舉發員警": "舉發員警名稱"})
-                elif 'index' in reward_df.columns:
-                    reward_df = reward_df.rename(columns={"index": "舉發員警名稱"})
-                
-                reward_df = reward_df[(reward_df[col_name_A] > 0) | (reward_df[col_name_B] > 0)]
-                reward_df = reward_df[['舉發員警名稱', col_name_A, col_name_B, '嘉獎次數', '大功數 (倍增指標)', '階梯嘉獎數']]
+                reward_df, df_A, df_B = compute_rewards(df)
 
             # ==========================================
             # 畫面呈現區
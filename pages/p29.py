@@ -84,6 +84,19 @@ def categorize_case(row):
             
     return '不採計'
 
+# 案件明細 -> 逐案判斷適用類別
+def load_cases(df_raw):
+    # 定位欄位名稱列
+    header_idx = df_raw[df_raw.iloc[:, 1] == '違規法條1'].index[0]
+
+    df = df_raw.iloc[header_idx+1:].copy()
+    df.columns = ['單號', '違規法條1', '違規事實1', '入案日', '舉發員警1', '違規人年齡']
+    df = df.dropna(subset=['單號', '舉發員警1'])
+
+    df['age_num'] = df['違規人年齡'].apply(parse_age)
+    df['案件類別'] = df.apply(categorize_case, axis=1)
+    return df
+
 # ==========================================
 # 主程式執行區塊
 # ==========================================
@@ -113,15 +126,7 @@ def main():
                     
                 df_raw = pd.read_excel(xls, sheet_name='案件明細', header=None)
                 
-                # 定位欄位名稱列
-                header_idx = df_raw[df_raw.iloc[:, 1] == '違規法條1'].index[0]
-                
-                df = df_raw.iloc[header_idx+1:].copy()
-                df.columns = ['單號', '違規法條1', '違規事實1', '入案日', '舉發員警1', '違規人年齡']
-                df = df.dropna(subset=['單號', '舉發員警1'])
-                
-                df['age_num'] = df['違規人年齡'].apply(parse_age)
-                df['案件類別'] = df.apply(categorize_case, axis=1)
+                df = load_cases(df_raw)
                 
                 df_valid = df[df['案件類別'] != '不採計'].copy()
                 
@@ -0,0 +1,95 @@
+import streamlit as st
+import pandas as pd
+import tracemalloc
+from menu import show_sidebar
+import tracing
+
+# --- 1. 頁面配置 ---
+st.set_page_config(page_title="系統效能監控", page_icon="⏱️", layout="wide")
+show_sidebar()
+
+st.title("⏱️ 系統效能監控")
+st.caption(f"目前版本：{tracing.VERSION}　紀錄檔：{tracing.LOG_PATH}")
+
+# --- 2. 設定 ---
+mem_on = st.toggle("🧠 記錄 Python 記憶體高峰（tracemalloc，會拖慢執行，分析完請關閉）", value=tracemalloc.is_tracing())
+tracing.set_memory_tracing(mem_on)
+
+# --- 3. 頁面冷啟動匯入耗時 ---
+with st.expander("🚀 各頁面冷啟動匯入耗時"):
+    st.caption("每個頁面在獨立子程序中量測最上層 import 的耗時（streamlit、pandas 視為已載入），全部頁面約需 30 秒。")
+    if st.button("開始量測"):
+        from bench import import_report
+        with st.spinner("量測中..."):
+            res = import_report.report()
+        st.dataframe(pd.DataFrame([
+            {"頁面": name, "匯入秒": r["total_s"],
+             "最耗時的匯入": "；".join(f'{i["stmt"].splitlines()[0]} {i["s"]:.3f}s' for i in r["imports"][:import_report.TOP_N]),
+             "錯誤": r.get("error", "") or "、".join(i["stmt"] for i in r["imports"] if i["error"])}
+            for name, r in res.items()
+        ]).sort_values("匯入秒", ascending=False), hide_index=True, use_container_width=True)
+
+log = pd.DataFrame(tracing.read_log())
+if log.empty:
+    st.info("💡 尚無紀錄。執行一次批次處理或勤務規劃存檔後即會產生。")
+    st.stop()
+
+for c in tracing.COUNTERS + ("wall_s", "rss_peak_mb", "py_peak_mb"):
+    if c not in log.columns: log[c] = 0
+log["api_calls"] = log["api_read"] + log["api_write"]
+
+versions = list(dict.fromkeys(log["version"].iloc[::-1]))
+c1, c2 = st.columns([2, 3])
+sel_versions = c1.multiselect("版本", versions, default=versions[:2])
+prefix = c2.text_input("分段名稱篩選（前綴，例：hub.、p10.、parse.）", "")
+view = log[log["version"].isin(sel_versions) & log["name"].str.startswith(prefix)]
+
+# --- 4. 各分段統計 ---
+st.subheader("📊 各分段統計")
+summary = view.groupby(["name", "version"]).agg(
+    次數=("wall_s", "size"),
+    中位耗時秒=("wall_s", "median"),
+    P95耗時秒=("wall_s", lambda s: s.quantile(0.95)),
+    平均API次數=("api_calls", "mean"),
+    API429次數=("api_429", "sum"),
+    平均配額等待秒=("quota_wait_s", "mean"),
+    平均讀入MB=("bytes_in", lambda s: s.mean() / 2 ** 20),
+    最大RSS_MB=("rss_peak_mb", "max"),
+    最大Python高峰MB=("py_peak_mb", "max"),
+).round(3).reset_index()
+st.dataframe(summary, hide_index=True, use_container_width=True)
+
+# --- 5. 版本比較 ---
+if len(sel_versions) >= 2:
+    new_v, old_v = sel_versions[0], sel_versions[1]
+    st.subheader(f"🔍 版本比較：{new_v} vs {old_v}")
+    med = view.groupby(["name", "version"])["wall_s"].median().unstack()
+    if new_v in med and old_v in med:
+        cmp_df = med[[old_v, new_v]].dropna()
+        cmp_df["變化%"] = ((cmp_df[new_v] / cmp_df[old_v] - 1) * 100).round(1)
+        st.dataframe(cmp_df.sort_values("變化%", ascending=False).style.map(
+            lambda v: "color: red" if isinstance(v, float) and v > 20 else "", subset=["變化%"]),
+            use_container_width=True)
+
+# --- 6. 單次執行明細 ---
+st.subheader("🧾 單次執行明細")
+roots = view[view["parent"].isna()].sort_values("ts", ascending=False).head(50)
+if roots.empty:
+    st.info("💡 篩選範圍內沒有最上層分段。")
+    st.stop()
+labels = {r["run"]: f'{r["ts"]}　{r["name"]}　{r["wall_s"]:.2f}s' for _, r in roots.iterrows()}
+run = st.selectbox("選擇執行", list(labels), format_func=labels.get)
+spans = log[log["run"] == run]
+children = {}
+for _, r in spans.iterrows():
+    children.setdefault(r["parent"] if pd.notna(r["parent"]) else None, []).append(r)
+
+rows = []
+def walk(parent, depth):
+    for r in sorted(children.get(parent, []), key=lambda x: x["ts"]):
+        rows.append({"分段": "　" * depth + r["name"], "耗時秒": r["wall_s"], "API讀": r["api_read"], "API寫": r["api_write"],
+                     "429": r["api_429"], "配額等待秒": r["quota_wait_s"], "讀入KB": round(r["bytes_in"] / 1024, 1),
+                     "快取": r.get("cache") if pd.notna(r.get("cache")) else "", "錯誤": r["error"] or ""})
+        walk(r["id"], depth + 1)
+walk(None, 0)
+st.dataframe(pd.DataFrame(rows), hide_index=True, use_container_width=True)
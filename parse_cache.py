@@ -0,0 +1,136 @@
+import hashlib
+import os
+import pickle
+import shutil
+import tempfile
+import time
+
+import tracing
+
+# ==========================================
+# 上傳報表解析快取（以檔案內容 SHA-256 為鍵，存於本機磁碟）
+#   讀取失敗（檔案損毀、pandas 版本不同無法還原等）即刪除該筆並重新解析。
+#   寫入新項目後清理：舊版本目錄整個刪除，超過 KEEP_DAYS 未使用者刪除，
+#   總量超過 MAX_MB 時由最久未使用者刪起（命中時更新檔案時間）。
+# ==========================================
+CACHE_DIR = os.environ.get(
+    "HUB_PARSE_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "parse"),
+)
+# 解析邏輯有變動時遞增，舊快取即自動失效
+CACHE_VERSION = 3
+KEEP_DAYS = 30
+MAX_MB = int(os.environ.get("HUB_PARSE_CACHE_MB", "512"))
+
+
+def file_digest(f):
+    digest = getattr(f, "_sha256", None)
+    if digest:
+        return digest
+    if hasattr(f, "getvalue"):
+        data = f.getvalue()
+    else:
+        f.seek(0)
+        data = f.read()
+        f.seek(0)
+    digest = hashlib.sha256(data).hexdigest()
+    try:
+        f._sha256 = digest
+    except AttributeError:
+        pass
+    return digest
+
+
+def batch_digest(files):
+    h = hashlib.sha256()
+    for d in sorted(file_digest(f) for f in files):
+        h.update(d.encode())
+    return h.hexdigest()
+
+
+def _size(f):
+    if getattr(f, "size", None):
+        return f.size
+    return len(f.getvalue()) if hasattr(f, "getvalue") else 0
+
+
+def _path(stage, digest):
+    return os.path.join(CACHE_DIR, f"v{CACHE_VERSION}", stage, digest + ".pkl")
+
+
+def cached(f, stage, fn):
+    # 命中時直接回傳上次的解析結果，完全略過 Excel 讀取
+    if f is None:
+        return fn(f)
+    path = _path(stage, file_digest(f))
+    with tracing.stage(f"parse.{stage}") as span:
+        try:
+            with open(path, "rb") as fh:
+                result = pickle.load(fh)
+        except FileNotFoundError:
+            pass
+        except Exception:
+            # 損毀或由不同版本的 pandas 寫入而無法還原：刪除後重新解析
+            _remove(path)
+        else:
+            _touch(path)
+            if span: span.tags["cache"] = "hit"
+            return result
+        if span: span.tags["cache"] = "miss"
+        tracing.add_bytes(_size(f))
+        result = fn(f)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as fh:
+                pickle.dump(result, fh, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        except OSError:
+            pass
+        prune()
+        return result
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _touch(path):
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def prune(keep_days=KEEP_DAYS, max_mb=MAX_MB):
+    current = f"v{CACHE_VERSION}"
+    try:
+        versions = os.listdir(CACHE_DIR)
+    except OSError:
+        return
+    for name in versions:
+        if name != current:
+            shutil.rmtree(os.path.join(CACHE_DIR, name), ignore_errors=True)
+    entries = []
+    for root, _, names in os.walk(os.path.join(CACHE_DIR, current)):
+        for name in names:
+            path = os.path.join(root, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+    cutoff = time.time() - keep_days * 86400
+    total = sum(size for _, size, _ in entries)
+    for mtime, size, path in sorted(entries):
+        if mtime >= cutoff and total <= max_mb * 1024 * 1024:
+            break
+        _remove(path)
+        total -= size
+
+
+def clear():
+    shutil.rmtree(CACHE_DIR, ignore_errors=True)
@@ -0,0 +1,118 @@
+import os
+import sqlite3
+from contextlib import closing
+from datetime import date
+
+import pandas as pd
+
+# ==========================================
+# 各期統計本機存檔
+#   每份 A1/A2 報表解析後只保留「單位 × 死亡/受傷人數」彙總，以 (年度, 統計期間) 為鍵存入 SQLite。
+#   之後新增一週的報表時只需上傳該檔，本年累計、去年同期與前期皆由存檔補齊。
+#   超載、重大違規的各單位累計結果同樣存檔（unit_results），去年同期未上傳時由存檔取用。
+# ==========================================
+STORE_PATH = os.environ.get(
+    "HUB_PERIOD_STORE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "periods.sqlite"),
+)
+
+# 去年同期找不到完全相同的統計期間時，容許結束日相差的天數（週報出表日每年落在不同星期）
+MATCH_DAYS = 3
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS accident_periods (
+    year INTEGER, range TEXT, start_day INTEGER, is_cumu INTEGER, station TEXT,
+    a1 REAL, a2 REAL, PRIMARY KEY (year, range, station));
+CREATE TABLE IF NOT EXISTS unit_results (
+    report TEXT, year INTEGER, range TEXT, start_day INTEGER, end_day INTEGER, unit TEXT, metric TEXT,
+    value REAL, PRIMARY KEY (report, year, range, unit, metric));
+"""
+
+
+def _connect(path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def save_accident_periods(metas, path=STORE_PATH):
+    # 同一期重新上傳時整期覆蓋（單位列可能增減）
+    with closing(_connect(path)) as conn, conn:
+        for m in metas:
+            df = m['df'].drop_duplicates('Station_Short', keep='last')
+            conn.execute("DELETE FROM accident_periods WHERE year=? AND range=?", (m['year'], m['range']))
+            conn.executemany(
+                "INSERT INTO accident_periods VALUES (?,?,?,?,?,?,?)",
+                [(m['year'], m['range'], m['start_day'], int(m['is_cumu']), s, float(a1), float(a2))
+                 for s, a1, a2 in df[['Station_Short', 'A1_Deaths', 'A2_Injuries']].itertuples(index=False)])
+
+
+def load_accident_periods(path=STORE_PATH):
+    # 回傳與 parse_accident_file 相同格式的 meta 串列
+    with closing(_connect(path)) as conn:
+        rows = pd.read_sql_query("SELECT * FROM accident_periods ORDER BY year, start_day, range", conn)
+    out = []
+    for (year, rng), g in rows.groupby(['year', 'range'], sort=False):
+        out.append({'df': g.rename(columns={'station': 'Station_Short', 'a1': 'A1_Deaths', 'a2': 'A2_Injuries'})
+                    [['Station_Short', 'A1_Deaths', 'A2_Injuries']].reset_index(drop=True),
+                    'year': int(year), 'start_day': int(g['start_day'].iloc[0]), 'range': rng,
+                    'is_cumu': bool(g['is_cumu'].iloc[0])})
+    return out
+
+
+# ==========================================
+# 各單位累計結果（超載、重大違規）
+#   range 為 "MMDD-MMDD"；values 為 {(單位, 指標): 數值}
+# ==========================================
+def _day_of_year(mmdd):
+    # 不是合法月日（報表日期辨識錯誤、存檔中的舊資料）時為 None
+    try:
+        return date(2000, int(mmdd[:2]), int(mmdd[2:])).timetuple().tm_yday
+    except (TypeError, ValueError):
+        return None
+
+
+def _valid_range(rng):
+    return (isinstance(rng, str) and len(rng) == 9 and rng[4] == "-"
+            and _day_of_year(rng[:4]) is not None and _day_of_year(rng[-4:]) is not None)
+
+
+def period_gap(rng, other):
+    """兩個 "MMDD-MMDD" 期間起日相同時回傳結束日相差天數；起日不同或格式不符為 None。"""
+    if not (_valid_range(rng) and _valid_range(other)) or rng[:4] != other[:4]:
+        return None
+    return abs(_day_of_year(rng[-4:]) - _day_of_year(other[-4:]))
+
+
+def save_unit_results(report, year, rng, values, path=STORE_PATH):
+    # 同一期重新上傳時整期覆蓋
+    if not values or not _valid_range(rng):
+        return
+    start, end = int(rng[:4]), int(rng[-4:])
+    with closing(_connect(path)) as conn, conn:
+        conn.execute("DELETE FROM unit_results WHERE report=? AND year=? AND range=?", (report, year, rng))
+        conn.executemany(
+            "INSERT INTO unit_results VALUES (?,?,?,?,?,?,?,?)",
+            [(report, year, rng, start, end, unit, metric, float(v)) for (unit, metric), v in values.items()])
+
+
+def load_unit_results(report, year, rng, max_days=MATCH_DAYS, path=STORE_PATH):
+    """取某年度與 rng 同期的存檔：起日相同、結束日最接近（相差不超過 max_days 天）。
+
+    回傳 (實際統計期間, {(單位, 指標): 數值})；沒有存檔或 rng 不是合法期間時為 (None, {})。
+    """
+    if not _valid_range(rng):
+        return None, {}
+    start, end = int(rng[:4]), _day_of_year(rng[-4:])
+    with closing(_connect(path)) as conn:
+        ranges = [r for (r,) in conn.execute(
+            "SELECT DISTINCT range FROM unit_results WHERE report=? AND year=? AND start_day=?", (report, year, start))]
+        # 存檔中無法解析的期間直接略過
+        near = sorted((abs(_day_of_year(r[-4:]) - end), r) for r in ranges if _valid_range(r))
+        if not near or near[0][0] > max_days:
+            return None, {}
+        found = near[0][1]
+        rows = conn.execute("SELECT unit, metric, value FROM unit_results WHERE report=? AND year=? AND range=?",
+                            (report, year, found)).fetchall()
+    return found, {(unit, metric): v for unit, metric, v in rows}
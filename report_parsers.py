@@ -0,0 +1,105 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+# ==========================================
+# 報表解析核心（不依賴 Streamlit，可供首頁與效能測試共用）
+# ==========================================
+
+
+def _contains_any_col(sdf, token):
+    # 逐欄做向量化字串比對，再合併為「該列任一格含 token」的遮罩
+    if sdf.shape[1] == 0:
+        return np.zeros(len(sdf), dtype=bool)
+    return np.column_stack([sdf[c].str.contains(token, regex=False).to_numpy() for c in sdf.columns]).any(axis=1)
+
+
+def scan_unit_totals(df):
+    """掃描超載報表單一分頁，回傳 [(舉發單位, 總計列最後一個數值), ...]。
+
+    與原本逐列 iterrows 的判斷規則相同：遇到「舉發單位：」列記下單位，
+    其後第一個含「總計」且有數值的列即為該單位合計，取該列最後一個數值格。
+    """
+    if df.empty:
+        return []
+    sdf = df.astype(str).fillna("nan")
+    is_head = _contains_any_col(sdf, "舉發單位：")
+    is_total = _contains_any_col(sdf, "總計")
+    events = np.flatnonzero(is_head | is_total)
+    if len(events) == 0:
+        return []
+
+    # 只針對總計列計算「最後一個數值格」：數值格定義同原版（去掉一個小數點後全為數字）
+    tot_rows = sdf.iloc[np.flatnonzero(is_total)]
+    num_mask = tot_rows.apply(lambda col: col.str.replace('.', '', n=1, regex=False).str.isdigit()).to_numpy()
+    num_vals = tot_rows.apply(lambda col: pd.to_numeric(col.str.replace(',', '', regex=False), errors='coerce')).to_numpy(dtype=float)
+    last_col = num_mask.shape[1] - 1 - num_mask[:, ::-1].argmax(axis=1)
+    has_num = num_mask.any(axis=1)
+    last_val = num_vals[np.arange(len(tot_rows)), last_col]
+    tot_pos = {r: i for i, r in enumerate(np.flatnonzero(is_total))}
+
+    out, u = [], None
+    for r in events:
+        if is_head[r]:
+            m = re.search(r"舉發單位：(\S+)", " ".join(sdf.iloc[r].tolist()))
+            if m: u = m.group(1).strip()
+        if is_total[r] and u:
+            i = tot_pos[r]
+            if has_num[i]:
+                out.append((u, int(last_val[i])))
+                u = None
+    return out
+
+
+# ==========================================
+# 靜桃計畫清冊（CSV）
+# ==========================================
+JING_TAO_ENCODINGS = ['utf-8-sig', 'utf-8', 'cp950', 'big5']
+SNIFF_BYTES = 64 * 1024
+CSV_CHUNK_ROWS = 50_000
+
+
+def clean_col(c):
+    return str(c).strip().replace('\u3000', '').replace('\n', '')
+
+
+def jing_tao_columns(cols):
+    # 回傳 (通報日期, 所別/單位, 22-06, 06-22) 欄名；找不到為 None
+    cols = list(cols)
+    date_col = next((c for c in cols if '通報日期' in c), None)
+    unit_col = next((c for c in cols if '所別' in c or ('單位' in c and '舉發單位' not in c)), None)
+    col_22 = next((c for c in cols if re.search(r'22.{0,3}0?6|夜間|深夜', c)), None)
+    col_06 = next((c for c in cols if re.search(r'0?6.{0,3}22|日間|白天', c)), None)
+    return date_col, unit_col, col_22, col_06
+
+
+def sniff_csv_header(f, marker='通報日期', encodings=JING_TAO_ENCODINGS, max_lines=50):
+    # 只讀檔頭 SNIFF_BYTES，依序嘗試編碼，回傳 (編碼, 欄名列號)；找不到為 (None, None)
+    f.seek(0)
+    head = f.read(SNIFF_BYTES)
+    for enc in encodings:
+        lines = head.decode(enc, errors='ignore').splitlines()
+        for idx, line in enumerate(lines[:max_lines]):
+            if marker in line:
+                return enc, idx
+    return None, None
+
+
+def read_jing_tao_csv(f):
+    """串流讀取靜桃清冊 CSV：編碼只偵測一次，僅保留日期、單位與日夜間欄位。"""
+    enc, skip = sniff_csv_header(f)
+    if enc is None:
+        return None
+    opts = dict(encoding=enc, encoding_errors='ignore', skiprows=skip, on_bad_lines='skip')
+    f.seek(0)
+    header = pd.read_csv(f, nrows=0, **opts).columns
+    named = {clean_col(c): c for c in header}
+    usecols = [named[n] for n in dict.fromkeys(jing_tao_columns(named)) if n is not None]
+    if not usecols:
+        return None
+    # 其餘欄位在 C 解析器中直接略過；分塊讀取使峰值記憶體與檔案大小無關
+    f.seek(0)
+    with pd.read_csv(f, usecols=usecols, dtype=str, chunksize=CSV_CHUNK_ROWS, **opts) as reader:
+        chunks = list(reader)
+    return pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=usecols)
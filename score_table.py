@@ -0,0 +1,288 @@
+import json
+import os
+import tempfile
+import time
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+# ==========================================
+# 績效結算配分表（p27）本機快取
+#   配分表解析後的 db_map 連同試算表的 Drive 版本號存於本機 JSON。
+#   Drive 的 version 在任何修改（含直接在試算表上手動編輯）後都會遞增；開啟頁面只查版本號
+#   （Drive API，不佔 Sheets 配額），未變動就直接使用本機快取，有變動才重讀配分表這一個分頁，
+#   不再匯出整本活頁簿。本頁寫回配分表後以 store() 直接更新快取與版本號。
+#   沒有憑證（或無法查詢版本號）時沿用 xlsx 匯出，結果快取 EXPORT_TTL 秒。
+#
+#   RuleIndex：新條款的相近條款參照。條款代碼建前綴樹，每個節點記住子樹中最早出現、
+#   已有類別或取締項目的條款，查詢只需沿新條款走一次；找不到共同前綴時改以違規事實的
+#   二字詞（bigram）重疊度排序。
+#
+#   settle()：員警分頁結算。所有分頁的條款、攔停數、逕舉數欄合併成一欄，條款對照
+#   rule_frame() 的配分表，以陣列運算求配分、小計與總分，未列入配分表的條款以遮罩標黃。
+# ==========================================
+CACHE_PATH = os.environ.get(
+    "SCORE_TABLE_CACHE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "score_table.json"),
+)
+SHEET_NAME = "配分表"
+EXPORT_TTL = 600
+
+
+class FormatError(ValueError):
+    """配分表格式不符（例：缺少違規條款欄），與讀取失敗區分。"""
+
+
+def _clean(v):
+    v = "" if v is None or (isinstance(v, float) and pd.isna(v)) else str(v).strip()
+    return "" if v.lower() == "nan" else v
+
+
+def parse(df):
+    # 配分表 DataFrame -> {違規條款: {stop, dir, fact, category, item, gsheet_row}}
+    if "違規條款" not in df.columns:
+        raise FormatError("雲端配分表缺少『違規條款』欄位！")
+    df = df.reset_index(drop=True)
+    cols = {c: df[c] if c in df.columns else pd.Series("", index=df.index)
+            for c in ("違規條款", "違規事實", "類別", "取締項目")}
+    stop = pd.to_numeric(df["攔舉配分"], errors="coerce") if "攔舉配分" in df.columns else pd.Series(0, index=df.index)
+    dirs = pd.to_numeric(df["逕舉配分"], errors="coerce") if "逕舉配分" in df.columns else pd.Series(0, index=df.index)
+    db_map = {}
+    for i, rule, fact, cat, item, s, d in zip(df.index, cols["違規條款"], cols["違規事實"], cols["類別"],
+                                              cols["取締項目"], stop, dirs):
+        rule = _clean(rule)
+        if not rule:
+            continue
+        db_map[rule] = {
+            "stop": 0 if pd.isna(s) else int(s),
+            "dir": 0 if pd.isna(d) else int(d),
+            "fact": _clean(fact),
+            "category": _clean(cat),
+            "item": _clean(item),
+            "gsheet_row": int(i) + 2,
+        }
+    return db_map
+
+
+def _load_all(path):
+    try:
+        with open(path, encoding="utf-8") as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_all(data, path):
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as fh:
+            json.dump(data, fh, ensure_ascii=False)
+        os.replace(tmp, path)
+    except OSError:
+        pass
+
+
+def _save(sheet_id, version, db_map, path):
+    data = _load_all(path)
+    data[sheet_id] = {"version": version, "saved": time.time(), "db_map": db_map}
+    _save_all(data, path)
+
+
+def _drive_version(sheet_id):
+    # 試算表目前的 Drive 版本號；沒有憑證或查詢失敗時為 None
+    import sheets_pool
+    from gspread.urls import DRIVE_FILES_API_V3_URL
+    gc = sheets_pool.client()
+    if gc is None:
+        return None
+    try:
+        resp = gc.http_client.request("get", f"{DRIVE_FILES_API_V3_URL}/{sheet_id}",
+                                      params={"fields": "version", "supportsAllDrives": True})
+        return str(resp.json()["version"])
+    except Exception:
+        return None
+
+
+def _read_sheet(sheet_id):
+    # 只讀配分表分頁（UNFORMATTED_VALUE 與 read_excel 取得的數值型別一致）
+    import sheets_pool
+    from gspread.utils import absolute_range_name, fill_gaps
+    sh = sheets_pool.spreadsheet(sheet_id)
+    values = sh.values_get(absolute_range_name(SHEET_NAME),
+                           params={"valueRenderOption": "UNFORMATTED_VALUE"}).get("values", [])
+    values = fill_gaps(values) if values else [[]]
+    return pd.DataFrame(values[1:], columns=values[0])
+
+
+def _export(sheet_id):
+    url = f"https://docs.google.com/spreadsheets/d/{sheet_id}/export?format=xlsx"
+    return pd.read_excel(url, sheet_name=SHEET_NAME)
+
+
+def load(sheet_id, path=CACHE_PATH):
+    """回傳配分表的 db_map；版本號未變（或匯出結果未逾 EXPORT_TTL）時直接用本機快取。"""
+    hit = _load_all(path).get(sheet_id)
+    version = _drive_version(sheet_id)
+    if version is not None:
+        if hit and hit.get("version") == version:
+            return hit["db_map"]
+        db_map = parse(_read_sheet(sheet_id))
+    else:
+        if hit and hit.get("version") is None and time.time() - hit.get("saved", 0) < EXPORT_TTL:
+            return hit["db_map"]
+        db_map = parse(_export(sheet_id))
+    _save(sheet_id, version, db_map, path)
+    return db_map
+
+
+def store(sheet_id, db_map, path=CACHE_PATH):
+    """寫回配分表後呼叫：以本頁剛寫入後的 db_map 與新的版本號更新快取。"""
+    _save(sheet_id, _drive_version(sheet_id), db_map, path)
+
+
+def invalidate(sheet_id, path=CACHE_PATH):
+    data = _load_all(path)
+    if data.pop(sheet_id, None) is not None:
+        _save_all(data, path)
+
+
+class _Node:
+    __slots__ = ("kids", "best")
+
+    def __init__(self):
+        self.kids = {}
+        self.best = None    # (出現順序, 條款)
+
+
+def _bigrams(text):
+    text = "".join(str(text).split())
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+class RuleIndex:
+    """db_map 的相近條款索引；db_map 內容變動後以 update() 同步。"""
+
+    def __init__(self, db_map):
+        self.db_map = db_map
+        self.root = _Node()
+        self.order = {rule: i for i, rule in enumerate(db_map)}     # 同長前綴時取 db_map 中較前者
+        self.facts = {}     # 違規事實 -> 具類別條款中最早出現者
+        self.grams = {}     # 二字詞 -> 違規事實集合
+        self._memo = {}
+        for rule in db_map:
+            self.update(rule)
+
+    @staticmethod
+    def _usable(data):
+        return bool(data.get("category") or data.get("item"))
+
+    def update(self, rule):
+        data = self.db_map.get(rule)
+        if data is None or not self._usable(data):
+            return
+        key = (self.order.setdefault(rule, len(self.order)), rule)
+        node = self.root
+        for ch in rule:
+            node = node.kids.setdefault(ch, _Node())
+            if node.best is None or key < node.best:
+                node.best = key
+        fact = data.get("fact", "")
+        if fact not in self.facts or key < self.facts[fact]:
+            self.facts[fact] = key
+            self._memo.clear()
+        for g in _bigrams(fact):
+            self.grams.setdefault(g, set()).add(fact)
+
+    def closest(self, rule, fact=""):
+        """與 rule 共同前綴最長（同長取最早出現）且有類別的條款資料；無共同前綴時依違規事實相似度。"""
+        node, best = self.root, None
+        for ch in rule:
+            node = node.kids.get(ch)
+            if node is None or node.best is None:
+                break
+            best = node.best
+        if best is not None:
+            return self.db_map[best[1]]
+        return self._by_fact(fact)
+
+    def _by_fact(self, fact):
+        # 以不重複的違規事實計分（同一事實的條款很多）；至少一半的二字詞相同才採用，避免只因常見字而誤配
+        if fact not in self._memo:
+            grams = _bigrams(fact)
+            hits = Counter(f for g in grams for f in self.grams.get(g, ()))
+            best = None
+            if hits:
+                f, n = min(hits.items(), key=lambda kv: (-kv[1], self.facts[kv[0]]))
+                best = self.facts[f][1] if n * 2 >= len(grams) else None
+            self._memo[fact] = best
+        rule = self._memo[fact]
+        return self.db_map[rule] if rule is not None else None
+
+
+# ==========================================
+# 員警分頁結算
+# ==========================================
+SKIP_RULE = "合計|製表|舉發單張數"
+
+
+def rule_frame(db_map):
+    """db_map -> 以違規條款為索引的配分 DataFrame（stop、dir）。"""
+    return pd.DataFrame({"stop": {r: v["stop"] for r, v in db_map.items()},
+                         "dir": {r: v["dir"] for r, v in db_map.items()}},
+                        columns=["stop", "dir"])
+
+
+def _safe_int(val):
+    try: return int(float(str(val).replace(",", "")))
+    except (TypeError, ValueError, OverflowError): return 0
+
+
+def _counts(values):
+    # 等同逐格 _safe_int；to_numeric 無法辨識的（全形數字等）才逐格轉換
+    text = pd.Series(values, dtype=object).map(str).str.replace(",", "", regex=False)
+    num = pd.to_numeric(text, errors="coerce").astype("float64")
+    odd = (num.isna() & text.str.lower().ne("nan")).to_numpy()
+    if odd.any():
+        num[odd] = [_safe_int(v) for v in text[odd]]
+    num = num.to_numpy()
+    return np.where(np.isfinite(num), np.trunc(num), 0).astype("int64")
+
+
+def settle(jobs, rules):
+    """jobs 為 (df, 表頭列, 條款欄, 攔停數欄, 逕舉數欄, 攔舉配分欄, 逕舉配分欄, 小計欄或 -1)；
+    所有分頁合併成一欄一次計算，再就地寫回各 df。回傳各分頁的 (總分, 需標黃的 (列, 欄))。"""
+    if not jobs:
+        return []
+    cols = [[df.iloc[h + 1:, c].to_numpy(dtype=object) for c in (c_rule, c_s, c_d)]
+            for df, h, c_rule, c_s, c_d, *_ in jobs]
+    rule = pd.Series(np.concatenate([c[0] for c in cols]), dtype=object).map(str).str.strip()
+    keep = (rule.ne("") & rule.str.lower().ne("nan") & ~rule.str.contains(SKIP_RULE)).to_numpy()
+
+    n = len(rule)
+    s_score, d_score, subtotal = (np.zeros(n, dtype="int64") for _ in range(3))
+    score = rules.reindex(rule[keep].to_numpy()).fillna(0).astype("int64")
+    s_score[keep], d_score[keep] = score["stop"].to_numpy(), score["dir"].to_numpy()
+    subtotal[keep] = (s_score[keep] * _counts(np.concatenate([c[1] for c in cols])[keep])
+                      + d_score[keep] * _counts(np.concatenate([c[2] for c in cols])[keep]))
+
+    results, start = [], 0
+    for (df, h, _, _, _, c_ss, c_ds, c_sub), c in zip(jobs, cols):
+        end = start + len(c[0])
+        k = keep[start:end]
+        pos = np.flatnonzero(k) + h + 1
+        if len(pos):
+            for col, vals in ((c_ss, s_score), (c_ds, d_score), (c_sub, subtotal)):
+                if col == -1:
+                    continue
+                # 整欄換成 object 陣列寫回（pandas 推斷為 str 的空白配分欄不能放整數）
+                arr = df.iloc[:, col].to_numpy(dtype=object, copy=True)
+                arr[pos] = vals[start:end][k].tolist()
+                df.isetitem(col, arr)
+        both_zero = (s_score[start:end] == 0) & (d_score[start:end] == 0) & k
+        yellow = (np.flatnonzero(both_zero) + h + 1).tolist()
+        results.append((int(subtotal[start:end].sum()),
+                        [(r, col) for r in yellow for col in (c_ss, c_ds)]))
+        start = end
+    return results
@@ -0,0 +1,285 @@
+import json
+import math
+import numbers
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+from gspread.utils import a1_range_to_grid_range, a1_to_rowcol
+
+# ==========================================
+# Google Sheets 寫入計畫：收集整批作業的清除、數值與格式請求，
+# 最後以單一 spreadsheets.batchUpdate 送出（數值以 updateCells 表示，等同 RAW 寫入）。
+# 搭配 SheetSnapshots 時，只送出與上次寫入內容不同的儲存格。
+# ==========================================
+SNAPSHOT_PATH = os.environ.get(
+    "SHEETS_SNAPSHOT_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "sheets_snapshot.json"),
+)
+
+
+def _cell_value(v):
+    if v is None or (isinstance(v, float) and math.isnan(v)) or v == "":
+        return {}
+    if isinstance(v, bool):
+        return {"userEnteredValue": {"boolValue": v}}
+    if isinstance(v, numbers.Number):
+        return {"userEnteredValue": {"numberValue": float(v) if not isinstance(v, numbers.Integral) else int(v)}}
+    return {"userEnteredValue": {"stringValue": str(v)}}
+
+
+class WritePlan:
+    def __init__(self):
+        self._groups = {}
+        self._extent = {}
+        self._grid = {}     # ws.id -> [ws, 列數, 欄數, {分組名稱}]：本批送出後的格線大小
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self.calls = 0
+        self.sent = 0
+
+    @contextmanager
+    def section(self, name):
+        # 以處理器為單位分組；整批送出失敗時可逐組重送，避免一組錯誤拖累全部
+        prev = getattr(self._local, "name", None)
+        self._local.name = name
+        try:
+            yield self
+        finally:
+            self._local.name = prev
+
+    def _add(self, reqs):
+        name = getattr(self._local, "name", None) or "_"
+        with self._lock:
+            self._groups.setdefault(name, []).extend(reqs)
+
+    def grid(self, ws):
+        """回傳本批請求送出後 ws 的 (列數, 欄數)。"""
+        with self._lock:
+            g = self._grid.get(ws.id)
+            return (g[1], g[2]) if g else (ws.row_count, ws.col_count)
+
+    def resize(self, ws, rows=None, cols=None):
+        # 記錄本批請求（insert/deleteDimension 等）造成的格線變化；ws 本身的屬性等送出成功後才更新
+        with self._lock:
+            g = self._grid.setdefault(ws.id, [ws, ws.row_count, ws.col_count, set()])
+            if rows is not None:
+                g[1] = rows
+            if cols is not None:
+                g[2] = cols
+            g[3].add(getattr(self._local, "name", None) or "_")
+
+    def _grow(self, ws, rows, cols):
+        # 數值超出目前格線範圍時先擴充，行為與 values.update 自動擴表一致
+        need_r = max(rows, self._extent.get(ws.id, (0, 0))[0])
+        need_c = max(cols, self._extent.get(ws.id, (0, 0))[1])
+        self._extent[ws.id] = (need_r, need_c)
+        cur_r, cur_c = self.grid(ws)
+        reqs = []
+        if need_r > cur_r:
+            reqs.append({"appendDimension": {"sheetId": ws.id, "dimension": "ROWS", "length": need_r - cur_r}})
+            self.resize(ws, rows=need_r)
+        if need_c > cur_c:
+            reqs.append({"appendDimension": {"sheetId": ws.id, "dimension": "COLUMNS", "length": need_c - cur_c}})
+            self.resize(ws, cols=need_c)
+        return reqs
+
+    def clear(self, ws):
+        # 等同 ws.clear()：只清除數值，保留格式
+        self._add([{"updateCells": {"range": {"sheetId": ws.id}, "fields": "userEnteredValue"}}])
+
+    def clear_ranges(self, ws, ranges):
+        self._add([{"updateCells": {"range": dict(a1_range_to_grid_range(r), sheetId=ws.id), "fields": "userEnteredValue"}}
+                   for r in ranges])
+
+    def values(self, ws, range_name, values):
+        r0, c0 = a1_to_rowcol(range_name.split(":")[0])
+        rows = [{"values": [_cell_value(v) for v in row]} for row in values]
+        width = max((len(row) for row in values), default=0)
+        with self._lock:
+            reqs = self._grow(ws, r0 - 1 + len(values), c0 - 1 + width)
+            reqs.append({"updateCells": {
+                "start": {"sheetId": ws.id, "rowIndex": r0 - 1, "columnIndex": c0 - 1},
+                "rows": rows,
+                "fields": "userEnteredValue"
+            }})
+            self._add(reqs)
+
+    def requests(self, reqs):
+        self._add(list(reqs))
+
+    def __len__(self):
+        return sum(len(v) for v in self._groups.values())
+
+    def flush(self, batch_update, snapshots=None, spreadsheet_id=""):
+        # 回傳 [(分組名稱, 例外), ...]；成功時為空串列
+        groups, self._groups = self._groups, {}
+        grid, self._grid = self._grid, {}
+        states = {}
+        if snapshots is not None:
+            groups, states = _diff_groups(groups, snapshots, spreadsheet_id)
+        groups = {k: v for k, v in groups.items() if v}
+        self.sent = sum(len(v) for v in groups.values())
+        if not groups:
+            self._apply_grid(grid, set())
+            if snapshots is not None:
+                snapshots.save(states)
+            return []
+        try:
+            self.calls += 1
+            batch_update({"requests": [r for reqs in groups.values() for r in reqs]})
+            errors = []
+        except Exception as e:
+            if len(groups) == 1:
+                errors = [(next(iter(groups)), e)]
+            else:
+                errors = []
+                for name, reqs in groups.items():
+                    try:
+                        self.calls += 1
+                        batch_update({"requests": reqs})
+                    except Exception as e2:
+                        errors.append((name, e2))
+        failed = {name for name, _ in errors}
+        self._apply_grid(grid, failed)
+        if snapshots is not None:
+            snapshots.save({k: v for k, v in states.items() if v["group"] not in failed})
+        return errors
+
+    @staticmethod
+    def _apply_grid(grid, failed):
+        # 只有相關分組都送出成功的工作表才更新格線大小；失敗時保留原值，避免快取的 Worksheet 記著不存在的格線
+        for ws, rows, cols, names in grid.values():
+            if names & failed:
+                continue
+            props = ws._properties.setdefault("gridProperties", {})
+            props["rowCount"], props["columnCount"] = rows, cols
+
+
+# ==========================================
+# 差異同步：在本機模擬每張工作表的儲存格內容，與上次寫入的快照比對
+# ==========================================
+class SheetSnapshots:
+    def __init__(self, path=SNAPSHOT_PATH):
+        self.path = path
+        try:
+            with open(path, encoding="utf-8") as fh:
+                self.data = json.load(fh)
+        except (OSError, ValueError):
+            self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def save(self, states):
+        if not states:
+            return
+        for key, st in states.items():
+            self.data[key] = {"structural": st["structural"], "cells": st["cells"]}
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.path), suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as fh:
+                json.dump(self.data, fh, ensure_ascii=False)
+            os.replace(tmp, self.path)
+        except OSError:
+            pass
+
+
+def _sheet_of(req):
+    body = next(iter(req.values()))
+    for k in ("range", "start"):
+        if isinstance(body.get(k), dict) and "sheetId" in body[k]:
+            return body[k]["sheetId"]
+    return body.get("sheetId")
+
+
+def _fields(body):
+    return {f.strip() for f in body.get("fields", "").split(",")}
+
+
+def _is_value_op(req):
+    # 只寫入/清除數值（含 textFormatRuns）的 updateCells；其餘皆視為版面結構請求
+    body = req.get("updateCells")
+    return body is not None and _fields(body) <= {"userEnteredValue", "textFormatRuns"}
+
+
+def _apply_cells(cells, req):
+    body = req.get("updateCells")
+    if body is None or "userEnteredValue" not in _fields(body):
+        return
+    if "rows" in body:
+        pos = body.get("start") or body.get("range", {})
+        r0 = pos.get("rowIndex", pos.get("startRowIndex", 0))
+        c0 = pos.get("columnIndex", pos.get("startColumnIndex", 0))
+        with_runs = "textFormatRuns" in _fields(body)
+        for i, row in enumerate(body["rows"]):
+            for j, cell in enumerate(row.get("values", [])):
+                key = f"{r0 + i}:{c0 + j}"
+                state = {k: v for k, v in cell.items() if k == "userEnteredValue" or (with_runs and k == "textFormatRuns")}
+                if state:
+                    cells[key] = state
+                else:
+                    cells.pop(key, None)
+    else:
+        g = body.get("range", {})
+        r_lo, r_hi = g.get("startRowIndex", 0), g.get("endRowIndex", float("inf"))
+        c_lo, c_hi = g.get("startColumnIndex", 0), g.get("endColumnIndex", float("inf"))
+        for key in list(cells):
+            r, c = map(int, key.split(":"))
+            if r_lo <= r < r_hi and c_lo <= c < c_hi:
+                del cells[key]
+
+
+def _cell_diff(sheet_id, old, new):
+    changed = sorted({k for k in set(old) | set(new) if old.get(k) != new.get(k)},
+                     key=lambda k: tuple(map(int, k.split(":"))))
+    reqs, run = [], []
+
+    def emit():
+        if run:
+            r, c = map(int, run[0].split(":"))
+            reqs.append({"updateCells": {
+                "start": {"sheetId": sheet_id, "rowIndex": r, "columnIndex": c},
+                "rows": [{"values": [new.get(k, {}) for k in run]}],
+                "fields": "userEnteredValue,textFormatRuns"
+            }})
+
+    for k in changed:
+        if run:
+            pr, pc = map(int, run[-1].split(":"))
+            r, c = map(int, k.split(":"))
+            if r == pr and c == pc + 1:
+                run.append(k)
+                continue
+            emit()
+        run = [k]
+    emit()
+    return reqs
+
+
+def _diff_groups(groups, snapshots, spreadsheet_id):
+    sheets = {}
+    for name, reqs in groups.items():
+        for req in reqs:
+            sid = _sheet_of(req)
+            sheets.setdefault(sid, {"group": name, "reqs": []})["reqs"].append(req)
+
+    out, states = {name: [] for name in groups}, {}
+    for sid, info in sheets.items():
+        key = f"{spreadsheet_id}:{sid}"
+        prev = snapshots.get(key) or {}
+        grow = [r for r in info["reqs"] if "appendDimension" in r]
+        body = [r for r in info["reqs"] if "appendDimension" not in r]
+        structural = [json.dumps(r, sort_keys=True, ensure_ascii=False) for r in body if not _is_value_op(r)]
+        cells = dict(prev.get("cells", {}))
+        for r in body:
+            _apply_cells(cells, r)
+        if prev and prev.get("structural") == structural:
+            sent = grow + _cell_diff(sid, prev.get("cells", {}), cells)
+        else:
+            sent = info["reqs"]
+        out[info["group"]].extend(sent)
+        states[key] = {"group": info["group"], "structural": structural, "cells": cells}
+    return out, states
@@ -0,0 +1,193 @@
+import threading
+from http import HTTPStatus
+
+import gspread
+from gspread.exceptions import APIError, SpreadsheetNotFound, WorksheetNotFound
+from gspread.utils import extract_id_from_url
+
+import sheets_backend
+from sheets_quota import QuotaHTTPClient
+
+# ==========================================
+# 全程序共用的 gspread 連線池
+#   授權後的 Client 依服務帳戶快取；開啟的 Spreadsheet 連同工作表清單（metadata）依試算表 ID 快取，
+#   各頁面的 load_data / save_data 不再每次重新授權與 open_by_key。
+#   只有授權失效（401）或呼叫 invalidate() 時才重新取得；新增、刪除工作表或變更格線大小時
+#   自動更新工作表清單，找不到工作表時先重讀一次清單（可能是其他程序剛新增的）。
+# ==========================================
+SCOPES = ["https://www.googleapis.com/auth/spreadsheets", "https://www.googleapis.com/auth/drive"]
+
+# 會改變工作表清單或格線大小的 batchUpdate 請求
+_STRUCTURAL = ("addSheet", "deleteSheet", "duplicateSheet", "updateSheetProperties",
+               "appendDimension", "insertDimension", "deleteDimension")
+
+_LOCK = threading.Lock()
+_CLIENTS = {}   # 帳戶鍵 -> gspread.Client
+_SHEETS = {}    # (帳戶鍵, 試算表 ID) -> PooledSpreadsheet
+
+
+class PooledSpreadsheet(gspread.Spreadsheet):
+    def __init__(self, http_client, properties):
+        self._meta = None
+        self._meta_lock = threading.Lock()
+        super().__init__(http_client, properties)
+
+    def fetch_sheet_metadata(self, params=None):
+        if params is not None:
+            return super().fetch_sheet_metadata(params)
+        with self._meta_lock:
+            if self._meta is None:
+                self._meta = super().fetch_sheet_metadata()
+            return self._meta
+
+    def refresh(self):
+        with self._meta_lock:
+            self._meta = None
+
+    def worksheet(self, title):
+        try:
+            return super().worksheet(title)
+        except WorksheetNotFound:
+            self.refresh()
+            return super().worksheet(title)
+
+    def add_worksheet(self, title, rows, cols, index=None):
+        ws = super().add_worksheet(title, rows, cols, index)
+        with self._meta_lock:
+            if self._meta is not None and index is None:
+                self._meta["sheets"].append({"properties": ws._properties})
+            else:
+                self._meta = None
+        return ws
+
+    def batch_update(self, body):
+        try:
+            return super().batch_update(body)
+        finally:
+            if any(k in r for r in body.get("requests", ()) for k in _STRUCTURAL):
+                self.refresh()
+
+    def del_worksheet(self, worksheet):
+        try:
+            return super().del_worksheet(worksheet)
+        finally:
+            self.refresh()
+
+    def del_worksheet_by_id(self, worksheet_id):
+        try:
+            return super().del_worksheet_by_id(worksheet_id)
+        finally:
+            self.refresh()
+
+    def duplicate_sheet(self, *args, **kwargs):
+        try:
+            return super().duplicate_sheet(*args, **kwargs)
+        finally:
+            self.refresh()
+
+
+class PoolHTTPClient(QuotaHTTPClient):
+    # 授權失效時把這個 Client 與它開啟的試算表移出連線池，下一次取用時重新授權
+    def request(self, *args, **kwargs):
+        try:
+            return super().request(*args, **kwargs)
+        except APIError as e:
+            if e.code == HTTPStatus.UNAUTHORIZED:
+                _drop(self)
+            raise
+
+
+def service_account_info():
+    # 與各頁面相同的 secrets 位置：gcp_service_account，或 connections.gsheets
+    import streamlit as st
+    try:
+        if "gcp_service_account" in st.secrets:
+            info = dict(st.secrets["gcp_service_account"])
+        elif "connections" in st.secrets and "gsheets" in st.secrets["connections"]:
+            info = dict(st.secrets["connections"]["gsheets"])
+        else:
+            return None
+    except Exception:
+        return None
+    if "private_key" in info:
+        info["private_key"] = info["private_key"].replace("\\n", "\n")
+    return info
+
+
+def _account(info):
+    # 回傳 (帳戶鍵, 憑證)；沒有憑證時帳戶鍵為 None
+    if sheets_backend.is_local():
+        return "local", None
+    info = info or service_account_info()
+    if not info:
+        return None, None
+    return (info.get("client_email"), info.get("private_key_id")), info
+
+
+def client(info=None):
+    """回傳共用的已授權 gspread Client；沒有憑證時為 None。"""
+    key, info = _account(info)
+    return None if key is None else _client(key, info)
+
+
+def _client(key, info):
+    with _LOCK:
+        gc = _CLIENTS.get(key)
+        if gc is None:
+            if key == "local":
+                gc = sheets_backend.local_client(http_client=PoolHTTPClient)
+            else:
+                from google.oauth2.service_account import Credentials
+                creds = Credentials.from_service_account_info(info, scopes=SCOPES)
+                gc = gspread.authorize(creds, http_client=PoolHTTPClient)
+            _CLIENTS[key] = gc
+    return gc
+
+
+def sheet_id(key_or_url):
+    return extract_id_from_url(key_or_url) if key_or_url.startswith("http") else key_or_url
+
+
+def spreadsheet(key_or_url, info=None):
+    """回傳共用的 Spreadsheet（含已快取的工作表清單）；沒有憑證時為 None。"""
+    sid = sheet_id(key_or_url)
+    acct, info = _account(info)
+    if acct is None:
+        return None
+    for attempt in range(2):
+        gc = _client(acct, info)
+        with _LOCK:
+            sh = _SHEETS.get((acct, sid))
+        if sh is not None:
+            return sh
+        try:
+            sh = PooledSpreadsheet(gc.http_client, {"id": sid})
+        except APIError as e:
+            if e.code == HTTPStatus.NOT_FOUND:
+                raise SpreadsheetNotFound(e.response) from e
+            if e.code == HTTPStatus.UNAUTHORIZED and attempt == 0:
+                continue
+            raise
+        with _LOCK:
+            return _SHEETS.setdefault((acct, sid), sh)
+
+
+def invalidate(key_or_url=None):
+    """明確丟棄快取：指定試算表時只丟該試算表的 handle，未指定時連同 Client 全部重來。"""
+    with _LOCK:
+        if key_or_url is None:
+            _CLIENTS.clear()
+            _SHEETS.clear()
+            return
+        sid = sheet_id(key_or_url)
+        for k in [k for k in _SHEETS if k[1] == sid]:
+            del _SHEETS[k]
+
+
+def _drop(http_client):
+    with _LOCK:
+        for key, gc in list(_CLIENTS.items()):
+            if gc.http_client is http_client:
+                del _CLIENTS[key]
+                for k in [k for k in _SHEETS if k[0] == key]:
+                    del _SHEETS[k]
@@ -0,0 +1,124 @@
+import os
+import threading
+import time
+from http import HTTPStatus
+
+from gspread.exceptions import APIError
+from gspread.http_client import HTTPClient
+
+import tracing
+
+# ==========================================
+# Google Sheets API 全程序配額排程
+#   Sheets API 對同一個服務帳戶的限制為每分鐘讀取 60 次、寫入 60 次。
+#   所有頁面共用同一個排程器：請求先取得權杖再送出，依配額速率放行，
+#   遇到 429 時整個類別一起暫停，避免各使用者各自睡眠重試、互相拖累。
+# ==========================================
+READ_PER_MIN = int(os.environ.get("SHEETS_READ_PER_MIN", 60))
+WRITE_PER_MIN = int(os.environ.get("SHEETS_WRITE_PER_MIN", 60))
+BURST = 10
+MAX_RETRIES = 5
+
+
+class TokenBucket:
+    # 容量 BURST、補充速率 (配額 - BURST)/分：任一 60 秒內放行數不超過配額
+    def __init__(self, per_minute, burst=BURST):
+        self.capacity = max(1, min(burst, per_minute))
+        self.rate = max(per_minute - self.capacity, 1) / 60.0
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.waiting = 0
+        self._cond = threading.Condition()
+        self._next_ticket = 0
+        self._serving = 0
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        # 先到先服務：依號碼牌順序放行
+        with self._cond:
+            ticket = self._next_ticket
+            self._next_ticket += 1
+            self.waiting += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    if ticket == self._serving and now >= self.paused_until and self.tokens >= 1:
+                        self.tokens -= 1
+                        self._serving += 1
+                        self._cond.notify_all()
+                        return
+                    if ticket != self._serving:
+                        self._cond.wait()
+                    else:
+                        wait = max(self.paused_until - now, (1 - self.tokens) / self.rate)
+                        self._cond.wait(timeout=max(wait, 0.01))
+            finally:
+                self.waiting -= 1
+
+    def pause(self, seconds):
+        with self._cond:
+            self.tokens = 0.0
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self._cond.notify_all()
+
+
+class QuotaScheduler:
+    def __init__(self, read_per_min=READ_PER_MIN, write_per_min=WRITE_PER_MIN):
+        self.buckets = {"read": TokenBucket(read_per_min), "write": TokenBucket(write_per_min)}
+        self.counts = {"read": 0, "write": 0, "throttled": 0}
+        self._lock = threading.Lock()
+
+    def acquire(self, kind):
+        self.buckets[kind].acquire()
+        with self._lock:
+            self.counts[kind] += 1
+
+    def backoff(self, kind, attempt):
+        with self._lock:
+            self.counts["throttled"] += 1
+        self.buckets[kind].pause(min(5 * (2 ** attempt), 60))
+
+    def stats(self):
+        with self._lock:
+            out = dict(self.counts)
+        out.update({f"{k}_waiting": b.waiting for k, b in self.buckets.items()})
+        return out
+
+
+SCHEDULER = QuotaScheduler()
+
+
+def classify(method, url):
+    # 非 Sheets API（Drive 匯出等）不受此配額限制
+    if "sheets.googleapis.com" not in url:
+        return None
+    if method.upper() == "GET" or url.endswith((":batchGet", ":batchGetByDataFilter", ":getByDataFilter")):
+        return "read"
+    return "write"
+
+
+class QuotaHTTPClient(HTTPClient):
+    # 傳給 gspread.authorize(..., http_client=QuotaHTTPClient)，所有呼叫皆經過排程器
+    def request(self, method, endpoint, *args, **kwargs):
+        kind = classify(method, endpoint)
+        if kind is None:
+            return super().request(method, endpoint, *args, **kwargs)
+        for attempt in range(MAX_RETRIES):
+            t0 = time.monotonic()
+            SCHEDULER.acquire(kind)
+            tracing.add("quota_wait_s", time.monotonic() - t0)
+            tracing.add(f"api_{kind}")
+            try:
+                resp = super().request(method, endpoint, *args, **kwargs)
+                tracing.add("api_bytes", len(resp.content or b""))
+                return resp
+            except APIError as e:
+                if e.code != HTTPStatus.TOO_MANY_REQUESTS or attempt == MAX_RETRIES - 1:
+                    raise
+                tracing.add("api_429")
+                SCHEDULER.backoff(kind, attempt)
@@ -0,0 +1,306 @@
+import math
+import numbers
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from difflib import SequenceMatcher
+from http import HTTPStatus
+
+import gspread
+import pandas as pd
+from gspread.exceptions import APIError, GSpreadException, WorksheetNotFound
+from gspread.utils import absolute_range_name, fill_gaps, numericise_all, rowcol_to_a1, to_records
+
+import sheets_pool
+from sheets_plan import WritePlan
+
+# ==========================================
+# 勤務規劃頁面的工作表讀寫
+#   各規劃頁面的設定、指揮組、巡邏組等分頁以一次 values.batchGet 讀回（1 次 API 呼叫），
+#   工作表是否存在由 sheets_pool 快取的工作表清單判斷，不另外呼叫 API。
+#   儲存時所有分頁的建立、清除、格線增減與寫入合併為一次 batchUpdate（整批成功或整批失敗）。
+#   sh 為 sheets_pool.spreadsheet() 取得的試算表。
+#
+#   讀回的內容依（試算表 ID, 工作表名稱）快取，呼叫端以 ttl 決定可接受的新舊程度；
+#   寫入成功後直接以剛寫入的內容更新該分頁的快取，只影響寫入的分頁，不必清除其他頁面的快取。
+#
+#   版本戳記：每次 write_tables 在同一批 batchUpdate 中更新隱藏工作表「_版本」A1 的戳記。
+#   poll=True 的讀取在快取超過 ttl 後只讀這一格（約百位元組），戳記沒變就沿用快取；
+#   直接在試算表上手動修改不會更新戳記，因此快取最久 POLL_MAX_AGE 秒後仍整批重讀。
+#
+#   逐列同步：儲存時若快取的分頁內容可信（戳記與表上一致、取得未超過 POLL_MAX_AGE 秒），
+#   只送出與快取相比變更、新增、刪除的列（updateCells / insertDimension / deleteDimension），
+#   否則整表清除重寫。
+# ==========================================
+VERSION_TAB = "_版本"
+POLL_MAX_AGE = 60
+
+_CACHE = {}     # (試算表 ID, 工作表名稱) -> (確認時間, 二維串列或 None, 版本戳記, 取得時間)
+_VERSIONS = {}  # 試算表 ID -> (讀取時間, 版本戳記)
+_CACHE_LOCK = threading.Lock()
+
+
+def _cell_text(v):
+    # 寫入值在 values.get（FORMATTED_VALUE）讀回時的樣子
+    if v is None or (isinstance(v, float) and math.isnan(v)):
+        return ""
+    if isinstance(v, bool):
+        return "TRUE" if v else "FALSE"
+    if isinstance(v, numbers.Integral):
+        return str(int(v))
+    if isinstance(v, numbers.Real):
+        return str(int(v)) if float(v).is_integer() else str(float(v))
+    return str(v)
+
+
+def _as_read(values):
+    # 與 API 回傳一致：去掉每列結尾的空白儲存格與結尾的空白列
+    rows = []
+    for row in values:
+        row = [_cell_text(v) for v in row]
+        while row and row[-1] == "":
+            row.pop()
+        rows.append(row)
+    while rows and not rows[-1]:
+        rows.pop()
+    return rows
+
+
+def _store(sid, values_by_title, stamp, since=None):
+    now = time.monotonic()
+    with _CACHE_LOCK:
+        for t, values in values_by_title.items():
+            hit = _CACHE.get((sid, t))
+            # 讀取期間已有較新的寫入時保留寫入的內容
+            if since is None or hit is None or hit[3] <= since:
+                _CACHE[(sid, t)] = (now, values, stamp, now)
+
+
+def invalidate(key_or_url, titles=None):
+    """丟棄指定試算表（與分頁）的快取，下一次讀取時重新向 API 取得。"""
+    sid = sheets_pool.sheet_id(key_or_url)
+    with _CACHE_LOCK:
+        for k in [k for k in _CACHE if k[0] == sid and (titles is None or k[1] in titles)]:
+            del _CACHE[k]
+        _VERSIONS.pop(sid, None)
+
+
+def _version(sh, ttl):
+    # 目前的版本戳記（ttl 秒內讀過就不再讀）；尚未有任何 write_tables 寫入時為 None
+    with _CACHE_LOCK:
+        hit = _VERSIONS.get(sh.id)
+    if hit is not None and time.monotonic() - hit[0] < ttl:
+        return hit[1]
+    at = time.monotonic()
+    try:
+        values = sh.values_get(absolute_range_name(VERSION_TAB, "A1")).get("values", [])
+        stamp = values[0][0] if values and values[0] else None
+    except APIError as e:
+        if e.code != HTTPStatus.BAD_REQUEST:
+            raise
+        stamp = None
+    with _CACHE_LOCK:
+        _VERSIONS[sh.id] = (at, stamp)
+    return stamp
+
+
+def _fetch(sh, titles):
+    for attempt in range(2):
+        existing = {ws.title for ws in sh.worksheets()}
+        want = [t for t in titles if t in existing]
+        if not want:
+            return dict.fromkeys(titles)
+        try:
+            resp = sh.values_batch_get([absolute_range_name(t) for t in want])
+            break
+        except APIError as e:
+            # 工作表清單快取過期（其他程序刪除或改名了工作表）時重讀清單再試一次
+            if e.code != HTTPStatus.BAD_REQUEST or attempt:
+                raise
+            sh.refresh()
+    out = dict.fromkeys(titles)
+    for t, vr in zip(want, resp.get("valueRanges", [])):
+        out[t] = vr.get("values", [])
+    return out
+
+
+def read_values(sh, titles, ttl=None, poll=False):
+    """一次讀取多個工作表的全部儲存格；回傳 {名稱: 二維串列}，不存在的工作表為 None。
+
+    ttl（秒）內取得或寫入過的分頁直接用快取，其餘分頁合併為一次 batchGet；ttl=None 一律重讀。
+    poll=True 時超過 ttl 先比對版本戳記，沒有變動（且未超過 POLL_MAX_AGE）就沿用快取。
+    """
+    titles = list(dict.fromkeys(titles))
+    out, todo = {}, []
+    now = time.monotonic()
+    with _CACHE_LOCK:
+        hits = {t: _CACHE.get((sh.id, t)) for t in titles} if ttl else {}
+    for t in titles:
+        hit = hits.get(t)
+        if hit is not None and now - hit[0] < ttl:
+            out[t] = hit[1]
+        else:
+            todo.append(t)
+    stamp = None
+    if todo and poll and ttl:
+        stamp = _version(sh, ttl)
+        same = [t for t in todo if hits.get(t) is not None and hits[t][2] == stamp
+                and now - hits[t][3] < POLL_MAX_AGE]
+        with _CACHE_LOCK:
+            for t in same:
+                _CACHE[(sh.id, t)] = (now,) + hits[t][1:]
+                out[t] = hits[t][1]
+        todo = [t for t in todo if t not in same]
+    if todo:
+        since = time.monotonic()
+        fetched = _fetch(sh, todo)
+        _store(sh.id, fetched, stamp, since)
+        out.update(fetched)
+    return {t: None if out[t] is None else [list(r) for r in out[t]] for t in titles}
+
+
+def records_from_values(values):
+    # 與 ws.get_all_records() 相同：首列為欄名、數字字串轉為數值、空白為 ""
+    values = fill_gaps(values) if values else [[]]
+    if values == [[]]:
+        return []
+    keys, rows = values[0], values[1:]
+    dupes = [k for k, n in Counter(keys).items() if n > 1]
+    if dupes:
+        raise GSpreadException(f"the header row in the worksheet contains duplicates: {dupes}")
+    return to_records(keys, [numericise_all(r) for r in rows])
+
+
+def read_records(sh, titles, required=True, ttl=None, poll=False):
+    """一次讀取多個工作表並轉成 get_all_records 格式（dict 串列）。
+
+    required 為 True（全部）或必須存在的工作表名稱；必要的工作表不存在即拋出 WorksheetNotFound，
+    其餘不存在或欄名無法使用（重複）的工作表為 None。
+    """
+    need = set(titles) if required is True else set(required or ())
+    out = {}
+    for t, values in read_values(sh, titles, ttl, poll).items():
+        try:
+            if values is None:
+                raise WorksheetNotFound(t)
+            out[t] = records_from_values(values)
+        except GSpreadException:
+            if t in need:
+                raise
+            out[t] = None
+    return out
+
+
+def read_frames(sh, titles, required=True, ttl=None, poll=False):
+    """同 read_records，轉成與 pd.DataFrame(ws.get_all_records()) 相同的 DataFrame。"""
+    return {t: None if recs is None else pd.DataFrame(recs)
+            for t, recs in read_records(sh, titles, required, ttl, poll).items()}
+
+
+def _new_sheet_id(used):
+    # addSheet 與寫入同一批送出，須先自行指定新工作表的 sheetId
+    while True:
+        sheet_id = random.randrange(1, 2 ** 31 - 1)
+        if sheet_id not in used:
+            used.add(sheet_id)
+            return sheet_id
+
+
+def _add_sheet(plan, sh, title, rows, cols, used_ids, hidden=False):
+    sheet_id = _new_sheet_id(used_ids)
+    props = {"sheetId": sheet_id, "title": title, "gridProperties": {"rowCount": rows, "columnCount": cols}}
+    if hidden:
+        props["hidden"] = True
+    plan.requests([{"addSheet": {"properties": props}}])
+    return gspread.Worksheet(sh, dict(props, gridProperties=dict(props["gridProperties"])), sh.id, sh.client)
+
+
+def _row_delta(plan, ws, old, new, values):
+    # old：表上目前內容、new：要寫入的內容（皆為讀回格式），values：new 對應的原始值
+    # 欄名列不同（欄位調整）時回傳 False，改為整表重寫
+    if not old or not new or old[0] != new[0]:
+        return False
+    ops = SequenceMatcher(None, [tuple(r) for r in old], [tuple(r) for r in new], autojunk=False).get_opcodes()
+    rows = plan.grid(ws)[0]
+    # 由下往上處理，前面的列號不受後面插入、刪除影響
+    for tag, i1, i2, j1, j2 in reversed(ops):
+        if tag == "equal":
+            continue
+        n_old, n_new = i2 - i1, j2 - j1
+        if n_old > n_new:
+            plan.requests([{"deleteDimension": {"range": {
+                "sheetId": ws.id, "dimension": "ROWS", "startIndex": i1 + n_new, "endIndex": i2}}}])
+            rows -= n_old - n_new
+        elif n_new > n_old and i2 < len(old):
+            plan.requests([{"insertDimension": {"range": {
+                "sheetId": ws.id, "dimension": "ROWS", "startIndex": i2, "endIndex": i2 + n_new - n_old}}}])
+            rows += n_new - n_old
+        plan.resize(ws, rows=rows)
+        if n_new:
+            width = max(len(r) for r in old[i1:i2] + new[j1:j2])
+            plan.values(ws, rowcol_to_a1(i1 + 1, 1),
+                        [list(r) + [""] * (width - len(r)) for r in values[j1:j2]])
+    return True
+
+
+def _trusted(sh, titles):
+    # 快取內容可視為表上現況的分頁：戳記與目前一致，且取得後未超過 POLL_MAX_AGE 秒
+    now = time.monotonic()
+    with _CACHE_LOCK:
+        hits = {t: _CACHE.get((sh.id, t)) for t in titles}
+    hits = {t: h for t, h in hits.items()
+            if h is not None and h[1] is not None and h[2] is not None and now - h[3] < POLL_MAX_AGE}
+    if not hits:
+        return {}
+    stamp = _version(sh, 0)
+    return {t: h[1] for t, h in hits.items() if h[2] == stamp}
+
+
+def write_tables(sh, tables, sizes=None, default_size=(100, 20), create=True):
+    """以一次 batchUpdate 清除並重寫多個工作表，等同逐一 ws.clear() + ws.update(values)。
+
+    tables 為 {名稱: 二維串列}，空串列表示只清除。不存在的工作表依 sizes（{名稱: (列, 欄)}，
+    未指定用 default_size）建立；create=False 時改為拋出 WorksheetNotFound。
+    資料超出格線時擴充；既有工作表的列數多於 max(資料列數, 建立列數) 時刪去多餘的空白列。
+    快取的分頁內容可信時只送出變動的列；同一批請求也更新版本戳記（見 VERSION_TAB）。
+    """
+    sizes = sizes or {}
+    existing = {ws.title: ws for ws in sh.worksheets()}
+    if VERSION_TAB not in existing:
+        # 版本工作表可能是其他程序剛建立的，先重讀工作表清單再決定是否新增
+        sh.refresh()
+        existing = {ws.title: ws for ws in sh.worksheets()}
+    used_ids = {ws.id for ws in existing.values()}
+    known = _trusted(sh, [t for t in tables if t in existing])
+    plan = WritePlan()
+    for title, values in tables.items():
+        rows, cols = (int(n) for n in sizes.get(title, default_size))
+        ws = existing.get(title)
+        if ws is None:
+            if not create:
+                raise WorksheetNotFound(title)
+            ws = _add_sheet(plan, sh, title, rows, cols, used_ids)
+        elif title in known and _row_delta(plan, ws, known[title], _as_read(values), values):
+            continue
+        else:
+            plan.clear(ws)
+            keep = max(len(values), rows)
+            if ws.row_count > keep:
+                plan.requests([{"deleteDimension": {"range": {
+                    "sheetId": ws.id, "dimension": "ROWS", "startIndex": keep, "endIndex": ws.row_count}}}])
+                plan.resize(ws, rows=keep)
+        if values:
+            plan.values(ws, "A1", values)
+    stamp = uuid.uuid4().hex
+    plan.values(existing.get(VERSION_TAB) or _add_sheet(plan, sh, VERSION_TAB, 1, 1, used_ids, hidden=True),
+                "A1", [[stamp]])
+    errors = plan.flush(sh.batch_update)
+    if errors:
+        invalidate(sh.id, list(tables))
+        raise errors[0][1]
+    _store(sh.id, {t: _as_read(v) for t, v in tables.items()}, stamp)
+    with _CACHE_LOCK:
+        _VERSIONS[sh.id] = (time.monotonic(), stamp)
+    return plan.calls
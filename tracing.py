@@ -0,0 +1,164 @@
+import functools
+import json
+import os
+import resource
+import subprocess
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+
+# ==========================================
+# 分段計時與資源紀錄
+#   with tracing.stage("hub.超載統計"): ...   或   @tracing.traced("p10.save_data")
+#   每段記錄：耗時、Sheets API 讀/寫/429 次數、配額等待秒數、讀入位元組、記憶體高峰，
+#   完成時附加一行到 JSON-lines 紀錄檔（含版本），供管理頁面比較各版本差異。
+#   分段可巢狀；子段的計數同時累加到所有上層。
+# ==========================================
+LOG_PATH = os.environ.get(
+    "TRACE_LOG",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "trace.jsonl"),
+)
+ENABLED = os.environ.get("TRACE_DISABLE", "") == ""
+
+
+def _version():
+    v = os.environ.get("APP_VERSION")
+    if v:
+        return v
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=2,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or "unknown"
+    except (OSError, subprocess.SubprocessError):
+        return "unknown"
+
+
+VERSION = _version()
+COUNTERS = ("api_read", "api_write", "api_429", "api_bytes", "quota_wait_s", "bytes_in")
+
+_local = threading.local()
+_lock = threading.Lock()
+
+
+class Span:
+    def __init__(self, name, parent=None, **tags):
+        self.name, self.parent, self.tags = name, parent, tags
+        self.id = uuid.uuid4().hex[:8]
+        self.run = parent.run if parent else self.id
+        self.counts = dict.fromkeys(COUNTERS, 0)
+        self.py_peak = 0
+        self.start = time.perf_counter()
+
+    def add(self, key, value):
+        with _lock:
+            s = self
+            while s is not None:
+                s.counts[key] += value
+                s = s.parent
+
+
+def current():
+    return getattr(_local, "span", None)
+
+
+@contextmanager
+def attach(span):
+    # 其他執行緒（例：雲端寫入執行緒）代某分段執行時使用，計數歸入該分段
+    prev = current()
+    _local.span = span
+    try:
+        yield span
+    finally:
+        _local.span = prev
+
+
+def add(key, value=1):
+    span = current()
+    if span is not None:
+        span.add(key, value)
+
+
+def add_bytes(n):
+    add("bytes_in", int(n))
+
+
+@contextmanager
+def stage(name, **tags):
+    if not ENABLED:
+        yield None
+        return
+    parent = current()
+    span = Span(name, parent, **tags)
+    if tracemalloc.is_tracing():
+        # 上層的高峰先結算再歸零，子段結束時取 max 併回
+        if parent is not None:
+            parent.py_peak = max(parent.py_peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+    _local.span = span
+    error = None
+    try:
+        yield span
+    except BaseException as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _local.span = parent
+        wall = time.perf_counter() - span.start
+        if tracemalloc.is_tracing():
+            span.py_peak = max(span.py_peak, tracemalloc.get_traced_memory()[1])
+            if parent is not None:
+                parent.py_peak = max(parent.py_peak, span.py_peak)
+        _write(span, wall, error)
+
+
+def traced(name):
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+def _write(span, wall, error):
+    rec = {
+        "ts": time.strftime("%Y-%m-%dT%H:%M:%S"), "version": VERSION, "run": span.run, "id": span.id,
+        "parent": span.parent.id if span.parent else None, "name": span.name, "wall_s": round(wall, 4),
+        **{k: round(v, 3) if isinstance(v, float) else v for k, v in span.counts.items()},
+        "rss_peak_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "py_peak_mb": round(span.py_peak / 2 ** 20, 2) if span.py_peak else None,
+        "error": error, **span.tags,
+    }
+    try:
+        os.makedirs(os.path.dirname(LOG_PATH), exist_ok=True)
+        line = json.dumps(rec, ensure_ascii=False, default=str) + "\n"
+        with _lock, open(LOG_PATH, "a", encoding="utf-8") as fh:
+            fh.write(line)
+    except OSError:
+        pass
+
+
+def read_log(limit=5000, path=LOG_PATH):
+    # 讀取最近 limit 筆紀錄（管理頁面用）
+    try:
+        with open(path, encoding="utf-8") as fh:
+            lines = fh.readlines()[-limit:]
+    except OSError:
+        return []
+    out = []
+    for line in lines:
+        try:
+            out.append(json.loads(line))
+        except ValueError:
+            pass
+    return out
+
+
+def set_memory_tracing(on):
+    # tracemalloc 會拖慢 Python 執行，僅在需要分析記憶體時由管理頁面開啟
+    if on and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    elif not on and tracemalloc.is_tracing():
+        tracemalloc.stop()
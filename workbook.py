@@ -0,0 +1,135 @@
+import io
+
+import pandas as pd
+
+# ==========================================
+# 上傳活頁簿單次開啟讀取層
+#   .xlsx 以 openpyxl read_only 串流讀取；每個分頁的 XML 只解析一次，
+#   已讀過的列保留在記憶體，之後「前 N 列」或「整張表」都從同一份緩衝取用。
+#   .xls 交給 xlrd（開檔時即整份解析一次）。
+# ==========================================
+
+
+_NA = float("nan")
+
+
+def _cell(v):
+    # 與 pandas.read_excel 一致：空格為 NaN，整數值的浮點數轉回 int
+    if v is None:
+        return _NA
+    if isinstance(v, float) and v.is_integer():
+        return int(v)
+    return v
+
+
+def _trim(row):
+    row = list(row)
+    while row and (row[-1] is None or row[-1] == ""):
+        row.pop()
+    return row
+
+
+def _header_names(row, width):
+    names, seen = [], {}
+    for i in range(width):
+        v = row[i] if i < len(row) else None
+        name = f"Unnamed: {i}" if v is None or v == "" or pd.isna(v) else str(v)
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+class _SheetRows:
+    def __init__(self, rows_iter):
+        self._it = rows_iter
+        self.buf = []
+        self.done = False
+
+    def ensure(self, n=None):
+        while not self.done and (n is None or len(self.buf) < n):
+            try:
+                self.buf.append([_cell(v) for v in _trim(next(self._it))])
+            except StopIteration:
+                self.done = True
+                while self.buf and not self.buf[-1]:
+                    self.buf.pop()
+        return self.buf if n is None else self.buf[:n]
+
+
+class Workbook:
+    def __init__(self, f):
+        name = getattr(f, "name", "").lower()
+        if hasattr(f, "getvalue"):
+            data = f.getvalue()
+        else:
+            f.seek(0)
+            data = f.read()
+        self._sheets = {}
+        self._wb = None
+        if name.endswith(".xls"):
+            self._xls = pd.ExcelFile(io.BytesIO(data), engine="xlrd")
+            self.sheet_names = list(self._xls.sheet_names)
+        else:
+            from openpyxl import load_workbook
+            self._xls = None
+            self._wb = load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+            self.sheet_names = list(self._wb.sheetnames)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._wb is not None:
+            self._wb.close()
+
+    def _rows(self, sheet):
+        sheet = self.sheet_names[sheet] if isinstance(sheet, int) else sheet
+        if sheet not in self._sheets:
+            if self._xls is not None:
+                df = pd.read_excel(self._xls, sheet_name=sheet, header=None)
+                it = iter(df.astype(object).where(df.notna(), None).values.tolist())
+            else:
+                it = self._wb[sheet].iter_rows(values_only=True)
+            self._sheets[sheet] = _SheetRows(it)
+        return self._sheets[sheet]
+
+    def _frame(self, rows):
+        width = max((len(r) for r in rows), default=0)
+        return pd.DataFrame([r + [_NA] * (width - len(r)) for r in rows], columns=range(width))
+
+    def head(self, sheet=0, n=15):
+        # 等同 pd.read_excel(header=None, nrows=n)，只串流到第 n 列
+        return self._frame(self._rows(sheet).ensure(n))
+
+    def frame(self, sheet=0):
+        # 等同 pd.read_excel(header=None)
+        return self._frame(self._rows(sheet).ensure())
+
+    def table(self, sheet=0, header_row=0):
+        # 等同 pd.read_excel(skiprows=header_row)：第 header_row 列為欄名
+        rows = self._rows(sheet).ensure()
+        if header_row >= len(rows):
+            return pd.DataFrame()
+        body = rows[header_row + 1:]
+        width = max([len(rows[header_row])] + [len(r) for r in body])
+        return pd.DataFrame([r + [_NA] * (width - len(r)) for r in body],
+                            columns=_header_names(rows[header_row], width))
+
+    def find_row(self, sheet, match, scan=50):
+        # 在前 scan 列中找第一個符合 match(row_values) 的列號
+        for i, r in enumerate(self._rows(sheet).ensure(scan)):
+            if match(r):
+                return i
+        return None
+
+    def below_header(self, sheet, match, scan=50):
+        # 以符合 match 的列為欄名，回傳其下方資料；找不到回傳 None
+        idx = self.find_row(sheet, match, scan)
+        return None if idx is None else self.table(sheet, idx)